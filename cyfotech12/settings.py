@@ -43,11 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'webapp.profiling.ProfilingMiddleware',  # first, so it sees every other middleware's queries
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',  # <-- This line is required!
+    'webapp.middleware.CurrentUserMiddleware',  # sets request.logged_user
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -60,6 +62,7 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
+                'webapp.context_processors.logged_user',
             ],
         },
     },
@@ -90,6 +93,31 @@ DATABASES = {
 
 
 
+# Cache: 'default' is local memory per worker (the logged-in user lookup, cached
+# pages); 'shared' is seen by every worker and the management commands, for
+# state whose invalidation has to reach all of them (its table is created by
+# migration 0013; Redis or memcached work too)
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'webapp',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'webapp_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Logged-in user cache alias, which must be shared by all processes, and lifetime (see webapp/middleware.py)
+USER_CACHE = 'shared'
+USER_CACHE_TTL = 300
+USER_SESSION_MAX_AGE = 14 * 24 * 60 * 60  # signed login cookie lifetime
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -132,4 +160,50 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# ML inference micro-batching (see webapp/ml_model/batching.py)
+ML_BATCH_MAX_SIZE = 32
+ML_BATCH_MAX_WAIT_MS = 5
+
+# Classifier file and how often workers look for a new version of it (see webapp/ml_model/registry.py)
+ML_MODEL_PATH = os.path.join(BASE_DIR, "webapp", "ml_model", "report_model.h5")
+ML_MODEL_POLL_SECONDS = 30
+ML_PRELOAD = False  # load the model when a web worker boots, not on first inference (see cyfotech12/wsgi.py)
+
+# Serving backend: "keras" (full TensorFlow) or "tflite" (ML_TFLITE_MODEL_PATH, made by
+# `manage.py export_model`; see webapp/ml_model/runtime.py)
+ML_BACKEND = "keras"
+ML_TFLITE_MODEL_PATH = os.path.join(BASE_DIR, "webapp", "ml_model", "report_model.tflite")
+
+# Preprocessed image tensors, keyed by content hash (see webapp/ml_model/preprocess.py)
+ML_TENSOR_CACHE_SIZE = 256
+ML_TENSOR_CACHE_DIR = os.path.join(BASE_DIR, "media", "cache", "tensors")
+
+# Largest accepted report photo (see webapp/uploads.py)
+REPORT_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+
+# Home page stats cache alias, which must be shared by all processes, and max staleness (see webapp/stats.py)
+STATS_CACHE = 'shared'
+STATS_TTL = 600
+
+# Map tile cluster cache alias, which must be shared by all processes, and lifetime (see webapp/tiles.py)
+TILE_CACHE = 'shared'
+TILE_TTL = 24 * 60 * 60
+
+# Public page cache alias, lifetime and switch, and the alias holding page
+# generations, which must be shared by all processes (see webapp/pagecache.py)
+PAGE_CACHE = 'default'
+PAGE_GENERATION_CACHE = 'shared'
+PAGE_CACHE_TTL = 600
+PAGE_CACHE_ENABLED = True
+
+# Reward catalog and per-user claim cache alias, which must be shared by all processes,
+# and lifetime (see webapp/rewards.py)
+REWARDS_CACHE = 'shared'
+REWARDS_TTL = 600
+
+# Per-view query counts, N+1 detection and Prometheus metrics at /metrics/ (see webapp/profiling.py)
+PROFILING_ENABLED = True
+PROFILING_N_PLUS_ONE_THRESHOLD = 3
+PROFILING_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
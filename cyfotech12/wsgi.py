@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cyfotech12.settings')
 
 application = get_wsgi_application()
+
+# Classification runs in the classify_reports worker, so web workers load the
+# model (and TensorFlow) only on first use. Set ML_PRELOAD if they serve
+# inference themselves, to load and warm it up in the background at boot.
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'ML_PRELOAD', False):
+    from webapp.ml_model.predict import get_registry
+
+    get_registry().preload()
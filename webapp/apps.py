@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class WebappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'webapp'
+
+    def ready(self):
+        from . import middleware, pagecache, rewards, signals, stats, tiles  # noqa: F401
+
+        middleware.check_settings()
+        pagecache.check_settings()
+        rewards.check_settings()
+        stats.check_settings()
+        tiles.check_settings()
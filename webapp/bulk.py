@@ -0,0 +1,302 @@
+# webapp/bulk.py
+"""
+Bulk report import and export.
+
+Exports walk the table in report_id order, EXPORT_BATCH_SIZE rows per
+query (keyset, not OFFSET). A single cursor is not enough for constant
+memory because MySQLdb buffers whole result sets client-side. Memory
+stays flat however many rows there are.
+
+Imports go through bulk_create in batches. Afterwards they do, once per
+batch or run, what the per-report signals would have done: geohash,
+search index, home page stats, map tiles and classification jobs.
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import geo, pagecache, search, stats, tiles
+from .classification import enqueue_unclassified
+from .dedup import find_near_duplicate, store_upload
+from .models import Report, User
+from .uploads import SNIFF_BYTES, sniff_image
+
+EXPORT_FIELDS = (
+    "report_id", "user_id", "title", "description", "report_type", "predicted_report_type",
+    "predicted_model_version", "status", "geotag_lat", "geotag_long", "timestamp", "image", "duplicate_of_id",
+)
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "geojson": "application/geo+json",
+}
+EXPORT_BATCH_SIZE = 2000
+IMPORT_BATCH_SIZE = 500
+STATUSES = {value for value, _ in Report.STATUS_CHOICES}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+# ----------------------------
+# Export
+# ----------------------------
+def iter_rows(queryset, batch_size=EXPORT_BATCH_SIZE):
+    """Report rows as dicts of EXPORT_FIELDS, fetched batch_size at a time."""
+    queryset = queryset.order_by("report_id").values(*EXPORT_FIELDS)
+    last = 0
+    while True:
+        batch = list(queryset.filter(report_id__gt=last)[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last = batch[-1]["report_id"]
+
+
+def _plain(row):
+    row = dict(row)
+    row["timestamp"] = row["timestamp"].isoformat()
+    return row
+
+
+class _Echo:
+    """csv.writer target that hands each line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row = _plain(row)
+        yield writer.writerow(["" if row[f] is None else row[f] for f in EXPORT_FIELDS])
+
+
+def ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(_plain(row)) + "\n"
+
+
+def export_feature(row):
+    row = _plain(row)
+    lat, lng = row.pop("geotag_lat"), row.pop("geotag_long")
+    geometry = None if lat is None or lng is None else {"type": "Point", "coordinates": [lng, lat]}
+    return {"type": "Feature", "geometry": geometry, "properties": row}
+
+
+def export_stream(queryset, fmt):
+    rows = iter_rows(queryset)
+    if fmt == "csv":
+        return csv_stream(rows)
+    if fmt == "ndjson":
+        return ndjson_stream(rows)
+    if fmt == "geojson":
+        return geo.geojson_stream(rows, to_feature=export_feature)
+    raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}.")
+
+
+# ----------------------------
+# Import: reading
+# ----------------------------
+def guess_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"json": "geojson", "jsonl": "ndjson"}.get(ext, ext)
+
+
+def _csv_rows(fileobj):
+    reader = csv.DictReader(fileobj)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, RowError(f"unreadable CSV: {e}")
+            continue
+        if None in row:
+            yield reader.line_num, RowError("more fields than the header")
+        else:
+            yield reader.line_num, row
+
+
+def _ndjson_rows(fileobj):
+    for line, text in enumerate(fileobj, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as e:
+            yield line, RowError(f"invalid JSON: {e}")
+
+
+def _geojson_rows(fileobj):
+    collection = json.load(fileobj)  # a file that isn't JSON at all fails the whole import, before any write
+    features = collection.get("features", []) if isinstance(collection, dict) else None
+    if not isinstance(features, list):
+        raise ValueError("GeoJSON input must be a FeatureCollection.")
+    for index, feature in enumerate(features, start=1):
+        if not isinstance(feature, dict) or not isinstance(feature.get("properties") or {}, dict):
+            yield index, RowError("not a GeoJSON Feature")
+            continue
+        row = dict(feature.get("properties") or {})
+        coordinates = (feature.get("geometry") or {}).get("coordinates")
+        if coordinates:
+            if not isinstance(coordinates, list) or len(coordinates) < 2:
+                yield index, RowError(f"bad coordinates {coordinates!r}")
+                continue
+            row["geotag_long"], row["geotag_lat"] = coordinates[:2]
+        yield index, row
+
+
+def read_rows(fileobj, fmt):
+    """
+    (line, row) pairs from a text file, where row is a dict, or a
+    RowError for a line that could not be parsed (import_reports skips
+    and reports it). CSV and NDJSON are read line by line; GeoJSON has to
+    be parsed whole.
+    """
+    if fmt == "csv":
+        yield from _csv_rows(fileobj)
+    elif fmt == "ndjson":
+        yield from _ndjson_rows(fileobj)
+    elif fmt == "geojson":
+        yield from _geojson_rows(fileobj)
+    else:
+        raise ValueError(f"Unknown import format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}.")
+
+
+# ----------------------------
+# Import: writing
+# ----------------------------
+def _parse_timestamp(value):
+    if not value:
+        return timezone.now()
+    stamp = datetime.fromisoformat(str(value))
+    return stamp if timezone.is_aware(stamp) else timezone.make_aware(stamp)
+
+
+def _attach_image(report, name, image_dir):
+    path = os.path.join(image_dir, name)
+    if not os.path.isfile(path):
+        raise RowError(f"image {name!r} not found in {image_dir}")
+    with open(path, "rb") as f:
+        if sniff_image(f.read(SNIFF_BYTES)) is None:
+            raise RowError(f"{name!r} is not a JPEG, PNG or WebP image")
+        f.seek(0)
+        blob, _ = store_upload(File(f, name=os.path.basename(name)))
+    report.image = blob.file.name
+    report.image_blob = blob
+    report.duplicate_of = find_near_duplicate(blob)
+    if blob.predicted_report_type:
+        report.predicted_report_type = blob.predicted_report_type
+        report.predicted_model_version = blob.predicted_model_version
+
+
+def _check_row(row):
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError(f"expected an object, got {type(row).__name__}")
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is not None and not isinstance(value, str):
+        raise RowError(f"{field} must be text, got {type(value).__name__}")
+    return value
+
+
+def _coordinate(row, field):
+    # JSON rows carry numbers, CSV rows numeric strings; blank means no geotag.
+    value = row.get(field)
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RowError(f"{field} must be a number, got {type(value).__name__}")
+    try:
+        return float(value)
+    except ValueError:
+        raise RowError(f"bad {field} {value!r}")
+
+
+def build_report(row, user, image_dir=None):
+    """An unsaved Report from an import row; RowError if it is unusable."""
+    _check_row(row)
+    text = {f: _text(row, f) for f in ("title", "description", "report_type")}
+    missing = [f for f, value in text.items() if not value]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+    status = _text(row, "status") or "pending"
+    if status not in STATUSES:
+        raise RowError(f"unknown status {status!r}")
+    lat, lng = geo.parse_point(_coordinate(row, "geotag_lat"), _coordinate(row, "geotag_long"))
+    try:
+        timestamp = _parse_timestamp(row.get("timestamp"))
+    except ValueError:
+        raise RowError(f"bad timestamp {row.get('timestamp')!r}")
+
+    report = Report(
+        user=user,
+        title=text["title"][:255],
+        description=text["description"],
+        report_type=text["report_type"][:100],
+        status=status,
+        geotag_lat=lat,
+        geotag_long=lng,
+        geohash=None if lat is None else geo.encode(lat, lng),  # bulk_create skips pre_save
+        timestamp=timestamp,
+    )
+    if row.get("image") and image_dir:
+        _attach_image(report, row["image"], image_dir)
+    return report
+
+
+def import_reports(rows, default_user, image_dir=None, batch_size=IMPORT_BATCH_SIZE, classify=True):
+    """
+    Create reports from (line, row) pairs. A row's `user_email` overrides
+    `default_user`. Each batch commits on its own; bad rows are skipped.
+    Returns (created count, [(line, error message), ...]).
+    """
+    users = {}
+    created, errors, batch = 0, [], []
+
+    def flush():
+        nonlocal created
+        with transaction.atomic():
+            reports = Report.objects.bulk_create(batch)
+            search.index_reports(reports)
+        created += len(batch)
+        batch.clear()
+
+    for line, row in rows:
+        try:
+            _check_row(row)
+            email = row.get("user_email")
+            if email:
+                if email not in users:
+                    users[email] = User.objects.filter(email=email).first()
+                if users[email] is None:
+                    raise RowError(f"no user with email {email!r}")
+            batch.append(build_report(row, users.get(email) or default_user, image_dir))
+        except RowError as e:
+            errors.append((line, str(e)))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if created:
+        stats.reset()
+        tiles.invalidate_all()
+        pagecache.invalidate_reports()
+        if classify:
+            enqueue_unclassified()
+    return created, errors
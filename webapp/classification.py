@@ -0,0 +1,233 @@
+# webapp/classification.py
+"""
+Background report classification.
+
+Uploads only enqueue a ClassificationJob row; worker threads started by
+`manage.py classify_reports` claim jobs from the table, run the model and
+write `predicted_report_type` / `status` back onto the Report, along
+with the version of the model that made the prediction.
+"""
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+
+from . import pagecache, stats, tiles
+from .models import ClassificationJob, Report
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 5
+# A job still "running" after this long is assumed to belong to a dead worker.
+STALE_AFTER = timedelta(minutes=10)
+
+
+# ----------------------------
+# Enqueue
+# ----------------------------
+def enqueue_report(report, max_attempts=3):
+    return ClassificationJob.objects.create(report=report, max_attempts=max_attempts)
+
+
+def enqueue_unclassified():
+    """Create jobs for reports with an image, no prediction and no open job."""
+    open_jobs = ClassificationJob.objects.filter(status__in=['queued', 'running']).values('report_id')
+    reports = (
+        Report.objects.filter(predicted_report_type__isnull=True)
+        .exclude(Q(image='') | Q(image__isnull=True))
+        .exclude(report_id__in=open_jobs)
+    )
+    jobs = [ClassificationJob(report=report) for report in reports.only('report_id')]
+    ClassificationJob.objects.bulk_create(jobs, batch_size=500)
+    return len(jobs)
+
+
+def requeue_failed():
+    return ClassificationJob.objects.filter(status='failed').update(
+        status='queued', attempts=0, last_error=None, run_after=timezone.now(),
+    )
+
+
+# ----------------------------
+# Claim / run
+# ----------------------------
+def claim_next_job():
+    """
+    Claim one runnable job. The conditional UPDATE makes the claim atomic
+    across threads and processes without needing SELECT ... SKIP LOCKED.
+    """
+    now = timezone.now()
+    runnable = Q(status='queued', run_after__lte=now) | Q(status='running', started_at__lt=now - STALE_AFTER)
+    for job_id in ClassificationJob.objects.filter(runnable).order_by('run_after').values_list('job_id', flat=True)[:10]:
+        claimed = ClassificationJob.objects.filter(runnable, job_id=job_id).update(
+            status='running', started_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return ClassificationJob.objects.select_related('report', 'report__image_blob').get(job_id=job_id)
+    return None
+
+
+def apply_prediction(report, predicted_type, model_version=None):
+    # Mismatches stay 'pending' for a human reviewer.
+    old_status = report.status
+    status = 'verified' if predicted_type == report.report_type else old_status
+    Report.objects.filter(report_id=report.report_id).update(
+        predicted_report_type=predicted_type, predicted_model_version=model_version, status=status,
+    )
+    # update() sends no post_save, so keep the home page counters, map tiles and pages in step here.
+    transaction.on_commit(lambda: stats.report_changed(old_status, status))
+    transaction.on_commit(lambda: pagecache.invalidate_report(report.report_id))
+    if status != old_status:
+        transaction.on_commit(lambda: tiles.invalidate_point(report.geotag_lat, report.geotag_long))
+    report.predicted_report_type = predicted_type
+    report.predicted_model_version = model_version
+    report.status = status
+
+
+def run_job(job):
+    """
+    Run one claimed job. Any error, whether from the model or from writing
+    the prediction back, requeues the job with exponential backoff until
+    it runs out of attempts.
+    """
+    try:
+        _classify(job)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Classification job %s failed (attempt %s)", job.job_id, job.attempts)
+        if job.attempts >= job.max_attempts:
+            fields = {'status': 'failed'}
+        else:
+            backoff = RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            fields = {'status': 'queued', 'run_after': timezone.now() + timedelta(seconds=backoff)}
+        ClassificationJob.objects.filter(job_id=job.job_id).update(last_error=error, finished_at=timezone.now(), **fields)
+        return False
+    return True
+
+
+def _classify(job):
+    from .dedup import cache_prediction
+    from .thumbnails import generate_thumbnails
+    from .ml_model.predict import classify_report_image, model_version as serving_version
+
+    report = job.report
+    blob = report.image_blob
+    if report.thumbnail_widths is None:
+        try:
+            generate_thumbnails(report.image.name)
+        except Exception:
+            # Thumbnails are best effort; fall back to the original image.
+            logger.exception("Thumbnail generation failed for report %s", report.report_id)
+    if blob is not None and blob.predicted_report_type and blob.predicted_model_version == serving_version():
+        # Identical image already classified for another report by the serving model.
+        predicted_type, model_version = blob.predicted_report_type, blob.predicted_model_version
+    else:
+        predicted_type, model_version = classify_report_image(
+            report.image.path, content_hash=blob.sha256 if blob is not None else None,
+        )
+
+    with transaction.atomic():
+        if blob is not None and (blob.predicted_report_type, blob.predicted_model_version) != (predicted_type, model_version):
+            cache_prediction(blob, predicted_type, model_version)
+        apply_prediction(report, predicted_type, model_version)
+        ClassificationJob.objects.filter(job_id=job.job_id).update(
+            status='done', last_error=None, finished_at=timezone.now(),
+        )
+
+
+# ----------------------------
+# Worker pool
+# ----------------------------
+class WorkerPool:
+    """
+    Threads that poll the job table; the model's micro-batcher merges
+    their predicts. The supervising thread also compacts the points
+    ledger every `compact_interval` seconds.
+    """
+
+    def __init__(self, workers=2, poll_interval=1.0, drain=False, compact_interval=30):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.drain = drain
+        self.compact_interval = compact_interval
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                job = claim_next_job()
+                if job is None:
+                    # Jobs waiting out a retry backoff still count as work left to drain.
+                    if self.drain and not ClassificationJob.objects.filter(status='queued').exists():
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                ok = run_job(job)
+            except Exception:
+                # A database hiccup must not kill the thread; a job left running
+                # is reclaimed once it goes stale.
+                logger.exception("Classification worker error")
+                self._stop.wait(self.poll_interval)
+                continue
+            with self._lock:
+                self.processed += 1
+                self.failed += 0 if ok else 1
+        close_old_connections()
+
+    def run(self):
+        threads = [threading.Thread(target=self._worker, name=f"classify-{i}", daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        last_compact = time.monotonic()
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=0.5)
+                if self.compact_interval and time.monotonic() - last_compact > self.compact_interval:
+                    self._compact()
+                    last_compact = time.monotonic()
+        except KeyboardInterrupt:
+            self.stop()
+            for t in threads:
+                t.join()
+
+    def _compact(self):
+        from .points import compact_points
+
+        try:
+            compact_points()
+        except Exception:
+            logger.exception("Points ledger compaction failed")
+        finally:
+            close_old_connections()
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def job_stats(window=timedelta(minutes=5)):
+    counts = dict(ClassificationJob.objects.values_list('status').annotate(n=Count('job_id')))
+    since = timezone.now() - window
+    recent = ClassificationJob.objects.filter(status='done', finished_at__gte=since)
+    done_recent = recent.count()
+    avg_duration = recent.aggregate(avg=Avg(F('finished_at') - F('started_at')))['avg']
+    return {
+        'queued': counts.get('queued', 0),
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'throughput_per_min': round(done_recent / (window.total_seconds() / 60), 2),
+        'avg_job_seconds': round(avg_duration.total_seconds(), 3) if avg_duration else None,
+    }
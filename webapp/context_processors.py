@@ -0,0 +1,3 @@
+def logged_user(request):
+    # Set by CurrentUserMiddleware; views may still override it in their context.
+    return {"logged_user": getattr(request, "logged_user", None)}
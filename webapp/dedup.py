@@ -0,0 +1,156 @@
+# webapp/dedup.py
+"""
+Content-addressed storage for report images.
+
+Every upload is hashed (SHA-256 for exact matches, 64-bit dHash for
+near-duplicates). An identical photo reuses the existing ImageBlob: no
+second file on disk and, once classified, no second inference.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db.models import Q
+from PIL import Image
+
+from .models import ImageBlob, Report
+
+PHASH_BANDS = 4
+# Hamming distance at which two photos count as the same incident.
+NEAR_DUPLICATE_DISTANCE = 3
+
+
+# ----------------------------
+# Hashing
+# ----------------------------
+def dhash(fileobj, size=8):
+    """64-bit difference hash: robust to re-encoding, resizing and small edits."""
+    with Image.open(fileobj) as img:
+        img.draft("L", (size * 4, size * 4))
+        img = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+        pixels = list(img.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def phash_bands(value):
+    return [(value >> (16 * i)) & 0xFFFF for i in range(PHASH_BANDS)]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def blob_path(sha256, original_name):
+    ext = os.path.splitext(original_name)[1].lower() or ".jpg"
+    return f"reports/{sha256[:2]}/{sha256}{ext}"
+
+
+# ----------------------------
+# Store
+# ----------------------------
+def store_upload(uploaded_file):
+    """
+    Return (blob, created) for an uploaded image, writing it to storage
+    only if no blob with the same SHA-256 exists yet.
+    """
+    # ReportUploadHandler already hashed the stream while writing it.
+    sha256 = getattr(uploaded_file, "sha256", None)
+    if sha256 is None:
+        digest = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+    blob = ImageBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        if hasattr(uploaded_file, "discard"):
+            uploaded_file.discard()
+        return blob, False
+
+    uploaded_file.seek(0)
+    value = dhash(uploaded_file)
+    uploaded_file.seek(0)
+
+    # A staged upload is renamed into place by FileSystemStorage, not copied.
+    name = blob_path(sha256, uploaded_file.name)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, uploaded_file)
+    elif hasattr(uploaded_file, "discard"):
+        uploaded_file.discard()
+    return _create_blob(sha256, value, name, uploaded_file.size)
+
+
+def _create_blob(sha256, value, name, size):
+    bands = phash_bands(value)
+    try:
+        blob = ImageBlob.objects.create(
+            sha256=sha256,
+            phash=f"{value:016x}",
+            phash_band0=bands[0],
+            phash_band1=bands[1],
+            phash_band2=bands[2],
+            phash_band3=bands[3],
+            file=name,
+            size=size,
+        )
+    except IntegrityError:
+        # Same photo uploaded concurrently; the other request won.
+        return ImageBlob.objects.get(sha256=sha256), False
+    return blob, True
+
+
+# ----------------------------
+# Near-duplicates
+# ----------------------------
+def find_near_duplicate(blob, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    Earliest Report whose image is perceptually within `max_distance`
+    bits of `blob` (including exact copies), or None.
+    """
+    value = int(blob.phash, 16)
+    bands = phash_bands(value)
+    band_match = Q()
+    for i, band in enumerate(bands):
+        band_match |= Q(**{f"phash_band{i}": band})
+
+    candidates = ImageBlob.objects.filter(band_match).values_list("blob_id", "phash")
+    close = [blob_id for blob_id, other in candidates if hamming(value, int(other, 16)) <= max_distance]
+    if not close:
+        return None
+    report = (
+        Report.objects.filter(image_blob_id__in=close)
+        .order_by("timestamp", "report_id")
+        .first()
+    )
+    if report is None:
+        return None
+    # Link to the original report, not to another duplicate.
+    return report.duplicate_of or report
+
+
+def forget_predictions(keep_version):
+    """
+    Drop cached predictions not made by model `keep_version`, so uploads
+    of a known image are classified again by the new model instead of
+    reusing an old label. Returns the number of blobs cleared.
+    """
+    return (
+        ImageBlob.objects.filter(predicted_report_type__isnull=False)
+        .exclude(predicted_model_version=keep_version)
+        .update(predicted_report_type=None, predicted_model_version=None)
+    )
+
+
+def cache_prediction(blob, predicted_type, model_version=None):
+    ImageBlob.objects.filter(blob_id=blob.blob_id).update(
+        predicted_report_type=predicted_type, predicted_model_version=model_version,
+    )
+    blob.predicted_report_type = predicted_type
+    blob.predicted_model_version = model_version
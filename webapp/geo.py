@@ -0,0 +1,199 @@
+# webapp/geo.py
+"""
+Geospatial queries over report geotags without PostGIS.
+
+Each geotagged report stores a geohash in `Report.geohash` (B-tree
+indexed). Points sharing a geohash prefix lie in the same grid cell, so
+"everything in this box" becomes a handful of indexed range scans
+(`geohash >= cell AND geohash < cell + '{'`) followed by an exact
+lat/long check. Radius and k-nearest queries are built on top of the
+bounding-box query and refined with the haversine distance.
+"""
+import json
+import math
+
+from django.db.models import Q
+from django.urls import reverse
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9          # ~5 m cells; what is stored on Report
+MAX_COVER_CELLS = 16           # ranges per bounding-box query
+PREFIX_END = "{"               # sorts after every geohash character
+EARTH_RADIUS_KM = 6371.0088
+
+# ----------------------------
+# Geohash
+# ----------------------------
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            value = (value << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = (value << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """(height in degrees latitude, width in degrees longitude) of a cell."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cover(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """
+    Geohash prefixes whose cells together cover the box, using the finest
+    precision that needs at most `max_cells` of them. Expects west <= east.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        cols = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+    cells = set()
+    first_row = math.floor((south + 90) / height)
+    first_col = math.floor((west + 180) / width)
+    for row in range(rows):
+        lat = min(89.999999, -90 + (first_row + row + 0.5) * height)
+        for col in range(cols):
+            lng = min(179.999999, -180 + (first_col + col + 0.5) * width)
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+# ----------------------------
+# Distance
+# ----------------------------
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lng, km):
+    """Boxes (south, west, north, east) enclosing the circle; two if it crosses the antimeridian."""
+    dlat = math.degrees(km / EARTH_RADIUS_KM)
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if south == -90.0 or north == 90.0:
+        return [(south, -180.0, north, 180.0)]
+    dlng = math.degrees(km / (EARTH_RADIUS_KM * math.cos(math.radians(max(abs(south), abs(north))))))
+    if dlng >= 180:
+        return [(south, -180.0, north, 180.0)]
+    return split_antimeridian(south, lng - dlng, north, lng + dlng)
+
+
+def _wrap(lng):
+    return lng if -180 <= lng <= 180 else (lng + 180) % 360 - 180
+
+
+def split_antimeridian(south, west, north, east):
+    west, east = _wrap(west), _wrap(east)
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+
+def parse_point(lat, lng):
+    """(lat, lng) as floats, or (None, None) if either is missing or out of range."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, None
+    return lat, lng
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def bbox_filter(south, west, north, east):
+    """Q for reports inside the box; a west > east box crosses the antimeridian."""
+    match = Q()
+    for s, w, n, e in split_antimeridian(south, west, north, east):
+        cells = Q()
+        for cell in cover(s, w, n, e):
+            cells |= Q(geohash__gte=cell, geohash__lt=cell + PREFIX_END)
+        match |= cells & Q(geotag_lat__range=(s, n), geotag_long__range=(w, e))
+    return match
+
+
+def in_bbox(queryset, south, west, north, east):
+    # No ORDER BY: Report's default ordering would steer the planner to the timestamp index.
+    return queryset.filter(bbox_filter(south, west, north, east)).order_by()
+
+
+def within_radius(queryset, lat, lng, km):
+    """
+    Rows of `queryset.values(...)` within `km` of (lat, lng), nearest
+    first, each with a `distance_km` key.
+    """
+    match = Q()
+    for box in radius_bbox(lat, lng, km):
+        match |= bbox_filter(*box)
+    rows = []
+    for row in queryset.filter(match).order_by():
+        row["distance_km"] = haversine_km(lat, lng, row["geotag_lat"], row["geotag_long"])
+        if row["distance_km"] <= km:
+            rows.append(row)
+    rows.sort(key=lambda row: row["distance_km"])
+    return rows
+
+
+def nearest(queryset, lat, lng, k, start_km=1.0):
+    """
+    The k rows closest to (lat, lng). Searches a growing radius: once a
+    circle holds k points, nothing outside it can be closer.
+    """
+    km = start_km
+    while True:
+        rows = within_radius(queryset, lat, lng, km)
+        if len(rows) >= k or km >= math.pi * EARTH_RADIUS_KM:
+            return rows[:k]
+        # Jump straight to a radius likely to hold k points (uniform density guess).
+        km = min(math.pi * EARTH_RADIUS_KM, km * max(2.0, math.sqrt(k / max(1, len(rows)))))
+
+
+# ----------------------------
+# GeoJSON
+# ----------------------------
+FEATURE_FIELDS = ("report_id", "title", "report_type", "status", "timestamp", "geotag_lat", "geotag_long")
+
+
+def feature(row):
+    properties = {
+        "report_id": row["report_id"],
+        "title": row["title"],
+        "report_type": row["report_type"],
+        "status": row["status"],
+        "timestamp": row["timestamp"].isoformat(),
+        "url": reverse("report_detail", args=[row["report_id"]]),
+    }
+    if "distance_km" in row:
+        properties["distance_km"] = round(row["distance_km"], 4)
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [row["geotag_long"], row["geotag_lat"]]},
+        "properties": properties,
+    }
+
+
+def geojson_stream(rows, to_feature=feature):
+    """FeatureCollection text, one feature per chunk, for StreamingHttpResponse."""
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(to_feature(row))
+        separator = ",\n"
+    yield "]}\n"
@@ -0,0 +1,284 @@
+# webapp/leaderboard.py
+"""
+In-memory leaderboard ranking.
+
+Ranks live in an indexable skip list keyed by (-points, user_id), so a
+points change, "rank of user X" and "top N" are all O(log n) (+N) with
+no writes on the read path. Each worker process builds it from the
+`leaderboard` table on first use and then applies:
+  * its own changes immediately (post_save / post_delete signals), and
+  * other workers' changes by polling leaderboard rows with a newer
+    `updated_at` and newly appended points ledger entries.
+Points are Leaderboard.points plus ledger entries not yet compacted.
+"""
+import threading
+import time
+from datetime import timedelta
+from math import log
+from random import random
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Leaderboard, PointsEntry
+
+SYNC_INTERVAL = 5        # seconds between pulls of rows changed by other workers
+REBUILD_INTERVAL = 600   # full rebuild also picks up deleted rows
+SYNC_OVERLAP = timedelta(seconds=2)
+
+
+# ----------------------------
+# Indexable skip list
+# ----------------------------
+class _Greatest:
+    """Sentinel key that sorts after everything."""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return other is self
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __ge__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return other is self
+
+    __hash__ = object.__hash__
+
+
+_END_KEY = _Greatest()
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, next_, width):
+        self.key = key
+        self.next = next_
+        self.width = width
+
+
+class IndexableSkipList:
+    """
+    Sorted collection with O(log n) insert, remove, index-of and
+    positional access (widths record how many items each link skips).
+    """
+
+    MAX_LEVELS = 24
+
+    def __init__(self):
+        self.size = 0
+        self._end = _Node(_END_KEY, [], [])
+        self.head = _Node(None, [self._end] * self.MAX_LEVELS, [1] * self.MAX_LEVELS)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not self._end:
+            yield node.key
+            node = node.next[0]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node = self.head
+        i += 1
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+    def insert(self, key):
+        chain = [None] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.MAX_LEVELS, 1 - int(log(1.0 - random(), 2.0)))
+        new = _Node(key, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is self._end or target.key != key:
+            raise KeyError(key)
+        height = len(target.next)
+        for level in range(height):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(height, self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """0-based position of `key`; KeyError if absent."""
+        position = 0
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        target = node.next[0]
+        if target is self._end or target.key != key:
+            raise KeyError(key)
+        return position
+
+
+# ----------------------------
+# Points source
+# ----------------------------
+def pending_points(user_ids=None):
+    """{user_id: sum of ledger entries not yet folded into Leaderboard.points}"""
+    entries = PointsEntry.objects.filter(compaction_batch__isnull=True)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    return dict(entries.values('user_id').annotate(total=Sum('delta')).values_list('user_id', 'total'))
+
+
+def current_points(user_ids=None):
+    """{user_id: Leaderboard.points + pending ledger entries}"""
+    rows = Leaderboard.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    points = dict(rows.values_list("user_id", "points"))
+    for user_id, total in pending_points(user_ids).items():
+        points[user_id] = points.get(user_id, 0) + total
+    return points
+
+
+# ----------------------------
+# Engine
+# ----------------------------
+class LeaderboardEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._points = {}
+        self._ranking = IndexableSkipList()
+        self._loaded_at = None   # monotonic time of the last full rebuild
+        self._synced_at = None   # monotonic time of the last incremental pull
+        self._watermark = None   # DB time the last pull started from
+
+    # Writes ------------------------------------------------------
+    def update(self, user_id, points):
+        with self._lock:
+            old = self._points.get(user_id)
+            if old == points:
+                return
+            if old is not None:
+                self._ranking.remove((-old, user_id))
+            self._ranking.insert((-points, user_id))
+            self._points[user_id] = points
+
+    def remove(self, user_id):
+        with self._lock:
+            old = self._points.pop(user_id, None)
+            if old is not None:
+                self._ranking.remove((-old, user_id))
+
+    def rebuild(self):
+        started = timezone.now()
+        points = current_points()
+        ranking = IndexableSkipList()
+        for user_id, value in points.items():
+            ranking.insert((-value, user_id))
+        with self._lock:
+            self._points = points
+            self._ranking = ranking
+            self._watermark = started - SYNC_OVERLAP
+            self._loaded_at = self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Apply rows changed by other processes since the last pull."""
+        started = timezone.now()
+        changed = set(Leaderboard.objects.filter(updated_at__gte=self._watermark).values_list("user_id", flat=True))
+        changed.update(PointsEntry.objects.filter(created_at__gte=self._watermark).values_list("user_id", flat=True))
+        if changed:
+            for user_id, points in current_points(changed).items():
+                self.update(user_id, points)
+        with self._lock:
+            self._watermark = started - SYNC_OVERLAP
+            self._synced_at = time.monotonic()
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > getattr(settings, "LEADERBOARD_REBUILD_INTERVAL", REBUILD_INTERVAL):
+            self.rebuild()
+        elif now - self._synced_at > getattr(settings, "LEADERBOARD_SYNC_INTERVAL", SYNC_INTERVAL):
+            self.sync()
+
+    # Reads -------------------------------------------------------
+    def top(self, n):
+        """[(user_id, points, rank), ...] for the first n users."""
+        with self._lock:
+            result = []
+            for rank, (neg_points, user_id) in enumerate(self._ranking, start=1):
+                if rank > n:
+                    break
+                result.append((user_id, -neg_points, rank))
+            return result
+
+    def rank_of(self, user_id):
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._ranking.index((-points, user_id)) + 1
+
+    def __len__(self):
+        return len(self._ranking)
+
+
+engine = LeaderboardEngine()
+
+
+def get_leaderboard():
+    """The process-wide engine, built on first use and kept in sync."""
+    engine.refresh()
+    return engine
+
+
+def top_entries(n):
+    """
+    Leaderboard rows (with user) for the top n, in rank order, each with
+    `.rank` set from the engine. One SELECT, no writes.
+    """
+    top = get_leaderboard().top(n)
+    rows = Leaderboard.objects.select_related("user").in_bulk([user_id for user_id, _, _ in top], field_name="user_id")
+    entries = []
+    for user_id, points, rank in top:
+        entry = rows.get(user_id)
+        if entry is not None:
+            entry.points = points  # includes ledger entries not yet compacted
+            entry.rank = rank
+            entries.append(entry)
+    return entries
@@ -0,0 +1,274 @@
+# webapp/loadtest.py
+"""
+In-process load test of every URL in webapp/urls.py.
+
+Each URL name has a Scenario that builds a request (method, path, data,
+logged-in user) from the seeded data. A scenario is driven by
+`concurrency` threads, each with its own test Client and DB connection,
+for `requests` requests in total. Per scenario the result records:
+  * throughput (requests/second over the scenario's wall time);
+  * latency p50/p90/p99/max;
+  * SQL queries per request, from ProfilingMiddleware;
+  * errors: 5xx responses and exceptions.
+
+Results are plain dicts, so a run can be saved as a JSON baseline and a
+later run compared with it (compare()).
+"""
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from .middleware import USER_COOKIE, set_login_cookie
+from .models import Report, Reward, User
+from .synthetic import PASSWORD, jpeg_bytes
+from .tiles import tile_for
+
+# ----------------------------
+# Scenarios
+# ----------------------------
+@dataclass
+class Scenario:
+    """
+    How to request one URL name. `build(ctx, rng)` returns
+    (method, path, data); `login` picks the user to log in as, if any.
+    """
+
+    name: str
+    build: object
+    login: str = None          # None, "community" or "ngo"
+    ok_statuses: tuple = (200, 302)
+    notes: str = ""
+
+
+class SeedContext:
+    """IDs from the seeded database that scenarios pick from."""
+
+    def __init__(self):
+        self.report_ids = list(Report.objects.values_list("report_id", flat=True))
+        self.reward_ids = list(Reward.objects.values_list("reward_id", flat=True))
+        self.users = {
+            role: list(User.objects.filter(role=role).values_list("user_id", "email"))
+            for role in ("community", "ngo")
+        }
+        self.points = list(Report.objects.filter(geohash__isnull=False).values_list("geotag_lat", "geotag_long")[:1000])
+
+    def user(self, rng, role="community"):
+        return rng.choice(self.users[role] or self.users["community"])
+
+
+def _point(ctx, rng):
+    return rng.choice(ctx.points) if ctx.points else (21.95, 88.9)
+
+
+def _bbox(ctx, rng, size=0.2):
+    lat, lng = _point(ctx, rng)
+    return f"{lng - size:.4f},{lat - size:.4f},{lng + size:.4f},{lat + size:.4f}"
+
+
+def _tile(ctx, rng):
+    z = rng.choice((4, 8, 12))
+    x, y = tile_for(*_point(ctx, rng), z)
+    return f"/reports/tiles/{z}/{x}/{y}.json"
+
+
+def _submit(ctx, rng):
+    photo = jpeg_bytes(rng)
+    lat, lng = _point(ctx, rng)
+    return "post", "/submit-report/", {
+        "title": "Load test report", "description": "Trees cut near the creek", "report_type": "cutting",
+        "geotag_lat": lat, "geotag_lng": lng,
+        "image": SimpleUploadedFile("photo.jpg", photo, content_type="image/jpeg"),
+    }
+
+
+SCENARIOS = [
+    Scenario("home", lambda ctx, rng: ("get", "/", None)),
+    Scenario("login", lambda ctx, rng: ("post", "/login/", {"username": ctx.user(rng)[1], "password": PASSWORD}),
+             notes="POST with a valid password (includes password hashing)"),
+    Scenario("signup", lambda ctx, rng: ("get", "/signup/", None)),
+    Scenario("logout", lambda ctx, rng: ("get", "/logout/", None), login="community"),
+    Scenario("dashboard", lambda ctx, rng: ("get", "/dashboard/", None), login="community"),
+    Scenario("reports_list", lambda ctx, rng: rng.choice((
+        ("get", "/reports/", None),
+        ("get", "/reports/?status=verified", None),
+        ("get", "/reports/?type=cutting", None),
+        ("get", "/reports/?search=mangrove creek", None),
+        ("get", f"/reports/?page={rng.randint(2, 50)}", None),
+    ))),
+    Scenario("report_detail", lambda ctx, rng: ("get", f"/reports/{rng.choice(ctx.report_ids)}/", None)),
+    Scenario("reports_geo", lambda ctx, rng: rng.choice((
+        ("get", f"/reports/geo/?bbox={_bbox(ctx, rng)}", None),
+        ("get", "/reports/geo/?lat=%s&lng=%s&radius_km=5" % _point(ctx, rng), None),
+        ("get", "/reports/geo/?lat=%s&lng=%s&k=20" % _point(ctx, rng), None),
+    ))),
+    Scenario("export_reports", lambda ctx, rng: ("get", "/reports/export.ndjson?status=verified", None), login="ngo",
+             notes="streams every verified report"),
+    Scenario("report_tile", lambda ctx, rng: ("get", _tile(ctx, rng), None)),
+    Scenario("claim_reward", lambda ctx, rng: ("get", f"/claim/{rng.choice(ctx.reward_ids)}/", None), login="community"),
+    Scenario("leaderboard", lambda ctx, rng: ("get", "/leaderboard/", None)),
+    Scenario("password_reset", lambda ctx, rng: ("get", "/password-reset/", None)),
+    Scenario("submit_report", _submit, login="community", notes="multipart POST with a fresh JPEG"),
+    Scenario("rewards", lambda ctx, rng: ("get", "/rewards/", None), login="community"),
+    Scenario("profile", lambda ctx, rng: ("get", "/profile/", None), login="community"),
+    Scenario("about", lambda ctx, rng: ("get", "/about/", None)),
+    Scenario("contact", lambda ctx, rng: ("get", "/contact/", None)),
+    Scenario("ml_metrics", lambda ctx, rng: ("get", "/ml/metrics/", None)),
+    Scenario("classification_jobs", lambda ctx, rng: ("get", "/ml/jobs/", None)),
+    Scenario("metrics", lambda ctx, rng: ("get", "/metrics/", None)),
+]
+
+
+def url_names(resolver=None, namespace=""):
+    """Every named URL pattern reachable from the root URLconf."""
+    names = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        if isinstance(pattern, URLResolver):
+            names += url_names(pattern, namespace + (f"{pattern.namespace}:" if pattern.namespace else ""))
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.append(namespace + pattern.name)
+    return names
+
+
+def uncovered_urls():
+    """URL names without a scenario; a new view should get one."""
+    covered = {s.name for s in SCENARIOS}
+    return [name for name in url_names() if name not in covered]
+
+
+# ----------------------------
+# Running
+# ----------------------------
+@dataclass
+class _Samples:
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, seconds, status, queries, error):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if queries is not None:
+                self.queries.append(queries)
+            self.errors += error
+
+
+def _client(ctx, scenario, rng):
+    client = Client(raise_request_exception=False)
+    if scenario.login:
+        user_id, _ = ctx.user(rng, scenario.login)
+        response = HttpResponse()
+        set_login_cookie(response, User(user_id=user_id))
+        client.cookies[USER_COOKIE] = response.cookies[USER_COOKIE].value
+    return client
+
+
+def _drive(ctx, scenario, count, samples, seed):
+    rng = random.Random(seed)
+    client = _client(ctx, scenario, rng)
+    try:
+        for _ in range(count):
+            method, path, data = scenario.build(ctx, rng)
+            started = time.perf_counter()
+            try:
+                response = getattr(client, method)(path, data) if data is not None else getattr(client, method)(path)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                status = response.status_code
+                error = status >= 500 or status not in scenario.ok_statuses
+                profile = getattr(response, "profile", None)
+                queries = profile.query_count if profile is not None else None
+            except Exception:
+                status, error, queries = "exception", True, None
+            samples.add(time.perf_counter() - started, status, queries, int(error))
+    finally:
+        close_old_connections()
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def run_scenario(ctx, scenario, requests=100, concurrency=4, seed=0):
+    samples = _Samples()
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        # Same thread, so it also works inside a TestCase transaction.
+        _drive(ctx, scenario, requests, samples, seed)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(_drive, ctx, scenario, n, samples, seed * 1000 + i) for i, n in enumerate(shares) if n]:
+                future.result()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(samples.latencies)
+    return {
+        "requests": len(latencies),
+        "errors": samples.errors,
+        "statuses": {str(k): v for k, v in sorted(samples.statuses.items(), key=lambda kv: str(kv[0]))},
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p90": round(_percentile(latencies, 90) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "queries_per_request": {
+            "mean": round(statistics.mean(samples.queries), 2),
+            "max": max(samples.queries),
+        } if samples.queries else None,
+    }
+
+
+def run(scenarios=None, requests=100, concurrency=4, seed=0, progress=None):
+    """{scenario name: result} for the named scenarios (all by default)."""
+    ctx = SeedContext()
+    selected = [s for s in SCENARIOS if scenarios is None or s.name in scenarios]
+    results = {}
+    for scenario in selected:
+        results[scenario.name] = run_scenario(ctx, scenario, requests, concurrency, seed)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+# ----------------------------
+# Baselines
+# ----------------------------
+def compare(current, baseline, max_regression=0.25):
+    """
+    Regressions of `current` against `baseline` (both run() results):
+    throughput down or p99 up by more than `max_regression`, any
+    increase in queries per request, or new errors.
+    """
+    problems = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if before["rps"] and now["rps"] < before["rps"] * (1 - max_regression):
+            problems.append(f"{name}: {now['rps']} req/s, was {before['rps']}")
+        if now["latency_ms"]["p99"] > before["latency_ms"]["p99"] * (1 + max_regression):
+            problems.append(f"{name}: p99 {now['latency_ms']['p99']} ms, was {before['latency_ms']['p99']}")
+        if now["queries_per_request"] and before["queries_per_request"] and (
+            now["queries_per_request"]["mean"] > before["queries_per_request"]["mean"] + 0.5
+        ):
+            problems.append(
+                f"{name}: {now['queries_per_request']['mean']} queries/request, was {before['queries_per_request']['mean']}"
+            )
+        if now["errors"] > before["errors"]:
+            problems.append(f"{name}: {now['errors']} errors, was {before['errors']}")
+    return problems
@@ -0,0 +1,108 @@
+"""
+Compare geohash-indexed geo queries with a naive scan.
+
+    python manage.py benchmark_geo --sizes 10000 100000 1000000
+
+Synthetic geotagged reports (clustered around a few coastal sites) are
+added under a throwaway user until the table holds each size. Bounding
+box, 5 km radius and 20-nearest queries are then timed through
+webapp.geo and through a scan that loads every geotag and filters in
+Python. The synthetic rows are removed at the end; run it against a
+scratch database.
+"""
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from webapp import geo
+from webapp.models import Report, User
+
+# (lat, lng) of the sites synthetic reports cluster around.
+SITES = ((21.95, 88.9), (19.05, 72.85), (9.95, 76.25), (16.3, 81.9), (22.4, 69.4))
+BATCH = 5000
+
+
+def fake_report(rng, user):
+    lat, lng = rng.choice(SITES)
+    lat += rng.gauss(0, 0.5)
+    lng += rng.gauss(0, 0.5)
+    return Report(
+        user=user, title="geo benchmark", description="", report_type="other",
+        geotag_lat=lat, geotag_long=lng, geohash=geo.encode(lat, lng),  # bulk_create skips pre_save
+    )
+
+
+def naive_scan():
+    return list(Report.objects.filter(geotag_lat__isnull=False).values_list("report_id", "geotag_lat", "geotag_long"))
+
+
+def naive_bbox(south, west, north, east):
+    return [r for r in naive_scan() if south <= r[1] <= north and west <= r[2] <= east]
+
+
+def naive_radius(lat, lng, km):
+    return [r for r in naive_scan() if geo.haversine_km(lat, lng, r[1], r[2]) <= km]
+
+
+def naive_nearest(lat, lng, k):
+    return sorted(naive_scan(), key=lambda r: geo.haversine_km(lat, lng, r[1], r[2]))[:k]
+
+
+class Command(BaseCommand):
+    help = "Benchmark geohash bbox/radius/kNN queries against a full scan at several table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--no-baseline", action="store_true", help="Skip the naive scan.")
+        parser.add_argument("--keep", action="store_true", help="Leave the synthetic reports in place.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user = User.objects.create(name="geo-benchmark", password_hash="!", role="community")
+        try:
+            for size in sorted(options["sizes"]):
+                self._fill(rng, user, size)
+                self._measure(rng, options)
+        finally:
+            if not options["keep"]:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {Report._meta.db_table} WHERE user_id = %s", [user.user_id])
+                user.delete()
+
+    def _fill(self, rng, user, size):
+        missing = size - Report.objects.count()
+        while missing > 0:
+            batch = [fake_report(rng, user) for _ in range(min(BATCH, missing))]
+            Report.objects.bulk_create(batch)
+            missing -= len(batch)
+        self.stdout.write(f"\n{size:,} reports")
+
+    def _measure(self, rng, options):
+        rows = Report.objects.values(*geo.FEATURE_FIELDS)
+        lat, lng = rng.choice(SITES)
+        dlat, dlng = 0.05, 0.05 / math.cos(math.radians(lat))
+        box = (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+        cases = [
+            ("bbox", lambda: list(geo.in_bbox(rows, *box)), lambda: naive_bbox(*box)),
+            ("radius 5km", lambda: geo.within_radius(rows, lat, lng, 5), lambda: naive_radius(lat, lng, 5)),
+            ("nearest 20", lambda: geo.nearest(rows, lat, lng, 20), lambda: naive_nearest(lat, lng, 20)),
+        ]
+        for name, indexed, naive in cases:
+            line = f"  {name:<11} index {self._time(indexed, options['repeat']):9.2f} ms"
+            if not options["no_baseline"]:
+                line += f"   scan {self._time(naive, options['repeat']):9.2f} ms"
+            self.stdout.write(line)
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,128 @@
+"""
+Profile what a web worker imports at boot, with `python -X importtime`.
+
+    python manage.py benchmark_imports
+    python manage.py benchmark_imports --json > import-baseline.json
+    python manage.py benchmark_imports --baseline import-baseline.json --max-regression 0.2
+
+Each run is a fresh interpreter that loads the WSGI application and the
+URLconf, as a gunicorn worker does. The report gives the median total
+import time over --repeat runs, the slowest modules and peak RSS. The
+command fails if any --forbid module (the ML stack by default) was
+imported, or if the total regressed more than --max-regression against
+a saved --baseline.
+"""
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Loaded on first inference only (see webapp/views.py and cyfotech12/wsgi.py).
+ML_MODULES = ("tensorflow", "keras", "torch", "ai_edge_litert", "tflite_runtime", "numpy")
+
+PROBE = """
+import importlib, json, resource, sys
+importlib.import_module({module!r})
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({{
+    "modules": sorted(name for name in sys.modules if name.split(".")[0] in {watch!r}),
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """[(module, self µs, cumulative µs, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def profile_once(module, watch=ML_MODULES):
+    probe = PROBE.format(module=module, watch=tuple(watch))
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe], cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if done.returncode:
+        raise CommandError(f"Importing {module} failed:\n{done.stderr[-2000:]}")
+    rows = parse_importtime(done.stderr)
+    probe_result = json.loads(done.stdout.strip().splitlines()[-1])
+    return {
+        "total_ms": sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000,
+        "rss_mb": probe_result["rss_kb"] / 1024,
+        "rows": rows,
+        "loaded": probe_result["modules"],
+    }
+
+
+def import_profile(module=None, repeat=5, top=15, watch=ML_MODULES):
+    """Median import cost of booting `module` (the WSGI module by default) over `repeat` runs."""
+    module = module or settings.WSGI_APPLICATION.rsplit(".", 1)[0]
+    runs = [profile_once(module, watch) for _ in range(repeat)]
+    # Module rankings come from the run closest to the median total.
+    total = statistics.median(run["total_ms"] for run in runs)
+    typical = min(runs, key=lambda run: abs(run["total_ms"] - total))
+    slowest = sorted(typical["rows"], key=lambda row: -row[2])
+    return {
+        "module": module,
+        "runs": repeat,
+        "total_ms": round(total, 1),
+        "rss_mb": round(statistics.median(run["rss_mb"] for run in runs), 1),
+        "modules_imported": len(typical["rows"]),
+        "top_cumulative_ms": [[name, round(us / 1000, 1)] for name, _, us, _ in slowest[:top]],
+        "top_self_ms": [[name, round(us / 1000, 1)] for name, us, _, _ in sorted(typical["rows"], key=lambda row: -row[1])[:top]],
+        "forbidden_loaded": sorted({name.split(".")[0] for run in runs for name in run["loaded"]}),
+    }
+
+
+class Command(BaseCommand):
+    help = "Report (and gate) web worker import time and which heavy modules get imported at boot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", help="Module to import. Default: the WSGI_APPLICATION module.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15, help="Slowest modules to list.")
+        parser.add_argument("--forbid", nargs="*", default=list(ML_MODULES),
+                            help="Top-level packages that must not be imported at boot.")
+        parser.add_argument("--baseline", help="JSON from an earlier --json run to compare against.")
+        parser.add_argument("--max-regression", type=float, default=0.2,
+                            help="Allowed growth of total import time over the baseline (0.2 = 20%%).")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        report = import_profile(options["module"], options["repeat"], options["top"], options["forbid"])
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(
+                f"{report['module']}: {report['total_ms']:.1f} ms importing {report['modules_imported']} modules "
+                f"(median of {report['runs']}), peak RSS {report['rss_mb']:.1f} MB"
+            )
+            self.stdout.write("Slowest (cumulative):")
+            for name, ms in report["top_cumulative_ms"]:
+                self.stdout.write(f"  {ms:9.1f} ms  {name}")
+
+        problems = []
+        if report["forbidden_loaded"]:
+            problems.append(f"imported at boot: {', '.join(report['forbidden_loaded'])}")
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            limit = baseline["total_ms"] * (1 + options["max_regression"])
+            if report["total_ms"] > limit:
+                problems.append(
+                    f"import time {report['total_ms']:.1f} ms is over {limit:.1f} ms "
+                    f"(baseline {baseline['total_ms']:.1f} ms + {options['max_regression']:.0%})"
+                )
+        if problems:
+            raise CommandError("; ".join(problems))
@@ -0,0 +1,106 @@
+"""
+Compare serving backends on CPU: startup, latency, throughput, memory.
+
+    python manage.py benchmark_inference --models webapp/ml_model/report_model.h5 \
+        webapp/ml_model/report_model.tflite webapp/ml_model/report_model.int8.tflite
+
+Each model is measured in a fresh Python process, so memory and load
+time include importing its runtime (TensorFlow for .h5, the LiteRT
+interpreter for .tflite), as a new web worker would. The backend
+follows the file extension.
+"""
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.ml_model import runtime
+from webapp.ml_model.predict import MODEL_PATH, TFLITE_MODEL_PATH
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(path, batch_sizes, repeat):
+    """Numbers for one model, run inside the child process."""
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+    model = runtime.load(path)
+    result = {"model": path, "backend": runtime.backend_for(path), "load_seconds": round(time.perf_counter() - started, 3)}
+
+    rng = np.random.default_rng(0)
+    for size in batch_sizes:
+        x = rng.random((size,) + runtime.input_shape(model), dtype="float32")
+        model.predict(x, batch_size=size, verbose=0)  # warm-up
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            model.predict(x, batch_size=size, verbose=0)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        result[f"batch_{size}"] = {
+            "p50_ms": round(statistics.median(samples) * 1000, 3),
+            "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1000, 3),
+            "images_per_second": round(size / statistics.median(samples), 1),
+        }
+    result["rss_mb"] = round(peak_rss_mb(), 1)
+    result["rss_added_mb"] = round(result["rss_mb"] - baseline_mb, 1)
+    return result
+
+
+class Command(BaseCommand):
+    help = "Benchmark Keras vs TFLite inference (latency, throughput, memory), one process per model."
+
+    def add_arguments(self, parser):
+        default_models = [getattr(settings, "ML_MODEL_PATH", MODEL_PATH)]
+        tflite = getattr(settings, "ML_TFLITE_MODEL_PATH", TFLITE_MODEL_PATH)
+        if os.path.exists(tflite):
+            default_models.append(tflite)
+        parser.add_argument("--models", nargs="+", default=default_models, help=".h5/.keras or .tflite files.")
+        parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+        parser.add_argument("--child", help="Internal: measure this one model and print JSON.")
+
+    def handle(self, *args, **options):
+        batch_sizes, repeat = options["batch_sizes"], options["repeat"]
+        if options["child"]:
+            self.stdout.write(json.dumps(measure(options["child"], batch_sizes, repeat)))
+            return
+
+        results = [self._run_child(path, batch_sizes, repeat) for path in options["models"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"\n{os.path.basename(r['model'])} ({r['backend']}): load {r['load_seconds']:.2f}s, "
+                f"peak RSS {r['rss_mb']:.0f} MB (+{r['rss_added_mb']:.0f} MB for the model and runtime)"
+            )
+            for size in batch_sizes:
+                b = r[f"batch_{size}"]
+                self.stdout.write(
+                    f"  batch {size:<4} p50 {b['p50_ms']:8.2f} ms   p99 {b['p99_ms']:8.2f} ms   {b['images_per_second']:8.1f} img/s"
+                )
+
+    def _run_child(self, path, batch_sizes, repeat):
+        if not os.path.exists(path):
+            raise CommandError(f"No model at {path}.")
+        command = [
+            sys.executable, "-m", "django", "benchmark_inference", "--child", path,
+            "--repeat", str(repeat), "--batch-sizes", *map(str, batch_sizes),
+        ]
+        done = subprocess.run(command, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if done.returncode:
+            raise CommandError(f"Benchmarking {path} failed:\n{done.stderr}")
+        return json.loads(done.stdout.strip().splitlines()[-1])
@@ -0,0 +1,123 @@
+"""
+Measure report search latency as the table grows.
+
+    python manage.py benchmark_search --sizes 10000 100000 1000000
+
+Synthetic reports are added under a throwaway user until the table holds
+each size; a fixed set of queries is then timed against the full-text
+index and (unless --no-baseline) the old icontains scan. The synthetic
+rows are removed at the end. Run it against a scratch database.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from webapp.models import Report, User
+from webapp.search import SEARCH_TABLE, backend, index_reports, search_reports
+
+WORDS = (
+    "pothole garbage overflowing streetlight broken water leak pipe burst sewage drain blocked "
+    "traffic signal damaged road crack flooding illegal dumping graffiti fallen tree power line "
+    "noise pollution smoke fire hydrant sidewalk bench park playground bus stop litter stray dog"
+).split()
+FILLER = "the a near on at by in outside behind next to main street corner market school station".split()
+TYPES = ("pothole", "garbage", "streetlight", "water", "sewage", "traffic", "other")
+QUERIES = ("pothole", "pot", "garbage overflowing", "water leak", "streetlight broken", "drain", "tree power", "xyzzy")
+BATCH = 5000
+
+
+def fake_report(rng, user):
+    words = [rng.choice(WORDS if rng.random() < 0.4 else FILLER) for _ in range(rng.randint(12, 40))]
+    return Report(
+        user=user,
+        title=" ".join(rng.sample(WORDS, 3)).capitalize(),
+        description=" ".join(words),
+        report_type=rng.choice(TYPES),
+    )
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def page(queryset):
+    # What reports_list does: a COUNT for the paginator plus the first page.
+    queryset.count()
+    list(queryset[:10])
+
+
+def icontains(text):
+    queryset = Report.objects.order_by("-timestamp")
+    for word in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=word) | Q(description__icontains=word) | Q(report_type__icontains=word)
+        )
+    return queryset
+
+
+class Command(BaseCommand):
+    help = "Benchmark full-text report search against the icontains scan at several table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query.")
+        parser.add_argument("--no-baseline", action="store_true", help="Skip the icontains comparison.")
+        parser.add_argument("--keep", action="store_true", help="Leave the synthetic reports in place.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user = User.objects.create(name="search-benchmark", password_hash="!", role="community")
+        self.stdout.write(f"Search backend: {backend() or 'icontains fallback'}")
+        try:
+            for size in sorted(options["sizes"]):
+                self._fill(rng, user, size)
+                self._measure(size, options)
+        finally:
+            if not options["keep"]:
+                self._cleanup(user)
+
+    def _fill(self, rng, user, size):
+        missing = size - Report.objects.count()
+        start = time.perf_counter()
+        while missing > 0:
+            batch = [fake_report(rng, user) for _ in range(min(BATCH, missing))]
+            # bulk_create skips signals, so index explicitly (a no-op on MySQL).
+            index_reports(Report.objects.bulk_create(batch))
+            missing -= len(batch)
+        self.stdout.write(f"\n{size:,} reports (filled in {time.perf_counter() - start:.1f}s)")
+
+    def _measure(self, size, options):
+        methods = [("fulltext", lambda q: search_reports(Report.objects.order_by("-timestamp"), q))]
+        if not options["no_baseline"]:
+            methods.append(("icontains", icontains))
+        for name, build in methods:
+            samples = []
+            for text in QUERIES:
+                samples += timed(lambda: page(build(text)), options["repeat"])
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            self.stdout.write(
+                f"  {name:<10} p50 {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms   max {samples[-1]:8.2f} ms"
+            )
+
+    def _cleanup(self, user):
+        # Raw deletes: going through the ORM would load and signal every row.
+        table = Report._meta.db_table
+        with connection.cursor() as cursor:
+            if backend() == "sqlite":
+                cursor.execute(
+                    f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT report_id FROM {table} WHERE user_id = %s)",
+                    [user.user_id],
+                )
+            cursor.execute(f"DELETE FROM {table} WHERE user_id = %s", [user.user_id])
+        user.delete()
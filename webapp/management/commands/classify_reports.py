@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from webapp.classification import WorkerPool, enqueue_unclassified, job_stats, requeue_failed
+from webapp.ml_model.predict import get_registry
+
+
+class Command(BaseCommand):
+    help = "Run the background report classification workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of worker threads.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty instead of polling forever.")
+        parser.add_argument("--enqueue-missing", action="store_true", help="Queue reports that have an image but no prediction.")
+        parser.add_argument("--retry-failed", action="store_true", help="Requeue jobs that exhausted their retries.")
+        parser.add_argument("--compact-interval", type=float, default=30,
+                            help="Seconds between points ledger compactions (0 disables).")
+
+    def handle(self, *args, **options):
+        if options["enqueue_missing"]:
+            self.stdout.write(f"Queued {enqueue_unclassified()} unclassified reports.")
+        if options["retry_failed"]:
+            self.stdout.write(f"Requeued {requeue_failed()} failed jobs.")
+
+        # Load and warm up the model while the pool starts, so the first job does not pay for it.
+        get_registry().preload()
+        pool = WorkerPool(
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            drain=options["drain"],
+            compact_interval=options["compact_interval"],
+        )
+        started = time.perf_counter()
+        pool.run()
+        elapsed = time.perf_counter() - started
+
+        rate = pool.processed / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"Processed {pool.processed} jobs ({pool.failed} failed) in {elapsed:.1f}s, {rate:.2f} jobs/s"
+        )
+        self.stdout.write(f"Queue: {job_stats()}")
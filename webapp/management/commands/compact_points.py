@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from webapp.points import COMPACT_BATCH_SIZE, compact_points
+
+
+class Command(BaseCommand):
+    help = "Fold pending points ledger entries into User.points and Leaderboard.points."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=COMPACT_BATCH_SIZE)
+        parser.add_argument("--loop", type=float, default=None, metavar="SECONDS",
+                            help="Keep running, compacting every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                folded = compact_points(options["batch_size"])
+                total += folded
+                if folded < options["batch_size"]:
+                    break
+            self.stdout.write(f"Compacted {total} ledger entries.")
+            if options["loop"] is None:
+                return
+            time.sleep(options["loop"])
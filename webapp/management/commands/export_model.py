@@ -0,0 +1,56 @@
+"""
+Convert report_model.h5 to TFLite for the "tflite" serving backend.
+
+    python manage.py export_model                       # float32
+    python manage.py export_model --quantize int8 --output webapp/ml_model/report_model.int8.tflite
+
+int8 quantization is calibrated on --calibration-dir (the training
+dataset by default) plus random inputs. After exporting, the file is
+checked against the Keras model on the same inputs; the command
+fails if top-1 agreement drops below --min-agreement.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.ml_model import runtime
+from webapp.ml_model.export import QUANTIZE_MODES, export_tflite, parity, sample_inputs
+from webapp.ml_model.predict import DATASET_DIR, MODEL_PATH, TFLITE_MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = "Export the Keras classifier to TFLite (optionally quantized) and check it against Keras."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default=getattr(settings, "ML_MODEL_PATH", MODEL_PATH))
+        parser.add_argument("--output", default=getattr(settings, "ML_TFLITE_MODEL_PATH", TFLITE_MODEL_PATH))
+        parser.add_argument("--quantize", choices=QUANTIZE_MODES, help="Default: keep float32 weights.")
+        parser.add_argument("--calibration-dir", default=DATASET_DIR, help="Images for int8 calibration and the parity check.")
+        parser.add_argument("--samples", type=int, default=200, help="Calibration images to use.")
+        parser.add_argument("--min-agreement", type=float, help="Default: 1.0 for float32, 0.95 when quantized.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            size = export_tflite(
+                options["model"], options["output"], quantize=options["quantize"],
+                calibration_dir=options["calibration_dir"], calibration_samples=options["samples"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Wrote {options['output']} ({size / 1024:.1f} KB, was {os.path.getsize(options['model']) / 1024:.1f} KB) "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
+
+        reference = runtime.load_keras(options["model"])
+        inputs = sample_inputs(reference, options["calibration_dir"], options["samples"])
+        agreement, max_diff = parity(reference, runtime.load_tflite(options["output"]), inputs)
+        self.stdout.write(f"Parity on {len(inputs)} inputs: top-1 agreement {agreement:.2%}, max |diff| {max_diff:.5f}.")
+        minimum = options["min_agreement"]
+        if minimum is None:
+            minimum = 0.95 if options["quantize"] else 1.0
+        if agreement < minimum:
+            raise CommandError(f"Top-1 agreement {agreement:.2%} is below {minimum:.2%}; not fit to serve.")
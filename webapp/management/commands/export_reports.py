@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from webapp.bulk import EXPORT_FORMATS, export_stream
+from webapp.models import Report
+
+
+class Command(BaseCommand):
+    help = "Export reports as CSV, NDJSON or GeoJSON in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", "-o", default="-", help="File to write; '-' for stdout.")
+        parser.add_argument("--status")
+        parser.add_argument("--type")
+
+    def handle(self, *args, **options):
+        reports = Report.objects.all()
+        if options["status"]:
+            reports = reports.filter(status=options["status"])
+        if options["type"]:
+            reports = reports.filter(report_type=options["type"])
+
+        out = sys.stdout if options["output"] == "-" else open(options["output"], "w", newline="", encoding="utf-8")
+        try:
+            for chunk in export_stream(reports, options["format"]):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,60 @@
+"""
+Generate a large, realistic synthetic dataset for scaling tests.
+
+    python manage.py generate_dataset --users 50000 --reports 2000000 --claims 100000 --images 2000
+    python manage.py generate_dataset --reports 100000 --seed 7 --workers 4
+
+The same --seed always produces the same rows (see webapp/synthetic.py):
+reports clustered along mangrove coastlines, Zipf-skewed activity per
+user, claims, and photos rendered in --workers processes. Synthetic users
+are recognisable by their @synthetic.example.com address, with the seed in
+it, so datasets from different seeds can share a database; generating
+the same seed twice is refused. All synthetic users share one password,
+printed at the end.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp import synthetic
+
+
+class Command(BaseCommand):
+    help = "Create synthetic users, reports, rewards, claims and photos deterministically from a seed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--reports", type=int, default=1000000)
+        parser.add_argument("--rewards", type=int, default=50)
+        parser.add_argument("--claims", type=int, default=20000)
+        parser.add_argument("--images", type=int, default=500, help="Distinct photos shared by the reports.")
+        parser.add_argument("--days", type=int, default=730, help="Spread report timestamps over this many days.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=synthetic.BATCH_SIZE, help="Rows per INSERT transaction.")
+        parser.add_argument("--workers", type=int, help="Processes rendering photos. Default: one per CPU.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1.")
+        if synthetic.synthetic_users(options["seed"]).exists():
+            raise CommandError(f"A dataset with seed {options['seed']} already exists; use another --seed.")
+
+        started = time.perf_counter()
+        stage_started = {}
+
+        def progress(stage, done, total):
+            stage_started.setdefault(stage, time.perf_counter())
+            elapsed = time.perf_counter() - stage_started[stage]
+            rate = f", {done / elapsed:,.0f}/s" if elapsed > 0 else ""
+            self.stdout.write(f"\r{stage}: {done:,}/{total:,}{rate}   ", ending="\n" if done == total else "")
+            self.stdout.flush()
+
+        counts = synthetic.seed(
+            users=options["users"], reports=options["reports"], rewards=options["rewards"],
+            images=options["images"], claims=options["claims"], seed=options["seed"], days=options["days"],
+            batch_size=options["batch_size"], workers=options["workers"], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Created " + ", ".join(f"{n:,} {what}" for what, n in counts.items())
+            + f" in {time.perf_counter() - started:.1f}s. Password for every user: {synthetic.PASSWORD}"
+        ))
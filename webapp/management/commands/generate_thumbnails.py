@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from webapp.models import Report
+from webapp.thumbnails import record_thumbnails, render_derivatives, thumbnail_widths
+
+
+class Command(BaseCommand):
+    help = "Backfill WebP/JPEG thumbnails for existing report images using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: CPU count).")
+        parser.add_argument("--chunk", type=int, default=500, help="Images submitted to the pool at a time.")
+        parser.add_argument("--force", action="store_true", help="Also re-check reports that already have thumbnails.")
+
+    def handle(self, *args, **options):
+        reports = Report.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            reports = reports.filter(thumbnail_widths__isnull=True)
+        # order_by() drops Meta.ordering so DISTINCT applies to the name only.
+        names = reports.order_by().values_list("image", flat=True).distinct().iterator()
+
+        widths = thumbnail_widths()
+        done = failed = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                chunk = list(islice(names, options["chunk"]))
+                if not chunk:
+                    break
+                futures = {
+                    pool.submit(render_derivatives, default_storage.path(name), widths): name
+                    for name in chunk
+                }
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        record_thumbnails(name, future.result())
+                        done += 1
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f"{name}: {exc}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Generated thumbnails for {done} images ({failed} failed) in {elapsed:.1f}s"
+        )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from webapp.bulk import IMPORT_BATCH_SIZE, guess_format, import_reports, read_rows
+from webapp.models import User
+
+
+class Command(BaseCommand):
+    help = "Import reports from a CSV, NDJSON or GeoJSON file, optionally with photos from a directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson", "geojson"],
+                            help="Defaults to the file extension.")
+        parser.add_argument("--user", required=True,
+                            help="Email or user_id owning rows without a user_email column.")
+        parser.add_argument("--images", metavar="DIR",
+                            help="Directory that the rows' `image` column is relative to.")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--no-classify", action="store_true",
+                            help="Don't queue classification jobs for imported photos.")
+
+    def handle(self, *args, **options):
+        match = Q(email=options["user"])
+        if options["user"].isdigit():
+            match |= Q(user_id=int(options["user"]))
+        user = User.objects.filter(match).first()
+        if user is None:
+            raise CommandError(f"No user {options['user']!r}.")
+        fmt = options["format"] or guess_format(options["path"])
+
+        with open(options["path"], newline="", encoding="utf-8") as f:
+            try:
+                created, errors = import_reports(
+                    read_rows(f, fmt), user,
+                    image_dir=options["images"],
+                    batch_size=options["batch_size"],
+                    classify=not options["no_classify"],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        for line, message in errors:
+            self.stderr.write(f"{options['path']}:{line}: {message}")
+        self.stdout.write(f"Imported {created} reports, skipped {len(errors)}.")
@@ -0,0 +1,114 @@
+"""
+Load test every webapp URL in-process against a seeded scratch database.
+
+    python manage.py loadtest
+    python manage.py loadtest --users 500 --reports 20000 --concurrency 8 --output loadtest-baseline.json
+    python manage.py loadtest --compare loadtest-baseline.json --max-regression 0.25
+    python manage.py loadtest --urls reports_list report_tile --requests 500
+
+A test database is created next to the configured one (test_<NAME> on
+MySQL, a temporary file on SQLite), seeded with webapp.synthetic, and
+dropped afterwards; uploaded photos go to a temporary MEDIA_ROOT. Each
+URL is then driven by --concurrency clients (see webapp/loadtest.py).
+URLs answering with errors are listed; the command fails if any URL
+has no scenario, or if --compare finds a regression (including new
+errors) against a saved --output.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from webapp import loadtest, synthetic
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch database and measure throughput, latency and queries per request for every URL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--reports", type=int, default=5000)
+        parser.add_argument("--rewards", type=int, default=20)
+        parser.add_argument("--images", type=int, default=20, help="Distinct photos shared by the reports.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--concurrency", type=int, default=4, help="Client threads per URL.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per URL.")
+        parser.add_argument("--urls", nargs="*", help="URL names to run. Default: all.")
+        parser.add_argument("--output", help="Write the results as JSON, e.g. as a baseline.")
+        parser.add_argument("--compare", help="JSON from an earlier --output run to compare against.")
+        parser.add_argument("--max-regression", type=float, default=0.25,
+                            help="Allowed drop in req/s or growth in p99 over the baseline (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        missing = loadtest.uncovered_urls()
+        if missing:
+            raise CommandError(f"No load test scenario for: {', '.join(missing)} (add one to webapp/loadtest.py)")
+        unknown = set(options["urls"] or ()) - {s.name for s in loadtest.SCENARIOS}
+        if unknown:
+            raise CommandError(f"Unknown URL names: {', '.join(sorted(unknown))}")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            for alias in connections:
+                if connections[alias].vendor == "sqlite":
+                    # The default in-memory test database can't be shared by client threads.
+                    connections[alias].settings_dict["TEST"]["NAME"] = os.path.join(scratch, f"{alias}.sqlite3")
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                with override_settings(MEDIA_ROOT=os.path.join(scratch, "media")):
+                    results = self._run(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        report = {
+            "settings": {k: options[k] for k in ("users", "reports", "rewards", "images", "seed", "concurrency", "requests")},
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        failing = [name for name, r in results.items() if r["errors"]]
+        if failing:
+            self.stderr.write(f"Errors from: {', '.join(failing)}")
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                problems = loadtest.compare(results, json.load(f)["results"], options["max_regression"])
+            if problems:
+                raise CommandError("; ".join(problems))
+
+    def _run(self, options):
+        started = time.perf_counter()
+        counts = synthetic.seed(
+            users=options["users"], reports=options["reports"], rewards=options["rewards"],
+            images=options["images"], seed=options["seed"],
+        )
+        self.stdout.write(
+            "Seeded " + ", ".join(f"{n} {what}" for what, n in counts.items()) + f" in {time.perf_counter() - started:.1f}s"
+        )
+        self.stdout.write(f"{'url':<22}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+
+        def progress(name, r):
+            queries = r["queries_per_request"]["mean"] if r["queries_per_request"] else "-"
+            self.stdout.write(
+                f"{name:<22}{r['rps']:>9}{r['latency_ms']['p50']:>9}{r['latency_ms']['p90']:>9}"
+                f"{r['latency_ms']['p99']:>9}{queries:>9}{r['errors']:>8}"
+            )
+
+        # Error responses are counted in the results; don't log a traceback for each one.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            return loadtest.run(
+                options["urls"], options["requests"], options["concurrency"], options["seed"], progress=progress,
+            )
+        finally:
+            request_logger.setLevel(level)
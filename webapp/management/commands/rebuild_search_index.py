@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.search import backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the report full-text search index (e.g. after raw SQL or bulk imports)."
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(f"Indexed {count} reports ({backend() or 'no full-text backend'}).")
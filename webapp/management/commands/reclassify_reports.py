@@ -0,0 +1,162 @@
+"""
+Re-run the model over every report photo, e.g. after shipping a new
+report_model.h5.
+
+    python manage.py reclassify_reports --batch-size 256 --workers 8
+
+Reports are walked in report_id order. While the model runs on one
+batch, a thread pool reads and decodes the next (Pillow releases the
+GIL while decoding). Reports sharing a photo are predicted once.
+Predictions and the model version are written with bulk_update. After
+every batch the last report_id is saved to a checkpoint file, so an
+interrupted run continues where it stopped, as long as the same model
+version is serving.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from webapp import pagecache, stats, tiles
+from webapp.ml_model.predict import get_class_names, model_version, predict_batch
+from webapp.ml_model.preprocess import INPUT_SHAPE, decode_into, read_bytes
+from webapp.models import ImageBlob, Report
+
+DEFAULT_CHECKPOINT = os.path.join(settings.MEDIA_ROOT, "cache", "reclassify.checkpoint")
+
+
+class Command(BaseCommand):
+    help = "Re-predict report_type for all report photos with the current model (resumable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=256, help="Images per model.predict call.")
+        parser.add_argument("--workers", type=int, default=8, help="Threads reading and decoding images.")
+        parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Where progress is recorded.")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        self.class_names = get_class_names()
+        self.checkpoint = options["checkpoint"]
+        self.version = model_version()
+        start_after = 0 if options["restart"] else self._read_checkpoint()
+        if start_after:
+            self.stdout.write(f"Resuming after report {start_after}.")
+
+        images = reports = failed = 0
+        started = time.perf_counter()
+        batches = self._batches(start_after, options["batch_size"])
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            pending = self._prefetch(pool, next(batches, None))
+            while pending is not None:
+                rows, names, x, futures = pending
+                # Decode the next batch while this one is predicted.
+                pending = self._prefetch(pool, next(batches, None))
+
+                ok = [i for i, future in enumerate(futures) if self._decoded(future, names[i])]
+                failed += len(names) - len(ok)
+                labels = {}
+                if ok:
+                    # The registry may swap in a new model mid-run; record what actually ran.
+                    self.version, predictions = predict_batch(x[ok])
+                    labels = {names[i]: self.class_names[int(p.argmax())] for i, p in zip(ok, predictions)}
+                reports += self._save(rows, labels)
+                images += len(ok)
+                self._write_checkpoint(rows[-1][0])
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {reports} reports, {images} images, {images / elapsed:.1f} img/s")
+
+        if reports:
+            # bulk_update sent no signals.
+            stats.reset()
+            tiles.invalidate_all()
+            pagecache.invalidate_reports()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Reclassified {reports} reports ({images} images decoded, {failed} unreadable) "
+            f"in {elapsed:.1f}s, {images / elapsed if elapsed else 0:.1f} img/s."
+        )
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    # Reading -----------------------------------------------------
+    def _batches(self, start_after, size):
+        """Lists of (report_id, image, status, report_type, blob_id) rows, keyset-paginated."""
+        reports = (
+            Report.objects.exclude(image="").exclude(image__isnull=True)
+            .order_by("report_id")
+            .values_list("report_id", "image", "status", "report_type", "image_blob_id")
+        )
+        last = start_after
+        while True:
+            rows = list(reports.filter(report_id__gt=last)[:size])
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def _prefetch(self, pool, rows):
+        if rows is None:
+            return None
+        names = list(dict.fromkeys(row[1] for row in rows))
+        x = np.empty((len(names),) + INPUT_SHAPE, dtype="float32")
+        futures = [pool.submit(self._decode, name, x[i]) for i, name in enumerate(names)]
+        return rows, names, x, futures
+
+    def _decode(self, name, out):
+        # Straight into the batch array; the per-request tensor cache is left alone.
+        decode_into(read_bytes(default_storage.path(name)), out)
+
+    def _decoded(self, future, name):
+        try:
+            future.result()
+            return True
+        except Exception as exc:
+            self.stderr.write(f"{name}: {exc}")
+            return False
+
+    # Writing -----------------------------------------------------
+    def _save(self, rows, labels):
+        updates, blobs = [], {}
+        for report_id, image, status, report_type, blob_id in rows:
+            label = labels.get(image)
+            if label is None:
+                continue
+            # Same rule as apply_prediction(): a match verifies a pending report, nothing is demoted.
+            if status == "pending" and label == report_type:
+                status = "verified"
+            updates.append(Report(
+                report_id=report_id, predicted_report_type=label, predicted_model_version=self.version, status=status,
+            ))
+            if blob_id is not None:
+                blobs[blob_id] = ImageBlob(blob_id=blob_id, predicted_report_type=label, predicted_model_version=self.version)
+        fields = ["predicted_report_type", "predicted_model_version"]
+        with transaction.atomic():
+            Report.objects.bulk_update(updates, fields + ["status"], batch_size=500)
+            ImageBlob.objects.bulk_update(blobs.values(), fields, batch_size=500)
+        return len(updates)
+
+    # Checkpoint --------------------------------------------------
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get("model") != self.version:
+            self.stdout.write("Checkpoint was written for a different model; starting over.")
+            return 0
+        return state.get("last_report_id", 0)
+
+    def _write_checkpoint(self, report_id):
+        os.makedirs(os.path.dirname(self.checkpoint) or ".", exist_ok=True)
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"model": self.version, "last_report_id": report_id}, f)
+        os.replace(tmp, self.checkpoint)
@@ -0,0 +1,78 @@
+# webapp/middleware.py
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import User
+
+USER_COOKIE = "user_id"
+USER_COOKIE_SALT = "webapp.user_id"
+USER_CACHE_TTL = 300
+USER_SESSION_MAX_AGE = 14 * 24 * 60 * 60
+
+
+def session_max_age():
+    return getattr(settings, "USER_SESSION_MAX_AGE", USER_SESSION_MAX_AGE)
+
+
+def _cache():
+    # Shared by all processes, so invalidate_user() reaches every worker.
+    return caches[getattr(settings, "USER_CACHE", "shared")]
+
+
+def check_settings():
+    """Called at startup (WebappConfig.ready)."""
+    from .pagecache import require_shared
+
+    require_shared(getattr(settings, "USER_CACHE", "shared"), "USER_CACHE")
+
+
+def user_cache_key(user_id):
+    return f"webapp:user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Small User record (no password hash) from the shared cache, loaded
+    from the DB on a miss. Cache gets return a fresh copy, so views may
+    modify the instance freely.
+    """
+    key = user_cache_key(user_id)
+    cache = _cache()
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.defer("password_hash").filter(user_id=user_id).first()
+        if user is not None:
+            cache.set(key, user, getattr(settings, "USER_CACHE_TTL", USER_CACHE_TTL))
+    return user
+
+
+def invalidate_user(user_id):
+    _cache().delete(user_cache_key(user_id))
+
+
+def set_login_cookie(response, user):
+    # Signed and timestamped; expired or tampered cookies are ignored.
+    response.set_signed_cookie(
+        USER_COOKIE, user.user_id, salt=USER_COOKIE_SALT,
+        max_age=session_max_age(), httponly=True, samesite="Lax",
+    )
+    return response
+
+
+# ----------------------------
+# Middleware
+# ----------------------------
+class CurrentUserMiddleware:
+    """Resolve the logged-in user once per request as `request.logged_user`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.logged_user = None
+        user_id = request.get_signed_cookie(
+            USER_COOKIE, default=None, salt=USER_COOKIE_SALT, max_age=session_max_age(),
+        )
+        if user_id and user_id.isdigit():
+            request.logged_user = get_cached_user(int(user_id))
+        return self.get_response(request)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0003_classificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('blob_id', models.AutoField(primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('phash', models.CharField(max_length=16)),
+                ('phash_band0', models.IntegerField(db_index=True)),
+                ('phash_band1', models.IntegerField(db_index=True)),
+                ('phash_band2', models.IntegerField(db_index=True)),
+                ('phash_band3', models.IntegerField(db_index=True)),
+                ('file', models.ImageField(upload_to='reports/')),
+                ('size', models.IntegerField()),
+                ('predicted_report_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'image_blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='webapp.report'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='image_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='webapp.imageblob'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0004_imageblob_report_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='thumbnail_widths',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0006_leaderboard_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('entry_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('report', 'Report submitted'), ('reward', 'Reward claimed'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('compaction_batch', models.CharField(blank=True, max_length=32, null=True)),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webapp.report')),
+                ('reward', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webapp.reward')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to='webapp.user')),
+            ],
+            options={
+                'db_table': 'points_ledger',
+                'indexes': [models.Index(fields=['user', 'compaction_batch'], name='points_ledg_user_id_dee123_idx'), models.Index(fields=['compaction_batch', 'entry_id'], name='points_ledg_compact_e00995_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from webapp.search import create_index
+    create_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    from webapp.search import drop_index
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0007_points_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0008_report_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['timestamp', 'report_id'], name='report_timesta_eac6bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', 'timestamp', 'report_id'], name='report_status_8d143f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['report_type', 'timestamp', 'report_id'], name='report_report__d87bea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', 'timestamp', 'report_id'], name='report_user_id_7dbadc_idx'),
+        ),
+    ]
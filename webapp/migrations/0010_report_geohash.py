@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from webapp.geo import encode
+
+    Report = apps.get_model('webapp', 'Report')
+    reports = Report.objects.filter(geotag_lat__isnull=False, geotag_long__isnull=False).only('geotag_lat', 'geotag_long')
+    batch = []
+    for report in reports.iterator(chunk_size=2000):
+        report.geohash = encode(report.geotag_lat, report.geotag_long)
+        batch.append(report)
+        if len(batch) == 2000:
+            Report.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Report.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0009_report_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
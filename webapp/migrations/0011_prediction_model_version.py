@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0010_report_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageblob',
+            name='predicted_model_version',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='predicted_model_version',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
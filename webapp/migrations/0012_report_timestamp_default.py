@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0011_prediction_model_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# webapp/ml_model/batching.py
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent predict calls into one batch and runs a single
+    vectorized predict per batch on a dedicated worker thread.
+
+    A batch is closed when it holds `max_batch_size` rows or when
+    `max_wait_ms` has passed since its first item arrived.
+
+    `predict_fn(x)` returns (model_version, predictions); every caller
+    in the batch gets the version along with its own rows.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5, latency_window=2048):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._latency_window = latency_window
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=self._latency_window)
+        self._thread = None
+
+    def _ensure_started(self):
+        # gunicorn forks workers after import, so the thread must be
+        # started (or restarted) from inside the serving process.
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._reset()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="ml-batcher", daemon=True)
+            self._thread.start()
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def submit(self, x):
+        """Queue a batch of rows (first axis) and return a Future of (model_version, predictions)."""
+        x = np.asarray(x, dtype="float32")
+        if x.ndim == 0:
+            raise ValueError("predict input must have a batch dimension")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((x, future, time.perf_counter()))
+        return future
+
+    def predict(self, x, timeout=None):
+        return self.submit(x).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            histogram = dict(sorted(self._batch_sizes.items()))
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": sum(histogram.values()),
+            "batch_size_histogram": histogram,
+            "latency_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+            "latency_p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    # ----------------------------
+    # Worker
+    # ----------------------------
+    def _run(self):
+        carry = None
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            batch = [first]
+            rows = len(first[0])
+            shape = first[0].shape[1:]
+            deadline = time.perf_counter() + self.max_wait
+
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                # Incompatible shapes or an overfull batch start the next one.
+                if item[0].shape[1:] != shape or rows + len(item[0]) > self.max_batch_size:
+                    carry = item
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self._run_batch(batch, rows)
+
+    def _run_batch(self, batch, rows):
+        try:
+            x = batch[0][0] if len(batch) == 1 else np.concatenate([item[0] for item in batch], axis=0)
+            version, preds = self.predict_fn(x)
+        except Exception as exc:
+            for _, future, _ in batch:
+                future.set_exception(exc)
+            return
+
+        done = time.perf_counter()
+        offset = 0
+        with self._lock:
+            self._batch_sizes[rows] += 1
+            for x, _, enqueued in batch:
+                self._latencies.append(done - enqueued)
+        for x, future, _ in batch:
+            future.set_result((version, preds[offset:offset + len(x)]))
+            offset += len(x)
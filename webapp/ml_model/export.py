@@ -0,0 +1,91 @@
+# webapp/ml_model/export.py
+"""
+Convert the Keras classifier to TFLite for the "tflite" serving backend.
+
+    quantize=None       float32 weights, same outputs as Keras to ~1e-5
+    quantize="dynamic"  int8 weights, float activations; ~4x smaller
+    quantize="int8"     int8 weights and activations, calibrated on
+                        sample inputs; smallest and fastest on CPU
+
+Needs full TensorFlow, so run it once per model on a build machine,
+not in web workers.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from .preprocess import INPUT_SHAPE, preprocess_image
+from .runtime import input_shape
+
+QUANTIZE_MODES = ("dynamic", "int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+NOISE_SAMPLES = 64
+
+
+def sample_images(directory, limit):
+    """Up to `limit` image paths under `directory`, sorted for repeatability."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit]
+
+
+def sample_inputs(model, image_dir=None, limit=200, noise=NOISE_SAMPLES, seed=0):
+    """
+    float32 inputs for calibration and parity checks: preprocessed images
+    from `image_dir` if the model takes images, plus `noise` rows of
+    uniform [0, 1) noise (inputs are scaled to [0, 1] like training).
+    """
+    shape = input_shape(model)
+    rows = []
+    if image_dir and shape == INPUT_SHAPE:
+        rows = [preprocess_image(path) for path in sample_images(image_dir, limit)]
+    rows.extend(np.random.default_rng(seed).random((noise,) + shape, dtype="float32"))
+    return np.stack(rows)
+
+
+def export_tflite(model_path, output_path, quantize=None, calibration_dir=None, calibration_samples=200):
+    """Write `model_path` as a .tflite file; returns the output size in bytes."""
+    import tensorflow as tf
+
+    if quantize not in (None,) + QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantization {quantize!r}; expected one of {', '.join(QUANTIZE_MODES)}.")
+    model = tf.keras.models.load_model(model_path)
+    with tempfile.TemporaryDirectory() as saved_model:
+        # Keras 3 models convert through a SavedModel export.
+        model.export(saved_model, verbose=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model)
+        if quantize:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "int8":
+            calibration = sample_inputs(model, calibration_dir, calibration_samples)
+            converter.representative_dataset = lambda: ([row[np.newaxis]] for row in calibration)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        flatbuffer = converter.convert()
+
+    tmp = f"{output_path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(flatbuffer)
+    # Atomic, so a registry watching output_path never reads half a file.
+    os.replace(tmp, output_path)
+    return len(flatbuffer)
+
+
+def _labels(preds):
+    # A single sigmoid output is a yes/no score.
+    return preds[:, 0] > 0.5 if preds.shape[-1] == 1 else preds.argmax(axis=1)
+
+
+def parity(reference, candidate, inputs):
+    """
+    Compare two models' predictions on the same inputs.
+    Returns (top-1 agreement 0..1, max absolute output difference).
+    """
+    expected = reference.predict(inputs, batch_size=len(inputs), verbose=0)
+    actual = candidate.predict(inputs, batch_size=len(inputs), verbose=0)
+    agreement = float(np.mean(_labels(expected) == _labels(actual)))
+    return agreement, float(np.max(np.abs(expected - actual)))
@@ -2,33 +2,127 @@
 import os
 from functools import lru_cache
 
-# Use tf.keras so it matches your installed TensorFlow/Keras
-from tensorflow import keras
+from django.conf import settings
+
+from . import runtime
+from .batching import MicroBatcher
+from .preprocess import preprocess_image
+from .registry import ModelRegistry
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "report_model.h5")
+TFLITE_MODEL_PATH = os.path.join(BASE_DIR, "report_model.tflite")
+DATASET_DIR = os.path.join(BASE_DIR, "dataset")
+
+def warm_up(model):
+    """
+    Predict on zeros at the batch sizes requests will use, so graph
+    tracing happens before the swap, and check the output width against
+    the class labels.
+    """
+    import numpy as np
+    shape = runtime.input_shape(model)
+    for size in sorted({1, getattr(settings, "ML_BATCH_MAX_SIZE", 32)}):
+        preds = model.predict(np.zeros((size,) + shape, dtype="float32"), batch_size=size, verbose=0)
+    if preds.shape[-1] != len(get_class_names()):
+        raise ValueError(f"Model has {preds.shape[-1]} outputs but there are {len(get_class_names())} classes.")
+
+def serving_model():
+    """(backend, path) selected by the ML_BACKEND setting."""
+    backend = getattr(settings, "ML_BACKEND", "keras")
+    if backend == "tflite":
+        return backend, getattr(settings, "ML_TFLITE_MODEL_PATH", TFLITE_MODEL_PATH)
+    return backend, getattr(settings, "ML_MODEL_PATH", MODEL_PATH)
+
+def _forget_stale_predictions(loaded):
+    # Blob predictions are reused for identical uploads; only this version's may be.
+    import threading
+    from django.db import connection
+    from webapp.dedup import forget_predictions
+
+    try:
+        forget_predictions(keep_version=loaded.version)
+    finally:
+        if threading.current_thread().name == "ml-model-loader":
+            connection.close()  # the thread ends here; don't leak its connection
 
 @lru_cache(maxsize=1)
+def get_registry():
+    """
+    The process-wide model registry. A changed model file is loaded and
+    warmed up in the background and swapped in without a restart.
+    """
+    backend, path = serving_model()
+    return ModelRegistry(
+        path,
+        load=lambda path: runtime.load(path, backend),
+        warm_up=warm_up,
+        poll_seconds=getattr(settings, "ML_MODEL_POLL_SECONDS", 30),
+        on_swap=_forget_stale_predictions,
+    )
+
 def get_model():
     """
-    Load the model once, on first use (not at import time).
-    Raises a clear error if the file is missing.
+    The model currently serving. Loads it on first use (not at import
+    time) and raises a clear error if the file is missing.
+    """
+    return get_registry().current().model
+
+def model_version():
+    return get_registry().current().version
+
+def predict_batch(x):
+    """
+    One forward pass for a whole batch (a micro-batch, or an offline
+    reclassification batch). Returns (model_version, predictions).
     """
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(
-            f"ML model file missing at: {MODEL_PATH}\n"
-            f"Place 'report_model.h5' in this folder."
-        )
-    return keras.models.load_model(MODEL_PATH)
+    loaded = get_registry().current()
+    return loaded.version, loaded.model.predict(x, batch_size=len(x), verbose=0)
+
+@lru_cache(maxsize=1)
+def get_batcher():
+    """
+    Shared micro-batcher: concurrent predict_report calls from every
+    request thread are merged into one model.predict() per batch.
+    """
+    return MicroBatcher(
+        predict_batch,
+        max_batch_size=getattr(settings, "ML_BATCH_MAX_SIZE", 32),
+        max_wait_ms=getattr(settings, "ML_BATCH_MAX_WAIT_MS", 5),
+    )
 
 def predict_report(input_data):
     """
     Your actual prediction function.
-    Update pre/post-processing as per your model.
+
+    Accepts an image path / raw image bytes (decoded, resized and
+    normalized like training) or an already preprocessed array batch.
+    """
+    import numpy as np
+    if isinstance(input_data, (str, bytes, os.PathLike)):
+        x = preprocess_image(input_data)[np.newaxis]
+    else:
+        x = np.array(input_data, dtype="float32")
+    return get_batcher().predict(x)[1]
+
+@lru_cache(maxsize=1)
+def get_class_names():
+    """
+    Class labels in model output order. flow_from_directory in
+    train_model.py assigns indices in sorted sub-folder order.
+    """
+    return sorted(
+        name for name in os.listdir(DATASET_DIR)
+        if os.path.isdir(os.path.join(DATASET_DIR, name))
+    )
+
+def classify_report_image(file_path, content_hash=None):
+    """
+    Run the model on one uploaded report image and return
+    (predicted report type label, model version). Passing the upload's
+    SHA-256 lets a cached tensor be used without reading the file at all.
     """
-    model = get_model()
-    # Example: adapt this for your real input/output
     import numpy as np
-    x = np.array(input_data, dtype="float32")
-    preds = model.predict(x)
-    return preds
+    x = preprocess_image(file_path, key=content_hash)[np.newaxis]
+    version, preds = get_batcher().predict(x)
+    return get_class_names()[int(preds[0].argmax())], version
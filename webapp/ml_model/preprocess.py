@@ -0,0 +1,152 @@
+# webapp/ml_model/preprocess.py
+"""
+Decode / resize / normalize uploads exactly like training does
+(train_model.py: target_size=(128,128), rescale=1./255) and cache the
+resulting tensor by content hash.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Must match target_size in train_model.py
+IMAGE_SIZE = (128, 128)
+CHANNELS = 3
+INPUT_SHAPE = IMAGE_SIZE + (CHANNELS,)
+
+CACHE_SIZE = 256  # ~192 KB per tensor
+
+
+class TensorCache:
+    """Thread-safe LRU of preprocessed tensors, optionally mirrored to .npy files."""
+
+    def __init__(self, maxsize=CACHE_SIZE, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.npy")
+
+    def get(self, key):
+        with self._lock:
+            tensor = self._data.get(key)
+            if tensor is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return tensor
+        if self.directory and os.path.exists(self._file(key)):
+            tensor = np.load(self._file(key))
+            self.put(key, tensor, persist=False)
+            with self._lock:
+                self.hits += 1
+            return tensor
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, tensor, persist=True):
+        tensor = np.array(tensor, dtype="float32", copy=True)
+        tensor.setflags(write=False)
+        with self._lock:
+            self._data[key] = tensor
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        if persist and self.directory:
+            path = self._file(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, tensor)
+            os.replace(tmp, path)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+                _cache = TensorCache(
+                    maxsize=getattr(settings, "ML_TENSOR_CACHE_SIZE", CACHE_SIZE),
+                    directory=getattr(settings, "ML_TENSOR_CACHE_DIR", None),
+                )
+    return _cache
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def decode_into(data, out):
+    """
+    Decode image bytes straight into `out` (float32, INPUT_SHAPE).
+
+    JPEGs use Pillow's draft mode so the decoder itself downsamples by a
+    power of two instead of materialising the full-resolution image.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", IMAGE_SIZE)
+        img = img.convert("RGB")
+        # Keras' load_img defaults to nearest-neighbour, keep serving identical.
+        img = img.resize(IMAGE_SIZE, Image.NEAREST)
+        np.multiply(np.asarray(img, dtype=np.uint8), np.float32(1.0 / 255), out=out, casting="unsafe")
+    return out
+
+
+def preprocess_image(source, out=None, key=None):
+    """
+    Return the (128, 128, 3) float32 model input for an image path or bytes.
+
+    Pass `out` to write into a preallocated buffer (e.g. one row of a
+    batch); `key` is the content hash if the caller already has it.
+    """
+    data = None
+    if key is None:
+        data = read_bytes(source)
+        key = content_hash(data)
+
+    cache = get_cache()
+    tensor = cache.get(key)
+    if tensor is None:
+        if data is None:
+            data = read_bytes(source)
+        tensor = decode_into(data, np.empty(INPUT_SHAPE, dtype="float32") if out is None else out)
+        cache.put(key, tensor)
+        return tensor
+
+    if out is None:
+        return tensor
+    np.copyto(out, tensor)
+    return out
+
+
+def preprocess_batch(sources):
+    """Preprocess several images into one preallocated (n, 128, 128, 3) array."""
+    batch = np.empty((len(sources),) + INPUT_SHAPE, dtype="float32")
+    for i, source in enumerate(sources):
+        preprocess_image(source, out=batch[i])
+    return batch
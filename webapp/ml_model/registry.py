@@ -0,0 +1,199 @@
+# webapp/ml_model/registry.py
+"""
+Versioned, hot-swappable classifier.
+
+A model version is named after the first 12 hex digits of the model
+file's SHA-256, so replacing report_model.h5 makes a new version. Write
+the new file next to the old one and rename it over it; never copy over
+the live file in place.
+
+The registry checks the file's size and mtime at most every
+`poll_seconds`. When they change, the new file is loaded and warmed up
+on a background thread while the current model keeps serving. It is
+then swapped in with a single assignment, and `on_swap(loaded)` is
+called when it replaced a different version. The first load in a
+process is not a swap: other processes may still serve the old version
+until they reload. A file that fails to load or warm up
+is logged and never served.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERSION_LENGTH = 12
+HISTORY_SIZE = 20
+
+LoadedModel = namedtuple("LoadedModel", "version model signature loaded_at load_seconds warmup_seconds")
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def file_version(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:VERSION_LENGTH]
+
+
+class ModelRegistry:
+    """
+    Serves the most recently loaded version of the model at `path`.
+
+    `load(path)` builds a model and `warm_up(model)` runs it once on dummy
+    input, so the first real request does not pay for tracing and
+    allocation. `warm_up` should raise if the model does not fit the app,
+    for example if it has the wrong number of classes.
+    """
+
+    def __init__(self, path, load, warm_up=None, poll_seconds=30, on_swap=None):
+        self.path = path
+        self.load = load
+        self.warm_up = warm_up
+        self.on_swap = on_swap
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._active = None
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._loader = None
+        self._loading = None        # signature of the file being loaded
+        self._failed = None         # signature of the last file that failed to load
+        self._last_check = 0.0
+        self._history = deque(maxlen=HISTORY_SIZE)
+
+    def _check_pid(self):
+        # Threads do not survive gunicorn's fork; a loader started before it is gone.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._loader = self._loading = None
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def current(self):
+        """The serving LoadedModel. Blocks only if no version was ever loaded."""
+        active = self._active
+        if active is None:
+            return self._first_load()
+        if time.monotonic() - self._last_check >= self.poll_seconds:
+            self.check()
+        return active
+
+    def preload(self):
+        """Start loading in the background, e.g. at WSGI startup, ahead of the first request."""
+        self.check()
+
+    def check(self):
+        """Start a background load if the file on disk is not the serving version."""
+        with self._lock:
+            self._check_pid()
+            self._last_check = time.monotonic()
+            try:
+                signature = file_signature(self.path)
+            except OSError:
+                return False
+            if self._active is not None and signature == self._active.signature:
+                return False
+            if signature == self._failed or signature == self._loading:
+                return False
+            self._loading = signature
+            self._loader = threading.Thread(target=self._load_in_background, args=(signature,), name="ml-model-loader", daemon=True)
+            self._loader.start()
+            return True
+
+    def wait(self, timeout=None):
+        """Wait for a background load to finish; True if none is left running."""
+        loader = self._loader
+        if loader is not None:
+            loader.join(timeout)
+            return not loader.is_alive()
+        return True
+
+    def status(self):
+        active = self._active
+        with self._lock:
+            history = list(self._history)
+        return {
+            "path": self.path,
+            "version": active.version if active else None,
+            "loaded_at": active.loaded_at.isoformat() if active else None,
+            "loading": self._loader is not None and self._loader.is_alive(),
+            "history": history,
+        }
+
+    # ----------------------------
+    # Loading
+    # ----------------------------
+    def _first_load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(
+                f"ML model file missing at: {self.path}\n"
+                f"Place '{os.path.basename(self.path)}' in this folder."
+            )
+        self.check()
+        self.wait()
+        if self._active is None:
+            # The background load failed; load here so the caller sees the real error.
+            self._swap(self._build(file_signature(self.path)))
+        return self._active
+
+    def _build(self, signature):
+        version = file_version(self.path)
+        started = time.perf_counter()
+        model = self.load(self.path)
+        loaded = time.perf_counter()
+        if self.warm_up is not None:
+            self.warm_up(model)
+        return LoadedModel(
+            version=version,
+            model=model,
+            signature=signature,
+            loaded_at=timezone.now(),
+            load_seconds=round(loaded - started, 3),
+            warmup_seconds=round(time.perf_counter() - loaded, 3),
+        )
+
+    def _load_in_background(self, signature):
+        try:
+            loaded = self._build(signature)
+        except Exception as exc:
+            logger.exception("Loading model %s failed; keeping the current version", self.path)
+            with self._lock:
+                self._loading = None
+                self._failed = signature
+                self._history.append({"version": None, "error": repr(exc), "at": timezone.now().isoformat()})
+            return
+        self._swap(loaded)
+
+    def _swap(self, loaded):
+        with self._lock:
+            previous, self._active = self._active, loaded
+            self._loading = self._failed = None
+            self._history.append({
+                "version": loaded.version,
+                "at": loaded.loaded_at.isoformat(),
+                "load_seconds": loaded.load_seconds,
+                "warmup_seconds": loaded.warmup_seconds,
+            })
+        logger.info(
+            "Serving model version %s (was %s; load %.2fs, warm-up %.2fs)",
+            loaded.version, previous.version if previous else None, loaded.load_seconds, loaded.warmup_seconds,
+        )
+        if self.on_swap is not None and previous is not None and previous.version != loaded.version:
+            try:
+                self.on_swap(loaded)
+            except Exception:
+                logger.exception("on_swap failed for model version %s", loaded.version)
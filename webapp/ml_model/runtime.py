@@ -0,0 +1,109 @@
+# webapp/ml_model/runtime.py
+"""
+Serving backends for the classifier.
+
+"keras" loads report_model.h5 with full TensorFlow. "tflite" runs a
+converted .tflite file (see export.py) with the LiteRT interpreter. That
+only needs the small `ai-edge-litert` or `tflite-runtime` wheel, so a
+web worker never imports TensorFlow. Both return an object with a
+Keras-style predict(x, batch_size=None, verbose=0), so the registry, the
+micro-batcher and warm-up work the same for either.
+"""
+import os
+import threading
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite")
+
+
+def backend_for(path):
+    return "tflite" if path.endswith(".tflite") else "keras"
+
+
+def input_shape(model):
+    """Shape of one input row, e.g. (128, 128, 3), for either backend."""
+    return tuple(model.input_shape[1:])
+
+
+def _interpreter_class():
+    # Smallest runtime first; full TensorFlow only as a last resort.
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """
+    A .tflite classifier. Inputs and outputs of int8-quantized models
+    are (de)quantized here, so callers always pass and get float32.
+
+    The interpreter is resized when the batch size changes. It is not
+    thread-safe, so calls are serialized; the micro-batcher already
+    sends them from one thread.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads or os.cpu_count())
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(n) for n in self._input["shape"][1:])
+
+    def _resize(self, batch_size):
+        shape = [batch_size] + list(self._input["shape"][1:])
+        self._interpreter.resize_tensor_input(self._input["index"], shape)
+        self._interpreter.allocate_tensors()
+        # Details (e.g. the output shape) change with the allocation.
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype="float32")
+        with self._lock:
+            if self._batch_size != len(x):
+                self._resize(len(x))
+            scale, zero_point = self._input["quantization"]
+            if scale:
+                limits = np.iinfo(self._input["dtype"])
+                x = np.clip(np.round(x / scale + zero_point), limits.min, limits.max)
+            self._interpreter.set_tensor(self._input["index"], x.astype(self._input["dtype"]))
+            self._interpreter.invoke()
+            y = self._interpreter.get_tensor(self._output["index"])
+            scale, zero_point = self._output["quantization"]
+        if scale:
+            return (y.astype("float32") - zero_point) * scale
+        return y.astype("float32", copy=True)
+
+
+def load_keras(path):
+    # Use tf.keras so it matches your installed TensorFlow/Keras
+    from tensorflow import keras
+
+    return keras.models.load_model(path)
+
+
+def load_tflite(path):
+    return TFLiteModel(path)
+
+
+def load(path, backend=None):
+    backend = backend or backend_for(path)
+    if backend == "keras":
+        return load_keras(path)
+    if backend == "tflite":
+        return load_tflite(path)
+    raise ValueError(f"Unknown ML backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
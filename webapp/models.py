@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # ----------------------------
 # Custom User
@@ -52,10 +53,16 @@ class Report(models.Model):
     description = models.TextField()
     report_type = models.CharField(max_length=100)  # manual category
     predicted_report_type = models.CharField(max_length=100, null=True, blank=True)  # ML prediction
+    predicted_model_version = models.CharField(max_length=64, null=True, blank=True)  # model that made it
     image = models.ImageField(upload_to='reports/', null=True, blank=True)
+    thumbnail_widths = models.CharField(max_length=50, null=True, blank=True)  # e.g. "160,320,640"; None = not generated yet
+    image_blob = models.ForeignKey("ImageBlob", on_delete=models.SET_NULL, null=True, blank=True, related_name="reports")
+    duplicate_of = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="near_duplicates")
     geotag_lat = models.FloatField(null=True, blank=True)
     geotag_long = models.FloatField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)  # set from the geotag on save
+    # A default rather than auto_now_add, so bulk imports can carry their own timestamps.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -67,11 +74,43 @@ class Report(models.Model):
     class Meta:
         db_table = 'report'
         ordering = ['-timestamp']
+        # Listings filter on one of these and page by (timestamp, report_id).
+        indexes = [
+            models.Index(fields=['timestamp', 'report_id']),
+            models.Index(fields=['status', 'timestamp', 'report_id']),
+            models.Index(fields=['report_type', 'timestamp', 'report_id']),
+            models.Index(fields=['user', 'timestamp', 'report_id']),
+        ]
 
     def __str__(self):
         return self.title
 
 
+# ----------------------------
+# Image Blob (content-addressed upload store)
+# ----------------------------
+class ImageBlob(models.Model):
+    blob_id = models.AutoField(primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    phash = models.CharField(max_length=16)  # 64-bit dHash, hex
+    # 16-bit slices of phash: any two hashes within PHASH_BANDS-1 bits share a band.
+    phash_band0 = models.IntegerField(db_index=True)
+    phash_band1 = models.IntegerField(db_index=True)
+    phash_band2 = models.IntegerField(db_index=True)
+    phash_band3 = models.IntegerField(db_index=True)
+    file = models.ImageField(upload_to='reports/')
+    size = models.IntegerField()
+    predicted_report_type = models.CharField(max_length=100, null=True, blank=True)  # cached ML prediction
+    predicted_model_version = models.CharField(max_length=64, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "image_blobs"
+
+    def __str__(self):
+        return self.sha256
+
+
 # ----------------------------
 # Leaderboard
 # ----------------------------
@@ -80,6 +119,7 @@ class Leaderboard(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="leaderboard")
     points = models.IntegerField(default=0)
     rank = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # lets other workers sync ranks
 
     class Meta:
         db_table = "leaderboard"
@@ -88,6 +128,37 @@ class Leaderboard(models.Model):
         return f"{self.user.name} - {self.points} pts"
 
 
+# ----------------------------
+# Points Ledger (append-only; folded into User/Leaderboard points by compaction)
+# ----------------------------
+class PointsEntry(models.Model):
+    REASON_CHOICES = [
+        ('report', 'Report submitted'),
+        ('reward', 'Reward claimed'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    entry_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="points_entries")
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    report = models.ForeignKey("Report", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    reward = models.ForeignKey("Reward", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set when the entry has been folded into User.points / Leaderboard.points.
+    compaction_batch = models.CharField(max_length=32, null=True, blank=True)
+
+    class Meta:
+        db_table = "points_ledger"
+        indexes = [
+            models.Index(fields=["user", "compaction_batch"]),
+            models.Index(fields=["compaction_batch", "entry_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.delta:+d} ({self.reason})"
+
+
 # ----------------------------
 # Reward
 # ----------------------------
@@ -105,7 +176,15 @@ class Reward(models.Model):
         return self.title
 
     def is_claimed_by(self, user):
-        return self.claimed_rewards.filter(user=user).exists()
+        # From the user's cached claim set, read once per User instance, so checking
+        # a whole catalog is one cache read.
+        from .rewards import claimed_reward_ids
+
+        if not isinstance(user, User):
+            return self.reward_id in claimed_reward_ids(user)
+        if getattr(user, "_claimed_reward_ids", None) is None:
+            user._claimed_reward_ids = claimed_reward_ids(user.user_id)
+        return self.reward_id in user._claimed_reward_ids
 
 
 # ----------------------------
@@ -123,3 +202,33 @@ class UserReward(models.Model):
 
     def __str__(self):
         return f"{self.user.name} claimed {self.reward.title}"
+
+
+# ----------------------------
+# Classification Job (background ML queue)
+# ----------------------------
+class ClassificationJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.AutoField(primary_key=True)
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name="classification_jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    last_error = models.TextField(null=True, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "classification_jobs"
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"Job {self.job_id} for report {self.report_id} ({self.status})"
@@ -0,0 +1,201 @@
+# webapp/pagecache.py
+"""
+Whole-page cache for public pages, with per-user holes.
+
+@cached_page renders a page once with the user-specific fragments left
+as holes (the {% uncached %} tag in base.html emits a marker instead of,
+e.g., the login/logout links), caches that HTML per URL and query
+string, and on every request fills the holes from small templates for
+the current user. A cache hit renders only those fragments and runs a
+single query, for the generations (below).
+
+Pages name the data they show as groups ("reports", "report:{report_id}",
+"leaderboard"). Each group has a generation number in the cache that is
+part of the page key; signals bump the generation when the data changes,
+orphaning every page built on it (they expire with PAGE_CACHE_TTL), the
+same scheme tiles.py uses. A new generation starts from the clock, so a
+generation lost from the cache is never reused.
+
+Generations live in PAGE_GENERATION_CACHE, which has to be shared by
+every worker and management command: invalidations come from other
+processes (classify_reports, compact_points, import_reports, ...).
+Pages themselves can stay in a per-process PAGE_CACHE, since a page is
+only found through the current generations. check_settings() refuses a
+per-process generation cache at startup.
+
+Responses carry an ETag (the cached page plus the filled holes) and the
+Last-Modified time the page was rendered, so revalidating clients get
+304s. They are marked private and Vary: Cookie, since the holes depend
+on the login cookie.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+PAGE_TTL = 600
+GENERATION_TTL = 7 * 24 * 60 * 60   # must outlive the pages keyed on it
+HOLE_MARKER = "<!--uncached:%s-->"
+# Hole name -> template rendered per request (with the request's context processors).
+HOLES = {
+    "user_nav": "webapp/_user_nav.html",
+}
+
+REPORTS = "reports"                 # any report list
+ALL_REPORT_DETAILS = "report:*"     # every report page, after bulk writes
+LEADERBOARD = "leaderboard"
+
+
+def _cache():
+    return caches[getattr(settings, "PAGE_CACHE", "default")]
+
+
+def _generation_cache():
+    return caches[getattr(settings, "PAGE_GENERATION_CACHE", "shared")]
+
+
+def _ttl():
+    return getattr(settings, "PAGE_CACHE_TTL", PAGE_TTL)
+
+
+def require_shared(alias, setting):
+    """ImproperlyConfigured if cache `alias` (named by `setting`) is private to one process."""
+    backend = settings.CACHES[alias]["BACKEND"]
+    if backend.endswith((".LocMemCache", ".DummyCache")):
+        raise ImproperlyConfigured(
+            f"{setting} = {alias!r} uses {backend}, which other processes can't see; "
+            "use a shared backend (database, Redis or memcached)."
+        )
+
+
+def check_settings():
+    """Called at startup (WebappConfig.ready)."""
+    if getattr(settings, "PAGE_CACHE_ENABLED", True):
+        require_shared(getattr(settings, "PAGE_GENERATION_CACHE", "shared"), "PAGE_GENERATION_CACHE")
+
+
+def _generation_key(group):
+    return f"pages:generation:{group}"
+
+
+# ----------------------------
+# Invalidation
+# ----------------------------
+def invalidate(*groups):
+    """Orphan every cached page built on any of `groups`."""
+    cache = _generation_cache()
+    for key in map(_generation_key, groups):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), GENERATION_TTL)
+
+
+def invalidate_report(*report_ids):
+    invalidate(REPORTS, *(f"report:{report_id}" for report_id in report_ids))
+
+
+def invalidate_reports():
+    """After bulk writes, which send no signals."""
+    invalidate(REPORTS, ALL_REPORT_DETAILS)
+
+
+def invalidate_leaderboard():
+    invalidate(LEADERBOARD)
+
+
+def _generations(groups):
+    cache = _generation_cache()
+    keys = [_generation_key(g) for g in groups]
+    values = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in values}
+    if missing:
+        # Racing another process here only orphans the page one of us renders.
+        cache.set_many(missing, GENERATION_TTL)
+        values.update(missing)
+    return [values[k] for k in keys]
+
+
+# ----------------------------
+# Holes
+# ----------------------------
+def leaves_holes(context):
+    """True while rendering a page for the cache ({% uncached %} checks this)."""
+    request = context.get("request")
+    return getattr(request, "page_cache_holes", False)
+
+
+def _fill(content, request):
+    """(content with every hole filled for `request`, digest of the fills)."""
+    digest = hashlib.md5()
+    for name, template in HOLES.items():
+        marker = (HOLE_MARKER % name).encode()
+        if marker in content:
+            fragment = render_to_string(template, request=request).encode()
+            content = content.replace(marker, fragment)
+            digest.update(fragment)
+    return content, digest.hexdigest()[:12]
+
+
+# ----------------------------
+# Decorator
+# ----------------------------
+def _page_key(view_name, request, generations):
+    query = sorted((k, v) for k, values in request.GET.lists() for v in values)
+    url = hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+    return f"pages:{view_name}:{url}:{'.'.join(map(str, generations))}"
+
+
+def cached_page(*groups):
+    """
+    Cache a view's HTML (see module docstring). `groups` may use the
+    view's URL kwargs, e.g. @cached_page("report:{report_id}").
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not getattr(settings, "PAGE_CACHE_ENABLED", True):
+                return view(request, *args, **kwargs)
+            cache = _cache()
+            key = _page_key(view.__name__, request, _generations([g.format(**kwargs) for g in groups]))
+            entry = cache.get(key)
+            if entry is None:
+                request.page_cache_holes = True
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.page_cache_holes = False
+                if response.streaming or not response.get("Content-Type", "").startswith("text/html"):
+                    return response
+                if response.status_code != 200 or response.cookies:
+                    response.content = _fill(response.content, request)[0]
+                    return response
+                entry = {
+                    "content": response.content,
+                    "content_type": response["Content-Type"],
+                    "etag": hashlib.md5(response.content).hexdigest()[:16],
+                    "rendered_at": time.time(),
+                }
+                cache.set(key, entry, _ttl())
+
+            content, holes = _fill(entry["content"], request)
+            response = HttpResponse(content, content_type=entry["content_type"])
+            response["ETag"] = f'"{entry["etag"]}-{holes}"'
+            response["Last-Modified"] = http_date(entry["rendered_at"])
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("Cookie",))
+            return get_conditional_response(
+                request, etag=response["ETag"], last_modified=int(entry["rendered_at"]), response=response,
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,94 @@
+# webapp/pagination.py
+"""
+Keyset (cursor) pagination for report listings.
+
+Pages are ordered by (-timestamp, -report_id) and fetched with
+`WHERE (timestamp, report_id) < last-seen` instead of OFFSET, and no
+COUNT(*) is run, so page 5000 costs the same as page 1. Cursors are
+signed, opaque tokens; old `?page=N` links still resolve (by OFFSET) and
+continue from there with cursors.
+"""
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = "webapp.pagination"
+FORWARD, BACKWARD = "n", "p"
+
+
+def make_cursor(report, direction):
+    return signing.dumps(
+        [report.timestamp.isoformat(), report.report_id, direction], salt=CURSOR_SALT, compress=True,
+    )
+
+
+def read_cursor(token):
+    """(timestamp, report_id, direction) or None for a missing/tampered token."""
+    if not token:
+        return None
+    try:
+        timestamp, report_id, direction = signing.loads(token, salt=CURSOR_SALT)
+        return datetime.fromisoformat(timestamp), int(report_id), direction
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of results; iterable like a Paginator page."""
+
+    def __init__(self, object_list, has_next, has_previous, approximate_total=None, number=None):
+        self.object_list = object_list
+        self.approximate_total = approximate_total
+        self.number = number  # only known when reached through ?page=N
+        self.next_cursor = make_cursor(object_list[-1], FORWARD) if has_next and object_list else None
+        self.previous_cursor = make_cursor(object_list[0], BACKWARD) if has_previous and object_list else None
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, per_page, cursor=None, page=None, approximate_total=None):
+    """
+    The page of `queryset` (a Report queryset) after/before `cursor`, or
+    legacy page number `page` when no cursor is given.
+    """
+    queryset = queryset.order_by("-timestamp", "-report_id")
+    position = read_cursor(cursor)
+
+    if position is None:
+        try:
+            number = max(1, int(page or 1))
+        except ValueError:
+            number = 1
+        offset = (number - 1) * per_page
+        rows = list(queryset[offset:offset + per_page + 1])
+        if not rows and number > 1:
+            return keyset_page(queryset, per_page, approximate_total=approximate_total)
+        return KeysetPage(rows[:per_page], len(rows) > per_page, number > 1, approximate_total, number)
+
+    timestamp, report_id, direction = position
+    if direction == BACKWARD:
+        newer = Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, report_id__gt=report_id)
+        rows = list(queryset.filter(newer).order_by("timestamp", "report_id")[:per_page + 1])
+        if not rows:
+            return keyset_page(queryset, per_page, approximate_total=approximate_total)
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, True, has_previous, approximate_total)
+
+    older = Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, report_id__lt=report_id)
+    rows = list(queryset.filter(older)[:per_page + 1])
+    return KeysetPage(rows[:per_page], len(rows) > per_page, True, approximate_total)
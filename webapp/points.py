@@ -0,0 +1,97 @@
+# webapp/points.py
+"""
+Points ledger.
+
+Every award or spend is a single INSERT into `points_ledger`, so
+concurrent submissions never read-modify-write (or lock) the same
+`users` row. A user's balance is User.points plus their not yet
+compacted entries; `compact_points()` periodically folds entries into
+User.points and Leaderboard.points in one transaction.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .leaderboard import current_points, engine
+from .middleware import invalidate_user
+from .models import Leaderboard, PointsEntry, User
+
+REPORT_POINTS = 10
+COMPACT_BATCH_SIZE = 5000
+
+
+# ----------------------------
+# Balance
+# ----------------------------
+def balance(user_id):
+    """Current points: folded User.points plus pending ledger entries (one query)."""
+    pending = Coalesce(Sum('points_entries__delta', filter=Q(points_entries__compaction_batch__isnull=True)), 0)
+    row = User.objects.filter(user_id=user_id).annotate(pending=pending).values_list('points', 'pending').first()
+    return None if row is None else row[0] + row[1]
+
+
+# ----------------------------
+# Award / spend
+# ----------------------------
+def award_points(user, delta, reason, report=None, reward=None):
+    """
+    Record `delta` points (negative to spend) for `user`.
+
+    Runs in the caller's transaction if there is one, so e.g. a reward
+    claim and its deduction commit or roll back together. The in-memory
+    leaderboard is updated once the entry is committed.
+    """
+    user_id = user.user_id if isinstance(user, User) else user
+    with transaction.atomic():
+        entry = PointsEntry.objects.create(
+            user_id=user_id, delta=delta, reason=reason, report=report, reward=reward,
+        )
+    transaction.on_commit(lambda: _publish(user_id))
+    return entry
+
+
+def _publish(user_id):
+    engine.update(user_id, current_points([user_id]).get(user_id, 0))
+
+
+# ----------------------------
+# Compaction
+# ----------------------------
+def compact_points(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Fold up to `batch_size` pending entries into User.points and
+    Leaderboard.points. Safe to run from several processes: entries are
+    claimed by stamping them with a batch id inside the transaction.
+    Returns the number of entries folded.
+    """
+    ids = list(
+        PointsEntry.objects.filter(compaction_batch__isnull=True)
+        .order_by('entry_id').values_list('entry_id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+
+    batch = uuid.uuid4().hex
+    now = timezone.now()
+    with transaction.atomic():
+        folded = PointsEntry.objects.filter(
+            compaction_batch__isnull=True, entry_id__gte=ids[0], entry_id__lte=ids[-1],
+        ).update(compaction_batch=batch)
+        totals = (
+            PointsEntry.objects.filter(compaction_batch=batch)
+            .values('user_id').annotate(total=Sum('delta')).values_list('user_id', 'total')
+        )
+        for user_id, total in totals:
+            User.objects.filter(user_id=user_id).update(points=F('points') + total)
+            updated = Leaderboard.objects.filter(user_id=user_id).update(
+                points=F('points') + total, updated_at=now,
+            )
+            if not updated:
+                points = User.objects.filter(user_id=user_id).values_list('points', flat=True).get()
+                Leaderboard.objects.create(user_id=user_id, points=points)
+            # update() skips the post_save signal that normally drops the cached user.
+            transaction.on_commit(lambda user_id=user_id: invalidate_user(user_id))
+    return folded
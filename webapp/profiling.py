@@ -0,0 +1,314 @@
+# webapp/profiling.py
+"""
+Per-request SQL and timing profile, N+1 detection, Prometheus metrics.
+
+ProfilingMiddleware wraps every request. It records, through the DB
+connection's execute wrapper (no DEBUG needed):
+  * the number of queries and the time spent in the database;
+  * queries repeated with the same SQL and parameters ("duplicates");
+  * queries repeated with the same SQL and different parameters, at
+    least N_PLUS_ONE_THRESHOLD times. That is the N+1 signature of a
+    lazy foreign key read in a loop.
+It also records template render time (outermost render only), how many
+queries ran while rendering, and the total latency.
+
+The profile is attached to the response as `response.profile`. Tests
+can assert on it, e.g. "home must run at most 4 queries". Totals per
+view are exported in Prometheus text format by metrics_view. They are
+kept per process, like the inference batcher's stats.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 3
+METRICS_ALLOWED_IPS = ("127.0.0.1", "::1")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_current = ContextVar("webapp_profile", default=None)
+_IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)")
+
+
+def fingerprint(sql):
+    """SQL with parameter lists collapsed, so `IN (%s, %s)` and `IN (%s)` match."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+# ----------------------------
+# One request
+# ----------------------------
+class RequestProfile:
+    def __init__(self):
+        self.view = None
+        self.queries = []           # (sql, params, seconds, during_render)
+        self.template_seconds = 0.0
+        self.total_seconds = 0.0
+        self.started = time.perf_counter()
+        self._render_depth = 0
+
+    def record(self, sql, params, seconds):
+        self.queries.append((sql, params, seconds, self._render_depth > 0))
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_seconds(self):
+        return sum(q[2] for q in self.queries)
+
+    @property
+    def template_queries(self):
+        """Queries run while rendering: lazy loads the view should have prefetched."""
+        return sum(1 for q in self.queries if q[3])
+
+    @property
+    def duplicates(self):
+        """[(sql, count)] of statements run more than once with identical parameters."""
+        counts = Counter((sql, repr(params)) for sql, params, _, _ in self.queries)
+        return [(sql, n) for (sql, _), n in counts.most_common() if n > 1]
+
+    @property
+    def n_plus_one(self):
+        """[(fingerprint, count)] of statements repeated with varying parameters."""
+        threshold = getattr(settings, "PROFILING_N_PLUS_ONE_THRESHOLD", N_PLUS_ONE_THRESHOLD)
+        params = defaultdict(set)
+        counts = Counter()
+        for sql, p, _, _ in self.queries:
+            key = fingerprint(sql)
+            counts[key] += 1
+            params[key].add(repr(p))
+        return [(key, n) for key, n in counts.most_common() if n >= threshold and len(params[key]) > 1]
+
+    def summary(self):
+        return {
+            "view": self.view,
+            "queries": self.query_count,
+            "template_queries": self.template_queries,
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "template_ms": round(self.template_seconds * 1000, 2),
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "duplicates": len(self.duplicates),
+            "n_plus_one": [f"{n}x {sql}" for sql, n in self.n_plus_one],
+        }
+
+
+class _QueryRecorder:
+    def __init__(self, profile):
+        self.profile = profile
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.profile.record(sql, params, time.perf_counter() - started)
+
+
+@contextmanager
+def profile(request_profile=None):
+    """
+    Profile the enclosed code, e.g. in a management command. Passing an
+    earlier profile carries on recording into it.
+    """
+    request_profile = request_profile or RequestProfile()
+    token = _current.set(request_profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_QueryRecorder(request_profile)))
+            yield request_profile
+    finally:
+        request_profile.total_seconds = time.perf_counter() - request_profile.started
+        _current.reset(token)
+
+
+# ----------------------------
+# Template timing
+# ----------------------------
+def _instrument_templates():
+    from django.template.base import Template
+
+    if getattr(Template.render, "profiled", False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        request_profile = _current.get()
+        if request_profile is None:
+            return original(self, context)
+        request_profile._render_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            request_profile._render_depth -= 1
+            if not request_profile._render_depth:  # {% include %} time is already in its parent's
+                request_profile.template_seconds += time.perf_counter() - started
+
+    render.profiled = True
+    Template.render = render
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.observations += 1
+
+
+class ViewMetrics:
+    """Process-wide totals per view, rendered in Prometheus text format."""
+
+    COUNTERS = (
+        ("webapp_requests_total", "Requests handled."),
+        ("webapp_db_queries_total", "SQL queries run."),
+        ("webapp_template_queries_total", "SQL queries run while rendering templates."),
+        ("webapp_duplicate_queries_total", "Queries repeating an earlier one with identical parameters."),
+        ("webapp_n_plus_one_total", "Requests with at least one N+1 query pattern."),
+        ("webapp_db_seconds_total", "Time spent in the database."),
+        ("webapp_template_seconds_total", "Time spent rendering templates."),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = defaultdict(lambda: defaultdict(float))
+            self._latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+            self._queries = defaultdict(lambda: _Histogram(QUERY_BUCKETS))
+
+    def observe(self, request_profile):
+        view = request_profile.view or "unresolved"
+        values = {
+            "webapp_requests_total": 1,
+            "webapp_db_queries_total": request_profile.query_count,
+            "webapp_template_queries_total": request_profile.template_queries,
+            "webapp_duplicate_queries_total": sum(n - 1 for _, n in request_profile.duplicates),
+            "webapp_n_plus_one_total": 1 if request_profile.n_plus_one else 0,
+            "webapp_db_seconds_total": request_profile.db_seconds,
+            "webapp_template_seconds_total": request_profile.template_seconds,
+        }
+        with self._lock:
+            for name, value in values.items():
+                self._counters[name][view] += value
+            self._latency[view].observe(request_profile.total_seconds)
+            self._queries[view].observe(request_profile.query_count)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, help_text in self.COUNTERS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for view, value in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{{view="{view}"}} {value:g}')
+            for name, help_text, histograms in (
+                ("webapp_request_duration_seconds", "Request latency.", self._latency),
+                ("webapp_db_queries_per_request", "SQL queries per request.", self._queries),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for view, histogram in sorted(histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound:g}"}} {count}')
+                    lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.observations}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.total:g}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.observations}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = ViewMetrics()
+
+
+# ----------------------------
+# Middleware / endpoint
+# ----------------------------
+class ProfilingMiddleware:
+    """
+    Profile each request (see module docstring). Put it first in
+    MIDDLEWARE so the other middleware's queries and time are included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "PROFILING_ENABLED", True)
+        if self.enabled:
+            _instrument_templates()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        with profile() as request_profile:
+            response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        request_profile.view = match.view_name if match else None
+        response.profile = request_profile
+
+        if response.streaming and not response.is_async:
+            # Streamed rows are queried while the body is sent; finish the profile after that.
+            response.streaming_content = self._profile_stream(response.streaming_content, request, request_profile)
+            return response
+        response["Server-Timing"] = (
+            f"db;dur={request_profile.db_seconds * 1000:.1f};desc=\"{request_profile.query_count} queries\", "
+            f"tpl;dur={request_profile.template_seconds * 1000:.1f}, "
+            f"total;dur={request_profile.total_seconds * 1000:.1f}"
+        )
+        self._finish(request, request_profile)
+        return response
+
+    def _profile_stream(self, content, request, request_profile):
+        try:
+            with profile(request_profile):
+                yield from content
+        finally:
+            self._finish(request, request_profile)
+
+    def _finish(self, request, request_profile):
+        metrics.observe(request_profile)
+        if request_profile.n_plus_one:
+            logger.warning(
+                "N+1 queries in %s (%s): %s", request_profile.view, request.path,
+                "; ".join(f"{n}x {sql}" for sql, n in request_profile.n_plus_one),
+            )
+
+
+def metrics_only(view):
+    """Restrict an operational endpoint to PROFILING_METRICS_ALLOWED_IPS (the host itself by default)."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.META.get("REMOTE_ADDR") not in getattr(settings, "PROFILING_METRICS_ALLOWED_IPS", METRICS_ALLOWED_IPS):
+            return HttpResponseForbidden()
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@metrics_only
+def metrics_view(request):
+    # Prometheus scrape target.
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
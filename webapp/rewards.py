@@ -0,0 +1,101 @@
+# webapp/rewards.py
+"""
+Reward catalog and per-user claims, kept in the cache.
+
+The active catalog is one cache entry, dropped when a Reward is saved
+or deleted. Each user's claimed reward ids are cached as a set, dropped
+when one of their claims is created or deleted. Marking the catalog for
+a user is then set lookups: the rewards page reads both in one cache
+round trip in the steady state and runs two queries when cold, however
+large the catalog. Entries
+also expire after REWARDS_TTL so any drift heals itself.
+
+A claim or catalog change handled by one worker has to reach the
+others, so REWARDS_CACHE must be shared by every process
+(check_settings() refuses a per-process one at startup).
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Reward, UserReward
+
+CATALOG = "rewards:catalog"
+REWARDS_TTL = 600
+
+
+def _cache():
+    return caches[getattr(settings, "REWARDS_CACHE", "shared")]
+
+
+def _ttl():
+    return getattr(settings, "REWARDS_TTL", REWARDS_TTL)
+
+
+def check_settings():
+    """Called at startup (WebappConfig.ready)."""
+    from .pagecache import require_shared
+
+    require_shared(getattr(settings, "REWARDS_CACHE", "shared"), "REWARDS_CACHE")
+
+
+def _claimed_key(user_id):
+    return f"rewards:claimed:{user_id}"
+
+
+# ----------------------------
+# Read
+# ----------------------------
+def _load_catalog():
+    catalog = list(Reward.objects.filter(is_active=True).order_by("reward_id"))
+    _cache().set(CATALOG, catalog, _ttl())
+    return catalog
+
+
+def _load_claimed(user_id):
+    claimed = frozenset(UserReward.objects.filter(user_id=user_id).values_list("reward_id", flat=True))
+    _cache().set(_claimed_key(user_id), claimed, _ttl())
+    return claimed
+
+
+def active_rewards():
+    """Active rewards in catalog order. Each call returns fresh objects."""
+    catalog = _cache().get(CATALOG)
+    return _load_catalog() if catalog is None else catalog
+
+
+def claimed_reward_ids(user_id):
+    """frozenset of the reward ids `user_id` has claimed (one query when not cached)."""
+    claimed = _cache().get(_claimed_key(user_id))
+    return _load_claimed(user_id) if claimed is None else claimed
+
+
+def catalog_for(user, points=None):
+    """
+    active_rewards() with `.claimed` and `.affordable` set for `user`
+    (None for a visitor) holding `points`.
+    """
+    keys = [CATALOG] + ([_claimed_key(user.user_id)] if user else [])
+    cached = _cache().get_many(keys)
+    rewards = cached.get(CATALOG)
+    if rewards is None:
+        rewards = _load_catalog()
+    claimed = frozenset()
+    if user:
+        claimed = cached.get(_claimed_key(user.user_id))
+        if claimed is None:
+            claimed = _load_claimed(user.user_id)
+    for reward in rewards:
+        reward.claimed = reward.reward_id in claimed
+        reward.affordable = points is not None and points >= reward.points_required
+    return rewards
+
+
+# ----------------------------
+# Invalidation (called from signals and after bulk writes)
+# ----------------------------
+def catalog_changed():
+    _cache().delete(CATALOG)
+
+
+def claims_changed(user_id):
+    _cache().delete(_claimed_key(user_id))
@@ -0,0 +1,172 @@
+# webapp/search.py
+"""
+Full-text search over report title, description and report_type.
+
+* MySQL: a FULLTEXT index on `report` that InnoDB keeps up to date
+  itself, queried in boolean mode.
+* SQLite (local dev): an FTS5 table `report_search` whose rowid is the
+  report_id, written from the Report post_save/post_delete signals in
+  the same transaction as the report.
+* Anything else falls back to the old icontains scan.
+
+Every search term must match (AND) and is prefix-matched, so "pot"
+finds "pothole". Results are ordered by relevance, newest first on ties.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Report
+
+SEARCH_TABLE = "report_search"
+FULLTEXT_INDEX = "report_search"
+SEARCH_FIELDS = ("title", "description", "report_type")
+MAX_TERMS = 8
+# FTS5 bm25() column weights, in SEARCH_FIELDS order.
+SQLITE_WEIGHTS = (3.0, 1.0, 2.0)
+
+_sqlite_ready = {}
+
+
+def _connection():
+    return connections[router.db_for_write(Report)]
+
+
+def backend(connection=None):
+    """'mysql', 'sqlite' or None when only the icontains scan is available."""
+    connection = connection or _connection()
+    if connection.vendor == "mysql":
+        return "mysql"
+    if connection.vendor == "sqlite":
+        # The FTS5 table is missing if SQLite was built without FTS5.
+        if connection.alias not in _sqlite_ready:
+            _sqlite_ready[connection.alias] = SEARCH_TABLE in connection.introspection.table_names()
+        return "sqlite" if _sqlite_ready[connection.alias] else None
+    return None
+
+
+def terms(text):
+    return re.findall(r"\w+", (text or "").lower())[:MAX_TERMS]
+
+
+# ----------------------------
+# Query
+# ----------------------------
+def search_reports(queryset, text):
+    """
+    Narrow a Report queryset to reports matching `text`, best match first.
+    Each result carries `search_rank` (higher is better) unless the
+    icontains fallback is in use.
+    """
+    words = terms(text)
+    if not words:
+        return queryset
+    kind = backend()
+    table = Report._meta.db_table
+
+    if kind == "mysql":
+        columns = ", ".join(f"{table}.{field}" for field in SEARCH_FIELDS)
+        match = " ".join(f"+{word}*" for word in words)
+        rank = RawSQL(f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)", [match])
+        return queryset.annotate(search_rank=rank).filter(search_rank__gt=0).order_by("-search_rank", "-timestamp")
+
+    if kind == "sqlite":
+        match = " ".join(f'"{word}"*' for word in words)
+        weights = ", ".join(str(w) for w in SQLITE_WEIGHTS)
+        # bm25() only works inside the full-text query, so rank each match with a
+        # correlated lookup by rowid (an FTS5 seek, not a scan).
+        matching = RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match])
+        rank = RawSQL(
+            f"SELECT -bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND {SEARCH_TABLE}.rowid = {table}.report_id",
+            [match],
+        )
+        return (
+            queryset.filter(report_id__in=matching)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "-timestamp")
+        )
+
+    for word in words:
+        queryset = queryset.filter(
+            Q(title__icontains=word) | Q(description__icontains=word) | Q(report_type__icontains=word)
+        )
+    return queryset
+
+
+# ----------------------------
+# Index maintenance (SQLite; MySQL maintains FULLTEXT itself)
+# ----------------------------
+def index_reports(reports):
+    """Add or refresh the search rows for `reports` (e.g. after bulk_create)."""
+    if backend() != "sqlite":
+        return
+    rows = [(r.report_id, r.title, r.description, r.report_type) for r in reports]
+    with _connection().cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, title, description, report_type) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def unindex_reports(report_ids):
+    if backend() != "sqlite":
+        return
+    with _connection().cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(i,) for i in report_ids])
+
+
+def rebuild_index(connection=None):
+    """Recreate the whole index from the report table. Returns the row count."""
+    connection = connection or _connection()
+    table = Report._meta.db_table
+    with connection.cursor() as cursor:
+        if backend(connection) == "sqlite":
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, report_type) "
+                f"SELECT report_id, title, description, report_type FROM {table}"
+            )
+        elif backend(connection) == "mysql":
+            # Rebuilds the FULLTEXT index and merges its auxiliary tables.
+            cursor.execute(f"OPTIMIZE TABLE {table}")
+            cursor.fetchall()
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        return cursor.fetchone()[0]
+
+
+# ----------------------------
+# Schema (used by the migration)
+# ----------------------------
+def create_index(schema_editor):
+    connection = schema_editor.connection
+    table = Report._meta.db_table
+    if connection.vendor == "mysql":
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} ({', '.join(SEARCH_FIELDS)})"
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({', '.join(SEARCH_FIELDS)}, "
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, report_type) "
+            f"SELECT report_id, title, description, report_type FROM {table}"
+        )
+    _sqlite_ready.pop(connection.alias, None)
+
+
+def drop_index(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "mysql":
+        schema_editor.execute(f"ALTER TABLE {Report._meta.db_table} DROP INDEX {FULLTEXT_INDEX}")
+    elif connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    _sqlite_ready.pop(connection.alias, None)
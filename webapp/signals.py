@@ -0,0 +1,138 @@
+# webapp/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import geo, pagecache, rewards, search, stats, tiles
+from .leaderboard import engine, pending_points
+from .middleware import invalidate_user
+from .models import Leaderboard, PointsEntry, Report, Reward, User, UserReward
+
+
+# ----------------------------
+# User cache
+# ----------------------------
+@receiver([post_save, post_delete], sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+# ----------------------------
+# Leaderboard ranking
+# ----------------------------
+@receiver(post_save, sender=Leaderboard)
+def update_leaderboard_rank(sender, instance, **kwargs):
+    engine.update(instance.user_id, instance.points + pending_points([instance.user_id]).get(instance.user_id, 0))
+
+
+@receiver(post_delete, sender=Leaderboard)
+def remove_leaderboard_rank(sender, instance, **kwargs):
+    engine.remove(instance.user_id)
+
+
+# ----------------------------
+# Home page stats
+# ----------------------------
+@receiver(post_init, sender=Report)
+def remember_loaded_report(sender, instance, **kwargs):
+    # __dict__ so deferred fields are not loaded just for this.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_point = (instance.__dict__.get('geotag_lat'), instance.__dict__.get('geotag_long'))
+
+
+@receiver(post_save, sender=Report)
+def update_report_stats(sender, instance, created, **kwargs):
+    old_status, new_status = instance._loaded_status, instance.status
+    instance._loaded_status = new_status
+    if created:
+        transaction.on_commit(lambda: stats.report_created(new_status))
+    else:
+        transaction.on_commit(lambda: stats.report_changed(old_status, new_status))
+
+
+@receiver(post_delete, sender=Report)
+def remove_report_stats(sender, instance, **kwargs):
+    transaction.on_commit(lambda: stats.report_deleted(instance.status))
+
+
+@receiver(post_save, sender=Leaderboard)
+@receiver(post_save, sender=PointsEntry)
+@receiver(post_save, sender=User)
+def drop_top_contributors(sender, **kwargs):
+    transaction.on_commit(stats.points_changed)
+
+
+# ----------------------------
+# Search index
+# ----------------------------
+@receiver(post_save, sender=Report)
+def index_report(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(search.SEARCH_FIELDS):
+        return
+    search.index_reports([instance])
+
+
+@receiver(post_delete, sender=Report)
+def unindex_report(sender, instance, **kwargs):
+    search.unindex_reports([instance.report_id])
+
+
+# ----------------------------
+# Geo index
+# ----------------------------
+@receiver(pre_save, sender=Report)
+def set_report_geohash(sender, instance, **kwargs):
+    if instance.geotag_lat is None or instance.geotag_long is None:
+        instance.geohash = None
+    else:
+        instance.geohash = geo.encode(instance.geotag_lat, instance.geotag_long)
+
+
+# ----------------------------
+# Map tiles
+# ----------------------------
+@receiver(post_save, sender=Report)
+def drop_report_tiles(sender, instance, **kwargs):
+    old_point, new_point = instance._loaded_point, (instance.geotag_lat, instance.geotag_long)
+    instance._loaded_point = new_point
+
+    def invalidate():
+        tiles.invalidate_point(*new_point)
+        if old_point != new_point:
+            tiles.invalidate_point(*old_point)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Report)
+def drop_deleted_report_tiles(sender, instance, **kwargs):
+    transaction.on_commit(lambda: tiles.invalidate_point(instance.geotag_lat, instance.geotag_long))
+
+
+# ----------------------------
+# Page cache
+# ----------------------------
+@receiver([post_save, post_delete], sender=Report)
+def drop_report_pages(sender, instance, **kwargs):
+    report_id = instance.report_id  # cleared on the instance once a delete finishes
+    transaction.on_commit(lambda: pagecache.invalidate_report(report_id))
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+@receiver(post_save, sender=PointsEntry)
+@receiver(post_save, sender=User)
+def drop_leaderboard_pages(sender, **kwargs):
+    transaction.on_commit(pagecache.invalidate_leaderboard)
+
+
+# ----------------------------
+# Reward catalog / claims
+# ----------------------------
+@receiver([post_save, post_delete], sender=Reward)
+def drop_reward_catalog(sender, **kwargs):
+    transaction.on_commit(rewards.catalog_changed)
+
+
+@receiver([post_save, post_delete], sender=UserReward)
+def drop_claimed_rewards(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: rewards.claims_changed(user_id))
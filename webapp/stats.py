@@ -0,0 +1,125 @@
+# webapp/stats.py
+"""
+Home page statistics kept in the cache.
+
+Counters are adjusted in place when reports are created, deleted or
+change status; the recent-verified and top-contributor lists are dropped
+when something they show changes. In the steady state the home page
+runs no aggregate queries. Entries also expire after STATS_TTL so any
+drift (e.g. cache eviction racing an update) heals itself.
+
+Status changes are applied by the classify_reports workers too, so
+STATS_CACHE must be shared by every process (check_settings() refuses a
+per-process one at startup).
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Report
+
+TOTAL_REPORTS = "stats:total_reports"
+VERIFIED_REPORTS = "stats:verified_reports"
+RECENT_VERIFIED = "stats:recent_verified"
+TOP_CONTRIBUTORS = "stats:top_contributors"
+
+STATS_TTL = 600
+RECENT_COUNT = 5
+TOP_COUNT = 3
+
+
+def _cache():
+    return caches[getattr(settings, "STATS_CACHE", "shared")]
+
+
+def _ttl():
+    return getattr(settings, "STATS_TTL", STATS_TTL)
+
+
+def check_settings():
+    """Called at startup (WebappConfig.ready)."""
+    from .pagecache import require_shared
+
+    require_shared(getattr(settings, "STATS_CACHE", "shared"), "STATS_CACHE")
+
+
+# ----------------------------
+# Read
+# ----------------------------
+def home_stats():
+    cache = _cache()
+    values = cache.get_many([TOTAL_REPORTS, VERIFIED_REPORTS, RECENT_VERIFIED, TOP_CONTRIBUTORS])
+    missing = {}
+
+    if TOTAL_REPORTS not in values:
+        missing[TOTAL_REPORTS] = Report.objects.count()
+    if VERIFIED_REPORTS not in values:
+        missing[VERIFIED_REPORTS] = Report.objects.filter(status='verified').count()
+    if RECENT_VERIFIED not in values:
+        missing[RECENT_VERIFIED] = list(
+            Report.objects.filter(status='verified').select_related('user').order_by('-timestamp')[:RECENT_COUNT]
+        )
+    if TOP_CONTRIBUTORS not in values:
+        from .leaderboard import top_entries
+        missing[TOP_CONTRIBUTORS] = top_entries(TOP_COUNT)
+
+    if missing:
+        cache.set_many(missing, _ttl())
+        values.update(missing)
+    return {
+        "total_reports": values[TOTAL_REPORTS],
+        "verified_reports": values[VERIFIED_REPORTS],
+        "recent_reports": values[RECENT_VERIFIED],
+        "top_contributors": values[TOP_CONTRIBUTORS],
+    }
+
+
+def report_count(status=None):
+    """Cached count of all (or verified) reports; None for other filters."""
+    if status is None:
+        return home_stats()["total_reports"]
+    if status == 'verified':
+        return home_stats()["verified_reports"]
+    return None
+
+
+# ----------------------------
+# Update (called from signals and from queryset.update() paths)
+# ----------------------------
+def _adjust(key, delta):
+    try:
+        _cache().incr(key, delta)
+    except ValueError:
+        pass  # not cached; the next read recounts
+
+
+def report_created(status):
+    _adjust(TOTAL_REPORTS, 1)
+    if status == 'verified':
+        _adjust(VERIFIED_REPORTS, 1)
+        _cache().delete(RECENT_VERIFIED)
+
+
+def report_deleted(status):
+    _adjust(TOTAL_REPORTS, -1)
+    if status == 'verified':
+        _adjust(VERIFIED_REPORTS, -1)
+        _cache().delete(RECENT_VERIFIED)
+
+
+def report_changed(old_status, new_status):
+    if old_status != new_status:
+        if old_status == 'verified':
+            _adjust(VERIFIED_REPORTS, -1)
+        if new_status == 'verified':
+            _adjust(VERIFIED_REPORTS, 1)
+    if 'verified' in (old_status, new_status):
+        _cache().delete(RECENT_VERIFIED)
+
+
+def reset():
+    """Forget everything (e.g. after bulk writes that sent no signals); the next read recounts."""
+    _cache().delete_many([TOTAL_REPORTS, VERIFIED_REPORTS, RECENT_VERIFIED, TOP_CONTRIBUTORS])
+
+
+def points_changed():
+    _cache().delete(TOP_CONTRIBUTORS)
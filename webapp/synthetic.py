@@ -0,0 +1,290 @@
+# webapp/synthetic.py
+"""
+Deterministic synthetic data for benchmarks and load tests.
+
+seed() fills the database with users (with profiles and leaderboard
+rows), reports, rewards, claims and small JPEG photos, all derived from
+one random seed, at anything from a test fixture to millions of reports:
+  * geotags cluster along real mangrove coastlines, most of them around
+    a few hotspots per coast, the rest spread along the shore;
+  * per-user activity is Zipf-skewed: a few users file most reports
+    and claims, most users only a handful;
+  * timestamps are spread over `days` and rise with report_id, as they
+    do in production;
+  * photos are rendered in worker processes and stored through the
+    normal upload path, so they are deduplicated blobs like real ones.
+Rows go in with bulk_create in `batch_size` batches, one transaction
+each, so afterwards this does what the per-row signals would have done:
+geohash, search index, home page stats, map tiles, cached pages, the
+reward catalog and the leaderboard engine. Points are consistent with
+the ledger: REPORT_POINTS per verified report less the cost of every
+claimed reward, already folded into User.points and Leaderboard.points.
+Users only claim rewards they can afford.
+"""
+import io
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+from itertools import accumulate, repeat
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import geo, pagecache, rewards as reward_cache, search, stats, tiles
+from .dedup import store_upload
+from .leaderboard import engine
+from .models import Leaderboard, Report, Reward, User, UserProfile, UserReward
+from .points import REPORT_POINTS
+from .views import REPORT_TYPE_CHOICES
+
+PASSWORD = "synthetic-password"   # every synthetic user's password
+EMAIL_DOMAIN = "synthetic.example.com"
+BATCH_SIZE = 5000
+ZIPF_EXPONENT = 1.1
+REPORT_TYPE_WEIGHTS = {"cutting": 40, "dumping": 25, "reclamation": 15, "damage": 15, "restoration": 5}
+REPORT_TYPES = tuple((value, REPORT_TYPE_WEIGHTS.get(value, 5)) for value, _ in REPORT_TYPE_CHOICES)
+STATUSES = (("pending", 50), ("verified", 35), ("rejected", 15))
+WORDS = (
+    "mangrove", "cutting", "trees", "felled", "near", "creek", "shore", "plastic", "waste", "dumped",
+    "landfill", "burning", "nets", "boats", "sewage", "oil", "construction", "sand", "mining", "roots",
+)
+# Mangrove coasts as (lat, lng) polylines.
+COASTLINES = {
+    "sundarbans": ((21.55, 88.05), (21.6, 88.5), (21.65, 88.9), (21.7, 89.3), (21.8, 89.8)),
+    "mumbai": ((19.3, 72.8), (19.05, 72.83), (18.95, 72.95), (18.85, 73.0)),
+    "kerala": ((10.2, 76.15), (9.95, 76.25), (9.6, 76.32), (9.2, 76.45), (8.9, 76.55)),
+    "godavari": ((16.95, 82.35), (16.7, 82.3), (16.5, 82.1), (16.3, 81.75), (16.15, 81.4)),
+    "kutch": ((22.9, 69.0), (22.75, 69.45), (22.6, 69.9), (22.45, 70.3)),
+    "andaman": ((12.9, 92.9), (12.4, 92.85), (11.9, 92.75), (11.6, 92.7)),
+}
+HOTSPOTS_PER_COAST = 8
+HOTSPOT_SHARE = 0.7       # reports near a hotspot; the rest anywhere along a coast
+HOTSPOT_SPREAD = 0.02     # degrees
+SHORE_SPREAD = 0.05       # degrees either side of the coastline
+
+
+@lru_cache(maxsize=1)
+def password_hash():
+    # Hashing is deliberately slow; every synthetic user shares one hash.
+    return make_password(PASSWORD)
+
+
+def email(i, seed=0):
+    return f"user{i}.s{seed}@{EMAIL_DOMAIN}"
+
+
+def synthetic_users(seed=0):
+    return User.objects.filter(email__endswith=f".s{seed}@{EMAIL_DOMAIN}")
+
+
+def jpeg_bytes(rng, size=(320, 240)):
+    """A small random photo: coloured blocks, so each one hashes differently."""
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        img.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 120)))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=80)
+    return out.getvalue()
+
+
+def render_image(seed, i):
+    # Seeded per image, so the result doesn't depend on which worker renders it.
+    return jpeg_bytes(random.Random(f"{seed}:{i}"))
+
+
+def sentence(rng, words=8):
+    return " ".join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def zipf_cum_weights(count, exponent=ZIPF_EXPONENT):
+    """Cumulative weights for rng.choices(): the item of rank r gets 1/r**exponent."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+# ----------------------------
+# Geography
+# ----------------------------
+class CoastSampler:
+    """Random geotags along COASTLINES, clustered around seeded hotspots."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.segments = [
+            (a, b) for line in COASTLINES.values() for a, b in zip(line, line[1:])
+        ]
+        self.cum_lengths = list(accumulate(
+            ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5 for a, b in self.segments
+        ))
+        self.hotspots = [self._on_shore(0) for _ in range(HOTSPOTS_PER_COAST * len(COASTLINES))]
+        self.hotspot_weights = zipf_cum_weights(len(self.hotspots))
+
+    def _on_shore(self, spread):
+        (lat1, lng1), (lat2, lng2) = self.rng.choices(self.segments, cum_weights=self.cum_lengths)[0]
+        t = self.rng.random()
+        return (
+            lat1 + (lat2 - lat1) * t + self.rng.gauss(0, spread),
+            lng1 + (lng2 - lng1) * t + self.rng.gauss(0, spread),
+        )
+
+    def point(self):
+        if self.rng.random() < HOTSPOT_SHARE:
+            lat, lng = self.rng.choices(self.hotspots, cum_weights=self.hotspot_weights)[0]
+            return lat + self.rng.gauss(0, HOTSPOT_SPREAD), lng + self.rng.gauss(0, HOTSPOT_SPREAD)
+        return self._on_shore(SHORE_SPREAD)
+
+
+# ----------------------------
+# Builders
+# ----------------------------
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield start, min(batch_size, count - start)
+
+
+def _make_users(count, seed, batch_size, progress):
+    for start, n in _batches(count, batch_size):
+        User.objects.bulk_create([
+            User(
+                name=f"Synthetic User {i}", email=email(i, seed), password_hash=password_hash(),
+                role="ngo" if i % 10 == 9 else "community", location=f"Site {i % len(COASTLINES)}",
+            )
+            for i in range(start, start + n)
+        ])
+        progress("users", start + n, count)
+    # Read the ids back: MySQL's bulk_create doesn't set primary keys.
+    user_ids = list(synthetic_users(seed).order_by("user_id").values_list("user_id", flat=True))
+    for start, n in _batches(len(user_ids), batch_size):
+        UserProfile.objects.bulk_create([UserProfile(user_id=u) for u in user_ids[start:start + n]])
+    return user_ids
+
+
+def _make_images(count, seed, workers, progress):
+    """[(blob id, file name)] for `count` photos rendered in `workers` processes."""
+    if workers > 1 and count > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            photos = pool.map(render_image, repeat(seed, count), range(count), chunksize=16)
+            return _store_images(photos, count, progress)
+    return _store_images((render_image(seed, i) for i in range(count)), count, progress)
+
+
+def _store_images(photos, count, progress):
+    blobs = []
+    for i, photo in enumerate(photos):
+        blob, _ = store_upload(ContentFile(photo, name=f"synthetic-{i}.jpg"))
+        blobs.append((blob.pk, blob.file.name))
+        if (i + 1) % 100 == 0 or i + 1 == count:
+            progress("images", i + 1, count)
+    return blobs
+
+
+def _make_reports(rng, user_ids, blobs, count, days, batch_size, progress):
+    """Create `count` reports; returns {user_id: verified report count}."""
+    coast = CoastSampler(rng)
+    active = user_ids[:]
+    rng.shuffle(active)  # so the busiest users aren't simply the oldest accounts
+    activity = zipf_cum_weights(len(active))
+    types, type_weights = zip(*REPORT_TYPES)
+    statuses, status_weights = zip(*STATUSES)
+    start_time = timezone.now() - timedelta(days=days)
+    step = timedelta(days=days) / max(count, 1)
+    verified = Counter()
+
+    for start, n in _batches(count, batch_size):
+        authors = rng.choices(active, cum_weights=activity, k=n)
+        batch = []
+        for j, (author, report_type, status) in enumerate(zip(
+            authors, rng.choices(types, type_weights, k=n), rng.choices(statuses, status_weights, k=n),
+        )):
+            lat, lng = coast.point()
+            blob_id, image = rng.choice(blobs) if blobs and rng.random() < 0.8 else (None, None)
+            batch.append(Report(
+                user_id=author, title=sentence(rng, rng.randint(3, 6)), description=sentence(rng, rng.randint(8, 40)),
+                report_type=report_type, status=status,
+                geotag_lat=lat, geotag_long=lng, geohash=geo.encode(lat, lng),  # bulk_create skips pre_save
+                image=image, image_blob_id=blob_id,
+                timestamp=start_time + step * (start + j + rng.random()),
+            ))
+            if status == "verified":
+                verified[author] += 1
+        with transaction.atomic():
+            batch = Report.objects.bulk_create(batch)
+            search.index_reports(batch)
+        progress("reports", start + n, count)
+    return verified
+
+
+def _award_points(user_ids, balances, batch_size):
+    # As if every report and claim's ledger entry had already been compacted.
+    for start, n in _batches(len(user_ids), batch_size):
+        chunk = user_ids[start:start + n]
+        Leaderboard.objects.bulk_create([Leaderboard(user_id=u, points=balances[u]) for u in chunk])
+        earners = [User(user_id=u, points=balances[u]) for u in chunk if balances[u]]
+        User.objects.bulk_update(earners, ["points"])
+
+
+def _make_claims(rng, balances, rewards, count, batch_size):
+    """
+    Claims skewed towards the richest users, cheap rewards more popular.
+    Each claim's cost comes off `balances`; returns how many were created.
+    """
+    if not rewards:
+        return 0
+    cheapest = rewards[0][1]  # rewards are (reward_id, cost), cheapest first
+    claimants = sorted((u for u, points in balances.items() if points >= cheapest), key=lambda u: (-balances[u], u))
+    if not claimants:
+        return 0
+    activity = zipf_cum_weights(len(claimants))
+    popularity = zipf_cum_weights(len(rewards))
+    count = min(count, len(claimants) * len(rewards))
+    pairs = set()
+    for _ in range(count * 4):
+        if len(pairs) >= count:
+            break
+        user_id = rng.choices(claimants, cum_weights=activity)[0]
+        reward_id, cost = rng.choices(rewards, cum_weights=popularity)[0]
+        if (user_id, reward_id) not in pairs and cost <= balances[user_id]:
+            pairs.add((user_id, reward_id))
+            balances[user_id] -= cost
+    UserReward.objects.bulk_create([UserReward(user_id=u, reward_id=r) for u, r in sorted(pairs)], batch_size=batch_size)
+    return len(pairs)
+
+
+def seed(users=100, reports=2000, rewards=20, images=20, claims=50, seed=0, days=365,
+         batch_size=BATCH_SIZE, workers=None, progress=None):
+    """
+    Create a synthetic dataset; returns the counts created.
+    `progress(stage, done, total)` is called as each batch lands.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda stage, done, total: None)
+    workers = workers or os.cpu_count() or 1
+
+    user_ids = _make_users(users, seed, batch_size, progress)
+    blobs = _make_images(images, seed, workers, progress)
+    verified = _make_reports(rng, user_ids, blobs, reports, days, batch_size, progress)
+    balances = {u: verified[u] * REPORT_POINTS for u in user_ids}
+
+    Reward.objects.bulk_create([
+        Reward(title=f"Reward {i}", description=sentence(rng, 10), points_required=rng.choice((50, 100, 250, 500)))
+        for i in range(rewards)
+    ])
+    costs = Reward.objects.order_by("-reward_id")[:rewards].values_list("reward_id", "points_required")
+    costs = sorted(costs, key=lambda row: (row[1], row[0]))
+    claimed = _make_claims(rng, balances, costs, claims, batch_size)
+    _award_points(user_ids, balances, batch_size)
+
+    # bulk_create sent no signals.
+    stats.reset()
+    tiles.invalidate_all()
+    pagecache.invalidate_reports()
+    pagecache.invalidate_leaderboard()
+    reward_cache.catalog_changed()  # claims are all for new users, so nothing of theirs is cached
+    engine.rebuild()
+    return {"users": len(user_ids), "reports": reports, "rewards": rewards, "images": len(blobs), "claims": claimed}
@@ -0,0 +1,22 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from webapp.pagecache import HOLE_MARKER, HOLES, leaves_holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def uncached(context, name):
+    """
+    A per-user fragment of a page that may be served from the page cache
+    (see webapp/pagecache.py). Renders HOLES[name] inline, or leaves a
+    marker for the cache to fill in on each request.
+
+        {% load page_cache %}
+        {% uncached "user_nav" %}
+    """
+    if leaves_holes(context):
+        return mark_safe(HOLE_MARKER % name)
+    return render_to_string(HOLES[name], context.flatten())
@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html
+
+from webapp.thumbnails import srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def report_picture(report, sizes="100vw", css_class="report-image", alt=""):
+    """
+    <picture> for a report photo: WebP and JPEG srcsets when thumbnails
+    exist, otherwise the original image.
+
+        {% load report_images %}
+        {% report_picture report sizes="(max-width: 600px) 100vw, 600px" %}
+    """
+    if not report.image:
+        return ""
+    alt = alt or report.title
+    widths = [int(w) for w in (report.thumbnail_widths or "").split(",") if w]
+    if not widths:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy">', report.image.url, alt, css_class,
+        )
+
+    name = report.image.name
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy">'
+        '</picture>',
+        srcset(name, widths, "webp"), sizes,
+        report.image.url, srcset(name, widths, "jpg"), sizes, alt, css_class,
+    )
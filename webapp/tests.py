@@ -1,3 +1,1586 @@
-from django.test import TestCase
+import bisect
+import html
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import bulk, classification, dedup, geo, loadtest, middleware, pagecache, rewards, search, stats, synthetic, thumbnails, tiles, views
+from .middleware import USER_COOKIE, CurrentUserMiddleware, session_max_age, set_login_cookie
+from .classification import apply_prediction, enqueue_report, run_job
+from .dedup import forget_predictions, store_upload
+from .leaderboard import IndexableSkipList, LeaderboardEngine
+from .ml_model import preprocess
+from .ml_model.batching import MicroBatcher
+from .ml_model.registry import ModelRegistry
+from .models import (
+    ClassificationJob, ImageBlob, Leaderboard, PointsEntry, Report, Reward, User, UserProfile, UserReward,
+)
+from .pagination import keyset_page
+from .points import REPORT_POINTS, award_points, balance, compact_points
+from .profiling import profile
+from .uploads import STAGING_DIR, ReportUploadHandler
+
+REPORT_TABLE = Report._meta.db_table
+SHARED_CACHE_TABLE = settings.CACHES["shared"]["LOCATION"]
+
+
+# ----------------------------
+# Query plans
+# ----------------------------
+def explain(sql):
+    """EXPLAIN rows for a captured statement, as lowercase strings."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1].lower() for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN " + sql)
+        columns = [c[0].lower() for c in cursor.description]
+        return [" ".join(f"{k}={v}" for k, v in zip(columns, row)).lower() for row in cursor.fetchall()]
+
+
+def app_queries(profile):
+    """SQL of a recorded request other than shared (database) cache reads and writes."""
+    return [
+        q[0] for q in profile.queries
+        if SHARED_CACHE_TABLE not in q[0] and not q[0].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+    ]
+
+
+def plan_problems(sql):
+    """Full scans or sorts of the report table in the plan for `sql`."""
+    problems = []
+    for row in explain(sql):
+        if connection.vendor == "sqlite":
+            if re.search(rf"\bscan {REPORT_TABLE}\b(?! using (covering )?index)", row):
+                problems.append(row)
+            if "temp b-tree" in row:
+                problems.append(row)
+        elif connection.vendor == "mysql":
+            if f"table={REPORT_TABLE} " in row and ("type=all" in row or "using filesort" in row):
+                problems.append(row)
+    return problems
+
+
+class ReportQueryPlanTests(TestCase):
+    """
+    The listing views must reach reports through an index, in order.
+    Seeds enough rows that the planner prefers an index when one fits.
+    """
+
+    REPORTS = 20_000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        cls.users = User.objects.bulk_create(
+            [User(name=f"user{i}", password_hash="!", role="community") for i in range(50)]
+        )
+        for user in cls.users:
+            UserProfile.objects.create(user=user)
+            Leaderboard.objects.create(user=user)
+        Report.objects.bulk_create(
+            [
+                Report(
+                    user=rng.choice(cls.users),
+                    title=f"Report {i}",
+                    description="synthetic",
+                    report_type=rng.choice(["pothole", "garbage", "water", "other"]),
+                    status=rng.choice(["pending", "verified", "rejected"]),
+                )
+                for i in range(cls.REPORTS)
+            ],
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+            elif connection.vendor == "mysql":
+                cursor.execute(f"ANALYZE TABLE {REPORT_TABLE}")
+                cursor.fetchall()
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def assert_report_queries_indexed(self, path, user=None):
+        if user is not None:
+            response = self.client.get("/")
+            set_login_cookie(response, user)
+            self.client.cookies.update(response.cookies)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+
+        checked = 0
+        for query in queries.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not re.search(rf'FROM [`"]?{REPORT_TABLE}[`"]?\s', sql + " "):
+                continue
+            checked += 1
+            problems = plan_problems(sql)
+            self.assertFalse(problems, f"{path}: {sql}\n" + "\n".join(problems))
+        self.assertTrue(checked, f"{path} ran no report queries")
+
+    def test_home(self):
+        self.assert_report_queries_indexed("/")
+
+    def test_reports_list(self):
+        self.assert_report_queries_indexed("/reports/")
+
+    def test_reports_list_filtered(self):
+        self.assert_report_queries_indexed("/reports/?status=verified")
+        self.assert_report_queries_indexed("/reports/?type=water")
+        self.assert_report_queries_indexed("/reports/?status=pending&type=garbage")
+
+    def test_reports_list_deep_page(self):
+        page = keyset_page(Report.objects.all(), 10, page=50)
+        self.assert_report_queries_indexed(f"/reports/?cursor={page.next_cursor}")
+        self.assert_report_queries_indexed(f"/reports/?status=verified&cursor={page.previous_cursor}")
+
+    def test_dashboard(self):
+        user = self.users[0]
+        self.assert_report_queries_indexed("/dashboard/", user=user)
+        page = keyset_page(Report.objects.filter(user=user), 5)
+        self.assert_report_queries_indexed(f"/dashboard/?cursor={page.next_cursor}", user=user)
+
+
+# ----------------------------
+# Inference backends
+# ----------------------------
+class TFLiteParityTests(SimpleTestCase):
+    """The exported .tflite model must classify like report_model.h5."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            import tensorflow  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("TensorFlow is not installed")
+        from .ml_model import runtime
+        from .ml_model.export import sample_inputs
+        from .ml_model.predict import DATASET_DIR, MODEL_PATH
+
+        cls.model_path = MODEL_PATH
+        cls.dataset_dir = DATASET_DIR
+        cls.keras_model = runtime.load_keras(MODEL_PATH)
+        cls.inputs = sample_inputs(cls.keras_model, DATASET_DIR)
+        cls.tmp = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        if hasattr(cls, "tmp"):
+            shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def export(self, quantize=None):
+        from .ml_model import runtime
+        from .ml_model.export import export_tflite
+
+        path = os.path.join(self.tmp, f"model-{quantize or 'float'}.tflite")
+        export_tflite(self.model_path, path, quantize=quantize, calibration_dir=self.dataset_dir)
+        return runtime.load_tflite(path)
+
+    def test_float_export_matches_keras(self):
+        from .ml_model.export import parity
+
+        agreement, max_diff = parity(self.keras_model, self.export(), self.inputs)
+        self.assertEqual(agreement, 1.0)
+        self.assertLess(max_diff, 1e-4)
+
+    def test_int8_export_keeps_top1(self):
+        from .ml_model.export import parity
+
+        agreement, _ = parity(self.keras_model, self.export("int8"), self.inputs)
+        self.assertGreaterEqual(agreement, 0.95)
+
+    def test_batch_size_changes(self):
+        model = self.export()
+        single = model.predict(self.inputs[:1])
+        batch = model.predict(self.inputs)
+        np.testing.assert_allclose(single[0], batch[0], atol=1e-5)
+        self.assertEqual(len(batch), len(self.inputs))
+
+
+class PreprocessTests(SimpleTestCase):
+    """Serving preprocessing matches training and is cached by content hash."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def photo(self, fmt, size=(1024, 768)):
+        # A smooth gradient, like real photos, large enough for JPEG draft mode to kick in.
+        x = np.linspace(0, 255, size[0])[None, :]
+        y = np.linspace(0, 255, size[1])[:, None]
+        pixels = np.stack(np.broadcast_arrays(x, y, (x + y) / 2), axis=-1).astype(np.uint8)
+        out = io.BytesIO()
+        Image.fromarray(pixels).save(out, fmt, quality=90)
+        return out.getvalue()
+
+    def test_matches_training_preprocessing(self):
+        for fmt, atol in (("PNG", 1e-6), ("JPEG", 0.02)):
+            data = self.photo(fmt)
+            # What train_model.py's load_img(target_size=...) with rescale=1./255 produces.
+            with Image.open(io.BytesIO(data)) as img:
+                expected = np.asarray(img.convert("RGB").resize(preprocess.IMAGE_SIZE, Image.NEAREST), dtype="float32") / 255
+            actual = preprocess.decode_into(data, np.empty(preprocess.INPUT_SHAPE, dtype="float32"))
+            with self.subTest(fmt=fmt):
+                np.testing.assert_allclose(actual, expected, atol=atol)
+                self.assertLess(np.abs(actual - expected).mean(), atol / 10)
+
+    def test_lru_eviction(self):
+        cache = preprocess.TensorCache(maxsize=2)
+        for key in "ab":
+            cache.put(key, np.full(3, ord(key)))
+        cache.get("a")  # now most recently used
+        cache.put("c", np.zeros(3))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_reloads_from_the_disk_mirror(self):
+        key = preprocess.content_hash(b"photo")
+        tensor = np.random.default_rng(3).random(preprocess.INPUT_SHAPE, dtype="float32")
+        preprocess.TensorCache(directory=self.tmp).put(key, tensor)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, key[:2], f"{key}.npy")))
+
+        fresh = preprocess.TensorCache(directory=self.tmp)  # another process
+        np.testing.assert_array_equal(fresh.get(key), tensor)
+        self.assertEqual((fresh.hits, fresh.misses), (1, 0))
+        self.assertIsNone(fresh.get(preprocess.content_hash(b"other")))
+
+    def test_preprocess_image_decodes_once(self):
+        data = self.photo("PNG", size=(64, 48))
+        cache = preprocess.TensorCache(directory=self.tmp)
+        with mock.patch.object(preprocess, "get_cache", return_value=cache), \
+                mock.patch.object(preprocess, "decode_into", wraps=preprocess.decode_into) as decode:
+            first = preprocess.preprocess_image(data)
+            batch = preprocess.preprocess_batch([data, data])
+        self.assertEqual(decode.call_count, 1)
+        np.testing.assert_array_equal(batch[1], first)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Concurrent predicts are merged into batches and each caller gets its own rows back."""
+
+    def setUp(self):
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def predict(self, x):
+        self.calls.append(x.shape)
+        self.entered.set()
+        self.release.wait(5)
+        if self.fail and len(self.calls) > 1:
+            raise RuntimeError("model exploded")
+        return "v1", x * 2
+
+    def batcher(self, **kwargs):
+        return MicroBatcher(self.predict, **kwargs)
+
+    def hold(self, batcher):
+        """Park the worker inside a first predict so the next submits queue up together."""
+        self.release.clear()
+        first = batcher.submit(np.zeros((1, 3)))
+        self.assertTrue(self.entered.wait(5))
+        return first
+
+    def test_concurrent_submits_get_their_own_rows(self):
+        batcher = self.batcher(max_batch_size=8, max_wait_ms=20)
+        results = {}
+
+        def call(i):
+            results[i] = batcher.predict(np.full((1 + i % 2, 3), i), timeout=5)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i, (version, preds) in results.items():
+            self.assertEqual(version, "v1")
+            np.testing.assert_array_equal(preds, np.full((1 + i % 2, 3), i * 2))
+        self.assertLess(len(self.calls), 16)
+        self.assertEqual(sum(shape[0] for shape in self.calls), 24)
+
+    def test_batch_closes_at_max_size(self):
+        batcher = self.batcher(max_batch_size=4, max_wait_ms=50)
+        first = self.hold(batcher)
+        futures = [batcher.submit(np.full((1, 3), i)) for i in range(10)]
+        self.release.set()
+        for i, future in enumerate(futures):
+            np.testing.assert_array_equal(future.result(5)[1], np.full((1, 3), i * 2))
+        first.result(5)
+        self.assertEqual([shape[0] for shape in self.calls], [1, 4, 4, 2])
+        self.assertEqual(batcher.stats()["batch_size_histogram"], {1: 1, 2: 1, 4: 2})
+
+    def test_batch_closes_after_max_wait(self):
+        batcher = self.batcher(max_batch_size=32, max_wait_ms=30)
+        started = time.perf_counter()
+        batcher.predict(np.zeros((1, 3)), timeout=5)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.025)
+        self.assertEqual(self.calls, [(1, 3)])
+
+    def test_mismatched_shapes_run_in_separate_batches(self):
+        batcher = self.batcher(max_batch_size=8, max_wait_ms=20)
+        self.hold(batcher)
+        narrow = [batcher.submit(np.ones((1, 3))) for _ in range(2)]
+        wide = [batcher.submit(np.ones((1, 4))) for _ in range(2)]
+        self.release.set()
+        for future in narrow:
+            self.assertEqual(future.result(5)[1].shape, (1, 3))
+        for future in wide:
+            self.assertEqual(future.result(5)[1].shape, (1, 4))
+        self.assertEqual(self.calls, [(1, 3), (2, 3), (2, 4)])
+
+    def test_failure_reaches_every_caller(self):
+        batcher = self.batcher(max_batch_size=8, max_wait_ms=20)
+        self.fail = True
+        self.hold(batcher)
+        futures = [batcher.submit(np.ones((1, 3))) for _ in range(3)]
+        self.release.set()
+        for future in futures:
+            with self.assertRaisesRegex(RuntimeError, "model exploded"):
+                future.result(5)
+        self.assertEqual(self.calls, [(1, 3), (3, 3)])
+        self.fail = False
+        self.assertEqual(batcher.predict(np.ones((2, 3)), timeout=5)[0], "v1", "the worker keeps running")
+
+
+class BlobPredictionTests(TestCase):
+    """A prediction cached on an image is only reused for the model version that made it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+        cls.blob = ImageBlob.objects.create(
+            sha256="a" * 64, phash="0" * 16, phash_band0=0, phash_band1=0, phash_band2=0, phash_band3=0,
+            file="reports/aa/blob.jpg", size=1, predicted_report_type="dumping", predicted_model_version="old",
+        )
+        cls.report = Report.objects.create(
+            user=user, title="t", description="d", report_type="cutting", image="reports/aa/blob.jpg",
+            image_blob=cls.blob, thumbnail_widths="160",
+        )
+
+    def run_job(self, serving):
+        from .ml_model import predict
+
+        job = enqueue_report(self.report)
+        job = ClassificationJob.objects.select_related("report", "report__image_blob").get(pk=job.pk)
+        with mock.patch.object(predict, "model_version", return_value=serving), \
+                mock.patch.object(predict, "classify_report_image", return_value=("cutting", serving)) as classify:
+            self.assertTrue(run_job(job))
+        self.report.refresh_from_db()
+        self.blob.refresh_from_db()
+        return classify.call_count
+
+    def test_reused_for_the_same_version(self):
+        self.assertEqual(self.run_job("old"), 0)
+        self.assertEqual((self.report.predicted_report_type, self.report.predicted_model_version), ("dumping", "old"))
+
+    def test_reclassified_after_a_model_swap(self):
+        self.assertEqual(self.run_job("new"), 1)
+        self.assertEqual((self.report.predicted_report_type, self.report.predicted_model_version), ("cutting", "new"))
+        self.assertEqual((self.blob.predicted_report_type, self.blob.predicted_model_version), ("cutting", "new"))
+
+    def test_swap_forgets_other_versions(self):
+        tmp = tempfile.NamedTemporaryFile(suffix=".h5", delete=False)
+        self.addCleanup(os.remove, tmp.name)
+        tmp.write(b"v1")
+        tmp.close()
+        swapped = []
+        registry = ModelRegistry(tmp.name, load=lambda path: object(), on_swap=swapped.append, poll_seconds=0)
+        registry.current()
+        self.assertEqual(swapped, [], "the first load in a process is not a swap")
+
+        with open(tmp.name, "wb") as f:
+            f.write(b"v2-model")
+        registry.check()
+        registry.wait()
+        version = registry.current().version
+        self.assertEqual([loaded.version for loaded in swapped], [version])
+
+        self.assertEqual(forget_predictions(keep_version=version), 1)
+        self.blob.refresh_from_db()
+        self.assertIsNone(self.blob.predicted_report_type)
+
+
+class ClassificationJobTests(TestCase):
+    """Claiming, retrying and reclaiming jobs in the classification queue."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+        cls.report = Report.objects.create(
+            user=user, title="t", description="d", report_type="cutting", image="reports/aa/job.jpg",
+            thumbnail_widths="160",
+        )
+
+    def classify(self, **kwargs):
+        from .ml_model import predict
+
+        kwargs.setdefault("return_value", ("cutting", "v1"))
+        return mock.patch.object(predict, "classify_report_image", **kwargs)
+
+    def test_claim_takes_each_runnable_job_once(self):
+        job = enqueue_report(self.report)
+        ClassificationJob.objects.create(report=self.report, run_after=timezone.now() + timedelta(minutes=1))
+
+        claimed = classification.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts), ("running", 1))
+        self.assertIsNone(classification.claim_next_job())
+
+    def test_failure_backs_off_then_retries(self):
+        enqueue_report(self.report)
+        job = classification.claim_next_job()
+        with self.classify(side_effect=OSError("unreadable")), self.assertLogs(classification.logger, "WARNING"):
+            self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "queued")
+        self.assertIn("unreadable", job.last_error)
+        self.assertAlmostEqual(
+            (job.run_after - timezone.now()).total_seconds(), classification.RETRY_BASE_SECONDS, delta=2,
+        )
+        self.assertIsNone(classification.claim_next_job())
+
+        with mock.patch.object(classification.timezone, "now", return_value=job.run_after):
+            job = classification.claim_next_job()
+        self.assertEqual(job.attempts, 2)
+        with self.classify():
+            self.assertTrue(run_job(job))
+        job.refresh_from_db()
+        self.report.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), ("done", None))
+        self.assertEqual(self.report.status, "verified")
+
+    def test_write_back_failure_requeues_the_job(self):
+        enqueue_report(self.report)
+        job = classification.claim_next_job()
+        with self.classify(), mock.patch.object(classification, "apply_prediction", side_effect=IntegrityError), \
+                self.assertLogs(classification.logger, "WARNING"):
+            self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "queued")
+
+    def test_fails_after_max_attempts(self):
+        enqueue_report(self.report, max_attempts=2)
+        for _ in range(2):
+            ClassificationJob.objects.update(run_after=timezone.now())
+            job = classification.claim_next_job()
+            with self.classify(side_effect=OSError), self.assertLogs(classification.logger, "WARNING"):
+                self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        ClassificationJob.objects.update(run_after=timezone.now())
+        self.assertIsNone(classification.claim_next_job())
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = enqueue_report(self.report)
+        started = timezone.now() - classification.STALE_AFTER
+        ClassificationJob.objects.filter(pk=job.pk).update(status="running", attempts=1, started_at=started + timedelta(minutes=1))
+        self.assertIsNone(classification.claim_next_job())
+
+        ClassificationJob.objects.filter(pk=job.pk).update(started_at=started - timedelta(minutes=1))
+        reclaimed = classification.claim_next_job()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (job.pk, 2))
+
+    def test_drain_waits_for_backoff_jobs(self):
+        job = ClassificationJob.objects.create(report=self.report, run_after=timezone.now() + timedelta(seconds=0.3))
+        pool = classification.WorkerPool(workers=1, poll_interval=0.05, drain=True)
+        with self.classify(), mock.patch.object(classification, "close_old_connections"):
+            pool._worker()
+        job.refresh_from_db()
+        self.assertEqual((pool.processed, job.status), (1, "done"))
+
+    def test_worker_survives_errors(self):
+        enqueue_report(self.report)
+        pool = classification.WorkerPool(workers=1, poll_interval=0, drain=True)
+        claim = mock.Mock(side_effect=[IntegrityError, classification.claim_next_job(), None])
+        with self.classify(), mock.patch.object(classification, "claim_next_job", claim), \
+                mock.patch.object(classification, "close_old_connections"), \
+                self.assertLogs(classification.logger, "ERROR") as logs:
+            pool._worker()
+        self.assertEqual((pool.processed, pool.failed), (1, 0))
+        self.assertIn("Classification worker error", logs.output[0])
+
+
+class ReclassifyReportsTests(TestCase):
+    """manage.py reclassify_reports: bulk-written predictions and a resumable checkpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+
+    def setUp(self):
+        from .management.commands import reclassify_reports
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.checkpoint = os.path.join(media, "reclassify.checkpoint")
+        self.batches = []
+        self.interrupt_after = None
+        # Red photos are "cutting", green ones "dumping".
+        self.enterContext(mock.patch.object(reclassify_reports, "get_class_names", return_value=["cutting", "dumping"]))
+        self.enterContext(mock.patch.object(reclassify_reports, "model_version", return_value="v2"))
+        self.enterContext(mock.patch.object(reclassify_reports, "predict_batch", side_effect=self.predict))
+
+        red, green = self.photo("red"), self.photo("green")
+        self.reports = [
+            self.report("cutting", red),                       # match: verified
+            self.report("dumping", red),                       # mismatch: stays pending
+            self.report("dumping", green, status="rejected"),  # never promoted
+            self.report("dumping", green),
+        ]
+
+    def predict(self, x):
+        if len(self.batches) == self.interrupt_after:
+            raise KeyboardInterrupt
+        self.batches.append(len(x))
+        return "v2", x[:, 0, 0, :2]
+
+    def photo(self, colour):
+        out = io.BytesIO()
+        Image.new("RGB", (32, 32), colour).save(out, "PNG")
+        return default_storage.save(f"reports/{colour}.png", ContentFile(out.getvalue()))
+
+    def report(self, report_type, image, status="pending"):
+        return Report.objects.create(
+            user=self.user, title="t", description="d", report_type=report_type, image=image, status=status,
+        )
+
+    def reclassify(self, *args):
+        call_command("reclassify_reports", "--batch-size", "2", "--checkpoint", self.checkpoint, *args, stdout=io.StringIO())
+
+    def results(self):
+        return list(
+            Report.objects.order_by("report_id")
+            .values_list("predicted_report_type", "predicted_model_version", "status")
+        )
+
+    def test_predictions_are_bulk_written(self):
+        self.reclassify()
+        self.assertEqual(self.results(), [
+            ("cutting", "v2", "verified"),
+            ("cutting", "v2", "pending"),
+            ("dumping", "v2", "rejected"),
+            ("dumping", "v2", "verified"),
+        ])
+        self.assertEqual(self.batches, [1, 1])  # each batch's reports share one photo
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_second_run_resumes_after_the_checkpoint(self):
+        self.interrupt_after = 1
+        with self.assertRaises(KeyboardInterrupt):
+            self.reclassify()
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f), {"model": "v2", "last_report_id": self.reports[1].pk})
+        self.assertEqual(self.results()[2:], [(None, None, "rejected"), (None, None, "pending")])
+
+        self.interrupt_after = None
+        self.batches = []
+        self.reclassify()
+        self.assertEqual(self.batches, [1])  # the first batch was not predicted again
+        self.assertEqual(self.results(), [
+            ("cutting", "v2", "verified"),
+            ("cutting", "v2", "pending"),
+            ("dumping", "v2", "rejected"),
+            ("dumping", "v2", "verified"),
+        ])
+
+    def test_checkpoint_from_another_model_starts_over(self):
+        with open(self.checkpoint, "w") as f:
+            json.dump({"model": "v1", "last_report_id": self.reports[1].pk}, f)
+        self.reclassify()
+        self.assertEqual(Report.objects.filter(predicted_model_version="v2").count(), 4)
+
+
+class WebWorkerImportTests(SimpleTestCase):
+    def test_boot_does_not_import_ml_stack(self):
+        # A web worker that never classifies must not pay for numpy/TensorFlow (see benchmark_imports).
+        from .management.commands.benchmark_imports import import_profile
+
+        self.assertEqual(import_profile(repeat=1)["forbidden_loaded"], [])
+
+
+# ----------------------------
+# Query budgets
+# ----------------------------
+@override_settings(PAGE_CACHE_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    """SQL per view (not the page cache), as recorded by ProfilingMiddleware on response.profile."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = []
+        for i in range(8):
+            user = User.objects.create(name=f"user{i}", email=f"user{i}@example.com", password_hash="!", role="community")
+            UserProfile.objects.create(user=user)
+            Leaderboard.objects.update_or_create(user=user, defaults={"points": i * 10})
+            cls.users.append(user)
+        for i in range(30):
+            Report.objects.create(
+                user=cls.users[i % 8], title=f"report {i}", description="mangrove cutting", report_type="cutting",
+                status="verified" if i % 3 else "pending",
+            )
+        rewards = [Reward.objects.create(title=f"reward {i}", description="", points_required=5) for i in range(6)]
+        for reward in rewards[:4]:
+            UserReward.objects.create(user=cls.users[0], reward=reward)
+
+    def setUp(self):
+        # Build the per-process leaderboard engine, then start from cold caches.
+        self.client.get("/leaderboard/")
+        caches["default"].clear()
+
+    def login(self, user):
+        response = HttpResponse()
+        set_login_cookie(response, user)
+        self.client.cookies["user_id"] = response.cookies["user_id"].value
+
+    def assertWithinBudget(self, url, max_queries):
+        """The view's own SQL; reads and writes of the shared (database) cache are not counted."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        profile = response.profile
+        queries = app_queries(profile)
+        self.assertLessEqual(len(queries), max_queries, "\n".join(queries))
+        self.assertEqual([p for p in profile.n_plus_one if SHARED_CACHE_TABLE not in p[0]], [])
+        self.assertEqual([d for d in profile.duplicates if SHARED_CACHE_TABLE not in d[0]], [])
+        return profile
+
+    def test_home(self):
+        self.assertWithinBudget("/", 4)
+        profile = self.assertWithinBudget("/", 0)  # counters and lists now cached
+        self.assertEqual(profile.query_count, 1)    # ...in one read of the shared cache
+
+    def test_listings(self):
+        self.client.get("/")  # the approximate totals come from the home page counters
+        self.assertWithinBudget("/reports/", 1)
+        self.assertWithinBudget("/reports/?status=verified", 1)
+        self.assertWithinBudget("/reports/?search=mangrove", 2)  # ranked matches, paged with a COUNT
+        self.assertWithinBudget(f"/reports/{Report.objects.first().pk}/", 1)
+        self.assertWithinBudget("/leaderboard/", 1)
+
+    def test_dashboard_loads_rewards_with_their_claims(self):
+        self.login(self.users[0])
+        profile = self.assertWithinBudget("/dashboard/", 6)
+        self.assertLessEqual(profile.template_queries, 1)
+
+    def test_detects_n_plus_one(self):
+        with profile() as recorded:
+            titles = [claim.reward.title for claim in UserReward.objects.all()]
+        self.assertEqual(len(titles), 4)
+        self.assertEqual(len(recorded.n_plus_one), 1)
+        self.assertEqual(recorded.n_plus_one[0][1], 4)
+
+    def test_metrics_endpoint(self):
+        self.client.get("/")
+        body = self.client.get("/metrics/").content.decode()
+        self.assertIn('webapp_requests_total{view="home"}', body)
+        self.assertIn('webapp_request_duration_seconds_bucket{view="home",le="+Inf"}', body)
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="10.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get("/ml/metrics/", REMOTE_ADDR="10.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get("/ml/jobs/", REMOTE_ADDR="10.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get("/ml/jobs/").status_code, 200)
+
+
+
+class ReportsListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+        start = timezone.now() - timedelta(days=30)
+        Report.objects.bulk_create(
+            Report(user=user, title=f"report {i:02}", description="d", report_type="cutting",
+                   status="verified" if i % 2 else "pending", timestamp=start + timedelta(hours=i))
+            for i in range(25)
+        )
+
+    def titles(self, response):
+        return re.findall(r">(report \d\d)</a>", response.content.decode())
+
+    def link(self, response, rel):
+        match = re.search(rf'href="\?([^"]*)" rel="{rel}"', response.content.decode())
+        return match and "/reports/?" + html.unescape(match.group(1))
+
+    def test_cursor_round_trip(self):
+        first = self.client.get("/reports/")
+        self.assertEqual(self.titles(first), [f"report {i:02}" for i in range(24, 14, -1)])
+        self.assertIsNone(self.link(first, "prev"))
+
+        second = self.client.get(self.link(first, "next"))
+        self.assertEqual(self.titles(second), [f"report {i:02}" for i in range(14, 4, -1)])
+        third = self.client.get(self.link(second, "next"))
+        self.assertEqual(self.titles(third), [f"report {i:02}" for i in range(4, -1, -1)])
+        self.assertIsNone(self.link(third, "next"))
+
+        self.assertEqual(self.titles(self.client.get(self.link(third, "prev"))), self.titles(second))
+        self.assertEqual(self.titles(self.client.get(self.link(second, "prev"))), self.titles(first))
+
+    def test_cursor_keeps_filters(self):
+        first = self.client.get("/reports/?status=verified")
+        self.assertIn("status=verified", self.link(first, "next"))
+        second = self.client.get(self.link(first, "next"))
+        self.assertEqual(self.titles(second), ["report 03", "report 01"])
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        token = self.link(self.client.get("/reports/"), "next").rsplit("cursor=", 1)[1]
+        response = self.client.get("/reports/", {"cursor": token[:-2] + ("A" if token[-1] != "A" else "B")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response)[0], "report 24")
+
+    def test_legacy_page_number(self):
+        response = self.client.get("/reports/?page=2")
+        self.assertEqual(self.titles(response), [f"report {i:02}" for i in range(14, 4, -1)])
+        self.assertContains(response, "Page 2")
+        self.assertEqual(self.titles(self.client.get(self.link(response, "next")))[0], "report 04")
+        self.assertEqual(self.titles(self.client.get("/reports/?page=99"))[0], "report 24")
+
+
+
+class HomeStatsTests(TestCase):
+    """Counters are adjusted in place, in the shared cache, and match a recount."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="counter", email="counter@example.com", password_hash="!", role="community")
+        for status in ("pending", "verified", "verified"):
+            Report.objects.create(user=cls.user, title="t", description="d", report_type="cutting", status=status)
+
+    def setUp(self):
+        stats.home_stats()  # prime the counters
+
+    def cached(self):
+        cache = caches[settings.STATS_CACHE]
+        return cache.get(stats.TOTAL_REPORTS), cache.get(stats.VERIFIED_REPORTS)
+
+    def assertCounts(self, total, verified):
+        self.assertEqual(self.cached(), (total, verified))
+        self.assertEqual((Report.objects.count(), Report.objects.filter(status="verified").count()), (total, verified))
+
+    def test_create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Report.objects.create(user=self.user, title="t", description="d", report_type="cutting")
+            Report.objects.create(user=self.user, title="t", description="d", report_type="cutting", status="verified")
+        self.assertCounts(5, 3)
+
+    def test_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Report.objects.filter(status="verified").first().delete()
+            Report.objects.filter(status="pending").first().delete()
+        self.assertCounts(1, 1)
+
+    def test_status_change(self):
+        report = Report.objects.filter(status="verified").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            report.status = "rejected"
+            report.save()
+        self.assertCounts(3, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.title = "edited"  # same status: no change
+            report.save()
+        self.assertCounts(3, 1)
+
+        # The classify_reports path writes with update() and adjusts the counters itself.
+        pending = Report.objects.get(status="pending")
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_prediction(pending, "cutting", "v1")
+        self.assertCounts(3, 2)
+        self.assertEqual(stats.home_stats()["verified_reports"], 2)
+
+    def test_cache_must_be_shared(self):
+        stats.check_settings()
+        with self.settings(STATS_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            stats.check_settings()
+
+
+# ----------------------------
+# Load test harness
+# ----------------------------
+class LoadTestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.seed(users=10, reports=60, rewards=3, images=0, claims=5)
+
+    def test_every_url_has_a_scenario(self):
+        self.assertEqual(loadtest.uncovered_urls(), [])
+
+    def test_run_and_compare(self):
+        results = loadtest.run(["home", "reports_list", "report_detail", "dashboard"], requests=3, concurrency=1)
+        self.assertEqual(set(results), {"home", "reports_list", "report_detail", "dashboard"})
+        for result in results.values():
+            self.assertEqual(result["requests"], 3)
+            self.assertEqual(result["errors"], 0)
+        self.assertGreater(results["report_detail"]["queries_per_request"]["mean"], 0)
+
+        self.assertEqual(loadtest.compare(results, results), [])
+        slower = {"home": dict(results["home"], rps=results["home"]["rps"] / 2)}
+        self.assertEqual(len(loadtest.compare(slower, results)), 1)
+
+
+class SyntheticDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = synthetic.seed(users=20, reports=300, rewards=4, images=0, claims=20, seed=1)
+
+    def test_counts(self):
+        self.assertEqual(synthetic.synthetic_users(seed=1).count(), 20)
+        self.assertEqual(Report.objects.count(), 300)
+        self.assertEqual(UserReward.objects.count(), self.counts["claims"])
+        self.assertGreater(self.counts["claims"], 0)
+
+    def test_report_types_match_the_site(self):
+        self.assertLessEqual(
+            set(Report.objects.values_list("report_type", flat=True)), {value for value, _ in views.REPORT_TYPE_CHOICES},
+        )
+
+    def test_points_match_the_ledger(self):
+        for user in synthetic.synthetic_users(seed=1).select_related("leaderboard"):
+            earned = Report.objects.filter(user=user, status="verified").count() * REPORT_POINTS
+            spent = sum(UserReward.objects.filter(user=user).values_list("reward__points_required", flat=True))
+            self.assertEqual(user.points, earned - spent)
+            self.assertGreaterEqual(user.points, 0)
+            self.assertEqual(user.leaderboard.points, user.points)
+            self.assertEqual(balance(user.pk), user.points)
+
+
+# ----------------------------
+# Page cache
+# ----------------------------
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+        Leaderboard.objects.update_or_create(user=cls.user, defaults={"points": 10})
+        cls.report = Report.objects.create(
+            user=cls.user, title="Felled mangroves", description="near the creek", report_type="cutting",
+        )
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def login(self, user):
+        response = HttpResponse()
+        set_login_cookie(response, user)
+        self.client.cookies["user_id"] = response.cookies["user_id"].value
+
+    def test_hit_reads_only_generations_and_fills_user_nav(self):
+        url = f"/reports/{self.report.pk}/"
+        self.assertGreater(self.client.get(url).profile.query_count, 1)
+        response = self.client.get(url)
+        self.assertEqual(response.profile.query_count, 1)
+        self.assertContains(response, "Sign Up")
+        self.assertEqual(response["Vary"], "Cookie")
+
+        self.login(self.user)
+        response = self.client.get(url)
+        self.assertContains(response, "Logout")
+        self.assertNotContains(response, "Sign Up")
+        self.assertNotContains(response, "<!--uncached:")
+
+    def test_report_changes_invalidate_only_their_pages(self):
+        other = Report.objects.create(user=self.user, title="Plastic waste", description="shore", report_type="dumping")
+        for url in (f"/reports/{self.report.pk}/", f"/reports/{other.pk}/", "/reports/"):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.title = "Replanted mangroves"
+            self.report.save()
+        self.assertContains(self.client.get(f"/reports/{self.report.pk}/"), "Replanted mangroves")
+        self.assertGreater(self.client.get("/reports/").profile.query_count, 0)
+        self.assertEqual(self.client.get(f"/reports/{other.pk}/").profile.query_count, 1)
+
+    def test_recording_thumbnails_invalidates(self):
+        url = f"/reports/{self.report.pk}/"
+        Report.objects.filter(pk=self.report.pk).update(image="reports/ab/abcdef.jpg")
+        self.client.get(url)
+        self.assertEqual(self.client.get(url).profile.query_count, 1)
+        thumbnails.record_thumbnails("reports/ab/abcdef.jpg", [160, 320])
+        self.assertGreater(self.client.get(url).profile.query_count, 1)
+
+    def test_invalidation_from_another_process(self):
+        url = f"/reports/{self.report.pk}/"
+        self.client.get(url)
+        # A management command's bulk write: no signals, and its own cache connections.
+        Report.objects.filter(pk=self.report.pk).update(title="Replanted mangroves")
+        with mock.patch.object(pagecache, "_generation_cache", return_value=caches.create_connection("shared")):
+            pagecache.invalidate_reports()
+        self.assertContains(self.client.get(url), "Replanted mangroves")
+
+    def test_generations_must_be_shared(self):
+        pagecache.check_settings()
+        with self.settings(PAGE_GENERATION_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            pagecache.check_settings()
+
+    def test_conditional_get(self):
+        response = self.client.get("/leaderboard/")
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leaderboard.objects.filter(user=self.user).get().save()
+        response = self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH=etag)
+        self.assertGreater(response.profile.query_count, 0)  # rendered again...
+        self.assertEqual(response.status_code, 304)          # ...but nothing visible changed
+
+        url = f"/reports/{self.report.pk}/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.status = "verified"
+            self.report.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Same page, different user: the nav differs, so must the ETag.
+        etag = self.client.get("/about/")["ETag"]
+        self.login(self.user)
+        self.assertEqual(self.client.get("/about/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+
+class TileCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="mapper", email="mapper@example.com", password_hash="!", role="community")
+
+    def add_reports(self, n):
+        # Bulk writes send no signals, like import_reports and generate_dataset.
+        Report.objects.bulk_create(
+            Report(user=self.user, title="t", description="d", report_type="cutting",
+                   geotag_lat=1.35, geotag_long=103.8, geohash=geo.encode(1.35, 103.8))
+            for _ in range(n)
+        )
+
+    def test_invalidation_from_another_process(self):
+        self.add_reports(2)
+        self.assertEqual(self.client.get("/reports/tiles/0/0/0.json").json()["count"], 2)
+        self.add_reports(3)
+        self.assertEqual(self.client.get("/reports/tiles/0/0/0.json").json()["count"], 2)
+        with mock.patch.object(tiles, "_cache", return_value=caches.create_connection("shared")):
+            tiles.invalidate_all()
+        self.assertEqual(self.client.get("/reports/tiles/0/0/0.json").json()["count"], 5)
+
+    def test_cache_must_be_shared(self):
+        tiles.check_settings()
+        with self.settings(TILE_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            tiles.check_settings()
+
+
+# ----------------------------
+# Rewards
+# ----------------------------
+class RewardCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="claimer", email="claimer@example.com", password_hash="!", role="community")
+        cls.rewards = [Reward.objects.create(title=f"reward {i}", description="", points_required=5) for i in range(30)]
+        Reward.objects.create(title="retired", description="", points_required=5, is_active=False)
+        for reward in cls.rewards[:5]:
+            UserReward.objects.create(user=cls.user, reward=reward)
+
+    def setUp(self):
+        caches["default"].clear()
+        response = HttpResponse()
+        set_login_cookie(response, self.user)
+        self.client.cookies["user_id"] = response.cookies["user_id"].value
+
+    def test_page_queries_do_not_grow_with_the_catalog(self):
+        cold = self.client.get("/rewards/")
+        self.assertLessEqual(len(app_queries(cold.profile)), 4)  # user, points balance, catalog, claims
+        warm = self.client.get("/rewards/")
+        self.assertEqual(len(app_queries(warm.profile)), 1)  # points balance only...
+        self.assertEqual(warm.profile.query_count, 3)        # ...plus shared-cache reads for the user and catalog
+        self.assertContains(warm, "Claimed", count=5)
+        self.assertNotContains(warm, "retired")
+
+    def test_is_claimed_by_reads_the_claims_once_for_the_catalog(self):
+        rewards.claimed_reward_ids(self.user.pk)  # cached
+        with self.assertNumQueries(1):
+            claimed = [r for r in self.rewards if r.is_claimed_by(self.user)]
+        self.assertEqual(claimed, self.rewards[:5])
+
+    def test_claim_from_another_process(self):
+        self.client.get("/rewards/")
+        UserReward.objects.bulk_create([UserReward(user=self.user, reward=self.rewards[5])])  # no signals
+        with mock.patch.object(rewards, "_cache", return_value=caches.create_connection("shared")):
+            rewards.claims_changed(self.user.pk)
+        self.assertContains(self.client.get("/rewards/"), "Claimed", count=6)
+
+    def test_cache_must_be_shared(self):
+        rewards.check_settings()
+        with self.settings(REWARDS_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            rewards.check_settings()
+
+    def test_changes_invalidate(self):
+        self.client.get("/rewards/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Reward.objects.create(title="mangrove sapling", description="", points_required=5)
+            UserReward.objects.create(user=self.user, reward=self.rewards[5])
+        response = self.client.get("/rewards/")
+        self.assertContains(response, "mangrove sapling")
+        self.assertContains(response, "Claimed", count=6)
+
+    def test_claim_needs_enough_points(self):
+        reward = self.rewards[5]
+        self.assertContains(self.client.get("/rewards/"), 'class="reward-btn unaffordable"', count=25)
+        self.assertRedirects(self.client.get(f"/claim/{reward.pk}/"), "/rewards/", fetch_redirect_response=False)
+        self.assertFalse(UserReward.objects.filter(user=self.user, reward=reward).exists())
+        self.assertFalse(PointsEntry.objects.exists())
+
+        award_points(self.user, reward.points_required, "adjustment")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/claim/{reward.pk}/")
+        self.assertTrue(UserReward.objects.filter(user=self.user, reward=reward).exists())
+        self.assertEqual(balance(self.user.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/claim/{self.rewards[6].pk}/")
+        self.assertFalse(UserReward.objects.filter(user=self.user, reward=self.rewards[6]).exists())
+
+
+# ----------------------------
+# Search
+# ----------------------------
+class SearchChecks:
+    """Shared by the per-backend search tests; each skips unless its backend is active."""
+
+    BACKEND = None
+
+    def setUp(self):
+        if search.backend() != self.BACKEND:
+            self.skipTest(f"search backend is {search.backend()}, not {self.BACKEND}")
+        user = User.objects.create(name="searcher", email="searcher@example.com", password_hash="!", role="community")
+        self.felled = Report.objects.create(
+            user=user, title="Felled mangroves", description="trees cut near the creek", report_type="cutting",
+        )
+        self.dumped = Report.objects.create(
+            user=user, title="Plastic waste", description="dumped among felled mangroves", report_type="dumping",
+        )
+        self.other = Report.objects.create(user=user, title="Storm", description="roots exposed", report_type="damage")
+
+    def found(self, text):
+        return list(search.search_reports(Report.objects.all(), text))
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(set(self.found("felled mangroves")), {self.felled, self.dumped})
+        self.assertEqual(self.found("plastic mangroves"), [self.dumped])
+        self.assertEqual(self.found("plastic storm"), [])
+
+    def test_prefixes_match(self):
+        self.assertEqual(self.found("mangr felle"), self.found("mangroves felled"))
+        self.assertEqual(self.found("dump"), [self.dumped])
+
+    def test_ranked_and_combinable_with_filters(self):
+        results = self.found("felled")
+        self.assertTrue(all(hasattr(r, "search_rank") for r in results))
+        ranked = search.search_reports(Report.objects.filter(report_type="cutting"), "mangroves")
+        self.assertEqual(list(ranked), [self.felled])
+        self.assertEqual(search.search_reports(Report.objects.all(), "mangroves").count(), 2)
+
+    def test_index_follows_edits(self):
+        self.other.title = "Storm damage to mangroves"
+        self.other.save()
+        self.assertIn(self.other, self.found("mangroves"))
+        self.felled.delete()
+        self.assertNotIn(self.felled.pk, [r.pk for r in self.found("mangroves")])
+
+
+class SQLiteSearchTests(SearchChecks, TestCase):
+    BACKEND = "sqlite"
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.found("felled"), [self.felled, self.dumped])
+
+
+class MySQLSearchTests(SearchChecks, TransactionTestCase):
+    # InnoDB only applies FULLTEXT changes on commit, so these can't run inside a test transaction.
+    BACKEND = "mysql"
+
+
+# ----------------------------
+# Report submission
+# ----------------------------
+class SubmitReportTests(TestCase):
+    """Staged uploads never outlive the request, whatever the outcome."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+
+    def post(self, client=None, **fields):
+        client = client or self.client
+        response = HttpResponse()
+        set_login_cookie(response, self.user)
+        client.cookies["user_id"] = response.cookies["user_id"].value
+        image = io.BytesIO()
+        Image.new("RGB", (8, 8), "green").save(image, "PNG")
+        data = {"image": SimpleUploadedFile("photo.png", image.getvalue(), "image/png"), **fields}
+        return client.post("/submit-report/", data)
+
+    def staged(self):
+        staging = os.path.join(self.media, STAGING_DIR)
+        return os.listdir(staging) if os.path.isdir(staging) else []
+
+    def test_missing_fields_show_the_form(self):
+        response = self.post(title="Felled mangroves")
+        self.assertContains(response, "Please give the report", status_code=400)
+        self.assertFalse(Report.objects.exists())
+        self.assertEqual(self.staged(), [])
+
+    def test_csrf_failure_discards_the_upload(self):
+        response = self.post(Client(enforce_csrf_checks=True), title="t", description="d", report_type="cutting")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.staged(), [])
+
+    def test_submit(self):
+        response = self.post(title="Felled mangroves", description="near the creek", report_type="cutting")
+        self.assertRedirects(response, "/reports/", fetch_redirect_response=False)
+        report = Report.objects.get()
+        self.assertTrue(os.path.exists(os.path.join(self.media, report.image.name)))
+        self.assertEqual(self.staged(), [])
+
+    def test_malformed_content_length_is_rejected(self):
+        response = self.client.post("/submit-report/", b"", content_type="image/png", CONTENT_LENGTH="ten")
+        self.assertEqual(response.status_code, 400)
+
+    def upload(self, handler, data):
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("image", "photo.png", "image/png", len(data))
+        handler.receive_data_chunk(data, 0)
+        return handler.file_complete(len(data))
+
+    def test_staged_files_are_closed(self):
+        image = io.BytesIO()
+        Image.new("RGB", (8, 8), "green").save(image, "PNG")
+        handler = ReportUploadHandler()
+        stored = self.upload(handler, image.getvalue())
+        left = self.upload(handler, image.getvalue() + b"\0")
+        self.assertEqual(len(self.staged()), 2)
+
+        store_upload(stored)  # moved into place; its read handle stays open
+        self.assertFalse(stored.closed)
+        handler.upload_interrupted()
+        self.assertTrue(stored.closed)
+        self.assertTrue(left.closed)
+        handler.discard_staged()
+        self.assertEqual(self.staged(), [])
+        handler.discard_staged()
+        self.assertEqual(self.staged(), [])
+
+
+class DedupTests(TestCase):
+    """Identical photos share one blob; near-identical ones are found through the dHash bands."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="reporter", email="reporter@example.com", password_hash="!", role="community")
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.photo = synthetic.jpeg_bytes(random.Random(3))
+
+    def store(self, data, name="photo.jpg"):
+        return store_upload(ContentFile(data, name=name))
+
+    def report(self, blob):
+        return Report.objects.create(
+            user=self.user, title="t", description="d", report_type="cutting", image=blob.file.name, image_blob=blob,
+        )
+
+    def test_identical_upload_reuses_the_blob(self):
+        blob, created = self.store(self.photo)
+        again, created_again = self.store(self.photo, name="copy.jpg")
+        self.assertEqual((created, created_again), (True, False))
+        self.assertEqual(again.pk, blob.pk)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertEqual(len(os.listdir(os.path.dirname(os.path.join(self.media, blob.file.name)))), 1)
+
+    def test_altered_copy_is_a_near_duplicate(self):
+        original = self.report(self.store(self.photo)[0])
+        with Image.open(io.BytesIO(self.photo)) as img:
+            out = io.BytesIO()
+            img.resize((288, 216)).save(out, "JPEG", quality=60)
+        altered, created = self.store(out.getvalue())
+
+        self.assertTrue(created)
+        distance = dedup.hamming(int(altered.phash, 16), int(original.image_blob.phash, 16))
+        self.assertTrue(0 < distance <= dedup.NEAR_DUPLICATE_DISTANCE)
+        self.assertEqual(dedup.find_near_duplicate(altered), original)
+
+    def test_unrelated_photo_is_not_matched(self):
+        self.report(self.store(self.photo)[0])
+        other, _ = self.store(synthetic.jpeg_bytes(random.Random(103)))
+        self.assertIsNone(dedup.find_near_duplicate(other))
+
+
+# ----------------------------
+# Leaderboard ranking
+# ----------------------------
+class IndexableSkipListTests(SimpleTestCase):
+    """Checked against a sorted list doing the same operations."""
+
+    def assertMatches(self, ranking, oracle):
+        self.assertEqual(len(ranking), len(oracle))
+        self.assertEqual(list(ranking), oracle)
+        for i, key in enumerate(oracle):
+            self.assertEqual(ranking.index(key), i)
+            self.assertEqual(ranking[i], key)
+
+    def test_against_sorted_list(self):
+        rng = random.Random(8)
+        ranking, oracle = IndexableSkipList(), []
+        for step in range(3000):
+            if oracle and rng.random() < 0.4:
+                key = oracle.pop(rng.randrange(len(oracle)))
+                ranking.remove(key)
+            else:
+                key = (-rng.randrange(200), rng.randrange(10_000))  # (-points, user_id), with ties on points
+                if key in oracle:
+                    continue
+                ranking.insert(key)
+                bisect.insort(oracle, key)
+            if step % 300 == 0:
+                self.assertMatches(ranking, oracle)
+        self.assertMatches(ranking, oracle)
+        # Ranges by position, as top(n) reads them.
+        for start in range(0, len(oracle), 37):
+            self.assertEqual([ranking[i] for i in range(start, min(start + 10, len(oracle)))], oracle[start:start + 10])
+
+    def test_missing_keys(self):
+        ranking = IndexableSkipList()
+        ranking.insert((-5, 1))
+        with self.assertRaises(KeyError):
+            ranking.remove((-5, 2))
+        with self.assertRaises(KeyError):
+            ranking.index((-4, 1))
+        with self.assertRaises(IndexError):
+            ranking[1]
+        ranking.remove((-5, 1))
+        self.assertEqual((len(ranking), list(ranking)), (0, []))
+
+
+class LeaderboardEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(name=f"u{i}", email=f"u{i}@example.com", password_hash="!", role="community")
+            for i in range(5)
+        ]
+        for i, user in enumerate(cls.users):
+            Leaderboard.objects.update_or_create(user=user, defaults={"points": [30, 10, 30, 50, 0][i]})
+
+    def setUp(self):
+        self.engine = LeaderboardEngine()
+        self.engine.rebuild()
+
+    def ids(self, *indexes):
+        return [self.users[i].pk for i in indexes]
+
+    def test_rebuild_ranks_by_points_then_user(self):
+        self.assertEqual([user_id for user_id, _, _ in self.engine.top(5)], self.ids(3, 0, 2, 1, 4))
+        self.assertEqual(self.engine.top(2), [(self.users[3].pk, 50, 1), (self.users[0].pk, 30, 2)])
+        self.assertEqual(self.engine.rank_of(self.users[2].pk), 3)
+        self.assertIsNone(self.engine.rank_of(-1))
+
+    def test_rebuild_includes_pending_ledger_entries(self):
+        award_points(self.users[4], 100, "adjustment")
+        self.engine.rebuild()
+        self.assertEqual(self.engine.top(1), [(self.users[4].pk, 100, 1)])
+
+    def test_update_and_remove(self):
+        self.engine.update(self.users[1].pk, 40)
+        self.assertEqual([user_id for user_id, _, _ in self.engine.top(5)], self.ids(3, 1, 0, 2, 4))
+        self.engine.update(self.users[1].pk, 40)  # unchanged
+        self.assertEqual(len(self.engine), 5)
+        self.engine.remove(self.users[3].pk)
+        self.engine.remove(self.users[3].pk)  # already gone
+        self.assertEqual(len(self.engine), 4)
+        self.assertEqual(self.engine.rank_of(self.users[1].pk), 1)
+        self.assertIsNone(self.engine.rank_of(self.users[3].pk))
+
+
+# ----------------------------
+# Login cookie
+# ----------------------------
+class LoginCookieTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="walker", email="walker@example.com", password_hash="!", role="community")
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def cookie(self, user):
+        response = HttpResponse()
+        set_login_cookie(response, user)
+        return response.cookies[USER_COOKIE].value
+
+    def resolve(self, cookie):
+        request = RequestFactory().get("/")
+        if cookie is not None:
+            request.COOKIES[USER_COOKIE] = cookie
+        CurrentUserMiddleware(lambda request: HttpResponse())(request)
+        return request.logged_user
+
+    def test_valid_cookie_resolves_from_the_cache(self):
+        cookie = self.cookie(self.user)
+        self.assertEqual(self.resolve(cookie), self.user)
+        with CaptureQueriesContext(connection) as queries:
+            user = self.resolve(cookie)
+        self.assertEqual(user.name, "walker")
+        self.assertEqual([q["sql"] for q in queries if SHARED_CACHE_TABLE not in q["sql"]], [])
+
+    def test_tampered_cookies_are_ignored(self):
+        cookie = self.cookie(self.user)
+        signature = cookie.split(":", 1)[1]
+        other = User.objects.create(name="other", email="other@example.com", password_hash="!", role="community")
+        self.assertIsNone(self.resolve(f"{other.pk}:{signature}"))
+        self.assertIsNone(self.resolve(cookie[:-1] + ("A" if cookie[-1] != "A" else "B")))
+        self.assertIsNone(self.resolve(str(self.user.pk)))  # unsigned
+        self.assertIsNone(self.resolve(None))
+
+    def test_expired_cookie_is_ignored(self):
+        issued = time.time() - session_max_age() - 60
+        with mock.patch("django.core.signing.time.time", return_value=issued):
+            cookie = self.cookie(self.user)
+        self.assertIsNone(self.resolve(cookie))
+
+    def test_user_save_invalidates_the_cache(self):
+        cookie = self.cookie(self.user)
+        self.resolve(cookie)
+        user = User.objects.get(pk=self.user.pk)
+        user.name = "renamed"
+        user.save()
+        self.assertEqual(self.resolve(cookie).name, "renamed")
+        user.delete()
+        self.assertIsNone(self.resolve(cookie))
+
+    def test_compaction_in_another_process_invalidates_the_cache(self):
+        cookie = self.cookie(self.user)
+        self.assertEqual(self.resolve(cookie).points, 0)
+        award_points(self.user, REPORT_POINTS, "report")
+        # The classify worker compacts the ledger; its invalidation must reach the web workers.
+        with mock.patch.object(middleware, "_cache", return_value=caches.create_connection("shared")), \
+                self.captureOnCommitCallbacks(execute=True):
+            compact_points()
+        self.assertEqual(self.resolve(cookie).points, REPORT_POINTS)
+
+    def test_cache_must_be_shared(self):
+        middleware.check_settings()
+        with self.settings(USER_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            middleware.check_settings()
+
+
+# ----------------------------
+# Points ledger
+# ----------------------------
+class PointsLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="ledger", email="ledger@example.com", password_hash="!", role="community")
+        User.objects.filter(pk=cls.user.pk).update(points=5)
+        Leaderboard.objects.update_or_create(user=cls.user, defaults={"points": 5})
+        cls.reward = Reward.objects.create(title="seedlings", description="", points_required=3)
+
+    def test_balance_includes_uncompacted_entries(self):
+        award_points(self.user, REPORT_POINTS, "report")
+        award_points(self.user, -3, "reward", reward=self.reward)
+        self.assertEqual(balance(self.user.pk), 5 + REPORT_POINTS - 3)
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, 5)
+        self.assertIsNone(balance(-1))
+
+    def test_compaction_folds_once(self):
+        award_points(self.user, REPORT_POINTS, "report")
+        award_points(self.user, -3, "reward", reward=self.reward)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(compact_points(), 2)
+        self.assertEqual(compact_points(), 0)
+
+        expected = 5 + REPORT_POINTS - 3
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, expected)
+        self.assertEqual(Leaderboard.objects.get(user=self.user).points, expected)
+        self.assertEqual(balance(self.user.pk), expected)
+        self.assertFalse(PointsEntry.objects.filter(compaction_batch__isnull=True).exists())
+
+        # Later entries are pending again and fold on top.
+        award_points(self.user, REPORT_POINTS, "report")
+        self.assertEqual(balance(self.user.pk), expected + REPORT_POINTS)
+        self.assertEqual(compact_points(), 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, expected + REPORT_POINTS)
+
+    def test_failed_claim_rolls_back_the_spend(self):
+        UserReward.objects.create(user=self.user, reward=self.reward)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                award_points(self.user, -self.reward.points_required, "reward", reward=self.reward)
+                UserReward.objects.create(user=self.user, reward=self.reward)  # already claimed
+        self.assertEqual(callbacks, [])  # the leaderboard never saw the spend
+        self.assertFalse(PointsEntry.objects.exists())
+        self.assertEqual(balance(self.user.pk), 5)
+
+
+# ----------------------------
+# Geo queries
+# ----------------------------
+class GeoQueryTests(TestCase):
+    """Geohash-backed queries agree with a brute-force scan, including across the antimeridian."""
+
+    POINTS = [(0, 179.9), (0, -179.9), (0.5, 179.5), (-0.8, -179.2), (10, 179.95), (0, 0), (0.05, 179.97)]
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(name="mapper", email="mapper@example.com", password_hash="!", role="community")
+        rng = random.Random(14)
+        points = cls.POINTS + [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(80)]
+        points += [(rng.gauss(0, 1), 180 - abs(rng.gauss(0, 1)) if i % 2 else -180 + abs(rng.gauss(0, 1))) for i in range(40)]
+        for lat, lng in points:
+            Report.objects.create(
+                user=user, title="t", description="d", report_type="cutting", geotag_lat=lat, geotag_long=lng,
+            )
+        cls.points = {
+            pk: (lat, lng) for pk, lat, lng in Report.objects.values_list("report_id", "geotag_lat", "geotag_long")
+        }
+
+    def rows(self):
+        return Report.objects.values("report_id", "geotag_lat", "geotag_long")
+
+    def by_distance(self, lat, lng):
+        return sorted(self.points, key=lambda pk: (geo.haversine_km(lat, lng, *self.points[pk]), pk))
+
+    def test_bbox_across_the_antimeridian(self):
+        found = set(geo.in_bbox(Report.objects.all(), -1, 179, 1, -179).values_list("report_id", flat=True))
+        expected = {pk for pk, (lat, lng) in self.points.items() if -1 <= lat <= 1 and (lng >= 179 or lng <= -179)}
+        self.assertEqual(found, expected)
+        self.assertLessEqual({(0, 179.9), (0, -179.9), (0.5, 179.5), (-0.8, -179.2)}, {self.points[pk] for pk in found})
+
+    def test_radius_across_the_antimeridian(self):
+        for lat, lng in ((0, 179.95), (0, -179.99), (0.3, 180), (-0.5, -180)):
+            with self.subTest(lat=lat, lng=lng):
+                rows = geo.within_radius(self.rows(), lat, lng, 60)
+                expected = [pk for pk in self.by_distance(lat, lng) if geo.haversine_km(lat, lng, *self.points[pk]) <= 60]
+                self.assertEqual([row["report_id"] for row in rows], expected)
+                distances = [row["distance_km"] for row in rows]
+                self.assertEqual(distances, sorted(distances))
+                self.assertTrue(any(self.points[pk][1] > 0 for pk in expected))
+                self.assertTrue(any(self.points[pk][1] < 0 for pk in expected))
+
+    def test_nearest_ordering(self):
+        for lat, lng, k in ((0, -179.99, 3), (0, 179.99, 10), (30, 40, 5), (0, 0, 1), (-55, 120, 20)):
+            with self.subTest(lat=lat, lng=lng, k=k):
+                rows = geo.nearest(self.rows(), lat, lng, k)
+                self.assertEqual([row["report_id"] for row in rows], self.by_distance(lat, lng)[:k])
+
+    def test_nearest_returns_everything_when_k_is_large(self):
+        self.assertEqual(len(geo.nearest(self.rows(), 0, 0, len(self.points) + 5)), len(self.points))
+
+
+# ----------------------------
+# Bulk import
+# ----------------------------
+class ImportRowTests(TestCase):
+    """Unreadable rows are skipped and reported by line; the rest import."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="importer", email="importer@example.com", password_hash="x", role="community")
+
+    def run_import(self, text, fmt):
+        return bulk.import_reports(bulk.read_rows(io.StringIO(text), fmt), self.user, classify=False)
+
+    def test_csv(self):
+        text = (
+            "title,description,report_type,timestamp\n"
+            "cut,trees felled,logging,2024-03-01T10:00:00+00:00\n"
+            "extra,too,many,fields,here\n"
+            "dumped,,waste,\n"
+            "burnt,fire seen,fire,\n"
+        )
+        created, errors = self.run_import(text, "csv")
+        self.assertEqual(created, 2)
+        self.assertEqual([line for line, _ in errors], [3, 4])
+        self.assertEqual(Report.objects.get(title="cut").timestamp.year, 2024)
+
+    def test_ndjson(self):
+        text = (
+            '{"title": "cut", "description": "trees felled", "report_type": "logging"}\n'
+            '{"title": "broken", \n'
+            "[1, 2]\n"
+            "\n"
+            '{"title": "burnt", "description": "fire seen", "report_type": "fire"}\n'
+        )
+        created, errors = self.run_import(text, "ndjson")
+        self.assertEqual(created, 2)
+        self.assertEqual([line for line, _ in errors], [2, 3])
+        self.assertIn("invalid JSON", errors[0][1])
+
+    def test_geojson(self):
+        text = """{"type": "FeatureCollection", "features": [
+            {"properties": {"title": "cut", "description": "trees felled", "report_type": "logging"},
+             "geometry": {"type": "Point", "coordinates": [103.8, 1.35]}},
+            "not a feature",
+            {"properties": {"title": "odd", "description": "d", "report_type": "x"}, "geometry": {"coordinates": 5}},
+            {"properties": [1, 2]}
+        ]}"""
+        created, errors = self.run_import(text, "geojson")
+        self.assertEqual(created, 1)
+        self.assertEqual([line for line, _ in errors], [2, 3, 4])
+        self.assertAlmostEqual(Report.objects.get(title="cut").geotag_lat, 1.35)
+
+    def test_mistyped_fields_are_row_errors(self):
+        rows = [
+            {"title": "cut", "description": "trees felled", "report_type": "logging", "geotag_lat": "1.35", "geotag_long": 103.8},
+            {"title": 42, "description": "d", "report_type": "logging"},
+            {"title": "t", "description": ["d"], "report_type": "logging"},
+            {"title": "t", "description": "d", "report_type": "logging", "geotag_lat": "north", "geotag_long": 103.8},
+            {"title": "t", "description": "d", "report_type": "logging", "geotag_lat": {"deg": 1}, "geotag_long": 103.8},
+            {"title": "t", "description": "d", "report_type": "logging", "status": ["pending"]},
+            {"title": "blank", "description": "no geotag", "report_type": "logging", "geotag_lat": "", "geotag_long": ""},
+        ]
+        created, errors = bulk.import_reports(enumerate(rows, 1), self.user, classify=False)
+        self.assertEqual(created, 2)
+        self.assertEqual([line for line, _ in errors], [2, 3, 4, 5, 6])
+        self.assertIn("title must be text", errors[0][1])
+        self.assertIn("bad geotag_lat 'north'", errors[2][1])
+        self.assertAlmostEqual(Report.objects.get(title="cut").geotag_lat, 1.35)
+        self.assertIsNone(Report.objects.get(title="blank").geotag_lat)
+
+    def test_unparseable_geojson_fails_before_writing(self):
+        with self.assertRaises(ValueError):
+            self.run_import('{"features": [', "geojson")
+        self.assertFalse(Report.objects.exists())
@@ -0,0 +1,85 @@
+# webapp/thumbnails.py
+"""
+Responsive derivatives of report photos.
+
+Each original `reports/ab/<sha>.jpg` gets `reports/ab/<sha>.w320.webp`,
+`reports/ab/<sha>.w320.jpg`, ... next to it. The widths that exist are
+recorded on `Report.thumbnail_widths` so templates can build `srcset`
+without touching the filesystem.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import pagecache
+from .models import Report
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (160, 320, 640, 1024)
+THUMBNAIL_FORMATS = (("webp", "WEBP"), ("jpg", "JPEG"))
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_widths():
+    return tuple(getattr(settings, "REPORT_THUMBNAIL_WIDTHS", THUMBNAIL_WIDTHS))
+
+
+def derivative_name(image_name, width, ext):
+    stem = os.path.splitext(image_name)[0]
+    return f"{stem}.w{width}.{ext}"
+
+
+def render_derivatives(source_path, widths, quality=THUMBNAIL_QUALITY):
+    """
+    Write WebP and JPEG copies of `source_path` at each width narrower
+    than the original. Pure Pillow so it can run in a process pool.
+    Returns the widths that now exist on disk.
+    """
+    done = []
+    with Image.open(source_path) as img:
+        # Decode at the largest needed size only (JPEG draft mode).
+        largest = max(widths)
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for width in sorted(widths, reverse=True):
+            if width >= img.width:
+                continue
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            for ext, fmt in THUMBNAIL_FORMATS:
+                target = derivative_name(source_path, width, ext)
+                if os.path.exists(target):
+                    continue
+                tmp = f"{target}.{os.getpid()}.tmp"
+                resized.save(tmp, fmt, quality=quality, optimize=True)
+                os.replace(tmp, target)
+            done.append(width)
+    return sorted(done)
+
+
+def generate_thumbnails(image_name):
+    """Create derivatives for a stored report image and record them on its reports."""
+    widths = render_derivatives(default_storage.path(image_name), thumbnail_widths())
+    record_thumbnails(image_name, widths)
+    return widths
+
+
+def record_thumbnails(image_name, widths):
+    # Content-addressed images can be shared by several reports.
+    report_ids = list(Report.objects.filter(image=image_name).values_list("report_id", flat=True))
+    if report_ids:
+        # update() sends no signals; the cached pages still have the old srcset.
+        Report.objects.filter(report_id__in=report_ids).update(
+            thumbnail_widths=",".join(str(w) for w in widths),
+        )
+        pagecache.invalidate_report(*report_ids)
+
+
+def srcset(image_name, widths, ext):
+    return ", ".join(
+        f"{default_storage.url(derivative_name(image_name, w, ext))} {w}w" for w in widths
+    )
@@ -0,0 +1,146 @@
+# webapp/tiles.py
+"""
+Report clusters per web-map tile (XYZ / slippy-map numbering).
+
+A tile's reports are grouped in SQL by a geohash prefix about an eighth
+of the tile wide, giving at most a few dozen clusters per tile with
+counts by status and report_type and a centroid. Results are cached per
+tile; saving or deleting a geotagged report drops the cached tile
+containing it at every zoom level, and bulk writes bump a generation
+number that retires every tile. A map view costs two cache reads per
+tile regardless of how many reports there are.
+
+Invalidations come from management commands as well as web requests,
+so TILE_CACHE must be shared by every process (check_settings() refuses
+a per-process one at startup). Like page generations, the generation
+starts from the clock so one lost from the cache is never reused.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Sum
+from django.db.models.functions import Substr
+
+from .geo import GEOHASH_PRECISION, cell_size, in_bbox
+from .models import Report
+
+MAX_ZOOM = 20
+CELLS_PER_TILE = 8          # clusters are about 1/8 of a tile wide
+MAX_LATITUDE = 85.05112878  # web mercator limit
+TILE_TTL = 24 * 60 * 60
+GENERATION_KEY = "tiles:generation"
+
+
+def _cache():
+    return caches[getattr(settings, "TILE_CACHE", "shared")]
+
+
+def _key(z, x, y, generation):
+    return f"tiles:{generation}:{z}:{x}:{y}"
+
+
+def _generation():
+    generation = _cache().get(GENERATION_KEY)
+    if generation is None:
+        generation = time.time_ns()
+        _cache().set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def check_settings():
+    """Called at startup (WebappConfig.ready)."""
+    from .pagecache import require_shared
+
+    require_shared(getattr(settings, "TILE_CACHE", "shared"), "TILE_CACHE")
+
+
+# ----------------------------
+# Tile geometry
+# ----------------------------
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of tile z/x/y."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def tile_for(lat, lng, z):
+    n = 2 ** z
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(n - 1, max(0, x)), min(n - 1, max(0, y))
+
+
+def cluster_precision(z):
+    """Longest geohash prefix whose cells are at least 1/CELLS_PER_TILE of a tile wide."""
+    target = 360 / 2 ** z / CELLS_PER_TILE
+    precision = 1
+    while precision < GEOHASH_PRECISION and cell_size(precision + 1)[1] >= target:
+        precision += 1
+    return precision
+
+
+# ----------------------------
+# Clusters
+# ----------------------------
+def compute_tile(z, x, y):
+    south, west, north, east = tile_bounds(z, x, y)
+    precision = cluster_precision(z)
+    rows = (
+        in_bbox(Report.objects.filter(geohash__isnull=False), south, west, north, east)
+        .annotate(cell=Substr("geohash", 1, precision))
+        .values("cell", "status", "report_type")
+        .annotate(count=Count("report_id"), lat_sum=Sum("geotag_lat"), lng_sum=Sum("geotag_long"))
+    )
+    clusters = {}
+    for row in rows:
+        cluster = clusters.setdefault(
+            row["cell"], {"geohash": row["cell"], "count": 0, "lat": 0.0, "lng": 0.0, "status": {}, "report_type": {}},
+        )
+        cluster["count"] += row["count"]
+        cluster["lat"] += row["lat_sum"]
+        cluster["lng"] += row["lng_sum"]
+        cluster["status"][row["status"]] = cluster["status"].get(row["status"], 0) + row["count"]
+        cluster["report_type"][row["report_type"]] = cluster["report_type"].get(row["report_type"], 0) + row["count"]
+    for cluster in clusters.values():
+        cluster["lat"] = round(cluster["lat"] / cluster["count"], 6)
+        cluster["lng"] = round(cluster["lng"] / cluster["count"], 6)
+    return {
+        "z": z, "x": x, "y": y,
+        "count": sum(c["count"] for c in clusters.values()),
+        "clusters": sorted(clusters.values(), key=lambda c: c["geohash"]),
+    }
+
+
+def get_tile(z, x, y):
+    key = _key(z, x, y, _generation())
+    tile = _cache().get(key)
+    if tile is None:
+        tile = compute_tile(z, x, y)
+        _cache().set(key, tile, getattr(settings, "TILE_TTL", TILE_TTL))
+    return tile
+
+
+# ----------------------------
+# Invalidation
+# ----------------------------
+def invalidate_point(lat, lng):
+    """Drop every cached tile containing (lat, lng)."""
+    if lat is None or lng is None:
+        return
+    generation = _generation()
+    _cache().delete_many([_key(z, *tile_for(lat, lng, z), generation) for z in range(MAX_ZOOM + 1)])
+
+
+def invalidate_all():
+    """Orphan every cached tile at once (e.g. after a bulk import); they expire with TILE_TTL."""
+    try:
+        _cache().incr(GENERATION_KEY)
+    except ValueError:
+        _cache().set(GENERATION_KEY, time.time_ns(), None)
@@ -0,0 +1,179 @@
+# webapp/uploads.py
+"""
+Streaming upload handler for report photos.
+
+Chunks are written once, straight into a staging file under
+MEDIA_ROOT/reports/, while being hashed and size-checked. The finished
+file is later renamed (not copied) to its content-addressed name by
+`dedup.store_upload`. Whatever is still staged when the view returns
+(a rejected form, a CSRF failure, an exception) is removed by
+`ReportUploadHandler.discard_staged`.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+from django.template.defaultfilters import filesizeformat
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+STAGING_DIR = os.path.join("reports", ".incoming")
+
+# (magic bytes, offset, content type, extension)
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", 0, "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png", ".png"),
+    (b"GIF87a", 0, "image/gif", ".gif"),
+    (b"GIF89a", 0, "image/gif", ".gif"),
+    (b"WEBP", 8, "image/webp", ".webp"),
+]
+SNIFF_BYTES = 12
+
+
+def max_upload_bytes():
+    return getattr(settings, "REPORT_UPLOAD_MAX_BYTES", MAX_UPLOAD_BYTES)
+
+
+def too_large_message(max_bytes=None):
+    return f"Image is larger than the {filesizeformat(max_bytes or max_upload_bytes())} limit."
+
+
+def sniff_image(header):
+    """Return (content_type, extension) for a known image header, else None."""
+    for magic, offset, content_type, ext in IMAGE_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            if content_type == "image/webp" and header[:4] != b"RIFF":
+                continue
+            return content_type, ext
+    return None
+
+
+class StagedUploadedFile(UploadedFile):
+    """An upload already on disk inside MEDIA_ROOT, with its SHA-256 computed."""
+
+    def __init__(self, path, name, content_type, size, sha256, charset=None, content_type_extra=None):
+        super().__init__(open(path, "rb"), name, content_type, size, charset, content_type_extra)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        # FileSystemStorage moves files that expose this instead of copying them.
+        return self.path
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ReportUploadHandler(FileUploadHandler):
+    """
+    Write each file chunk exactly once, hash it on the fly, and stop
+    reading the request as soon as it is too large or not an image.
+    Rejections are reported on `request.upload_error`.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or max_upload_bytes()
+        self._out = None
+        self.path = None
+        self.staged = []
+        self.files = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if content_length is not None and content_length > self.max_bytes:
+            self._reject(too_large_message(self.max_bytes))
+
+        staging = os.path.join(settings.MEDIA_ROOT, STAGING_DIR)
+        os.makedirs(staging, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=staging, suffix=".upload")
+        self.staged.append(self.path)
+        self._out = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.header = b""
+        self.sniffed = None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self._reject(too_large_message(self.max_bytes))
+
+        if self.sniffed is None:
+            self.header += raw_data[:SNIFF_BYTES - len(self.header)]
+            if len(self.header) >= SNIFF_BYTES:
+                self.sniffed = sniff_image(self.header)
+                if self.sniffed is None:
+                    self._reject("Uploaded file is not a JPEG, PNG, GIF or WebP image.")
+
+        self.digest.update(raw_data)
+        self._out.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self._out.close()
+        if self.sniffed is None:
+            self.sniffed = sniff_image(self.header)
+        if self.sniffed is None:
+            self._remove_staged()
+            self._set_error("Uploaded file is not a JPEG, PNG, GIF or WebP image.")
+            return None
+
+        content_type, ext = self.sniffed
+        stem = os.path.splitext(self.file_name or "upload")[0]
+        staged = StagedUploadedFile(
+            self.path, f"{stem}{ext}", content_type, file_size, self.digest.hexdigest(),
+            self.charset, self.content_type_extra,
+        )
+        self.files.append(staged)
+        self._out = None
+        return staged
+
+    def upload_interrupted(self):
+        self._remove_staged()
+        self._close_files()
+
+    def discard_staged(self):
+        """
+        Close every file handed to the view and remove any staged file
+        store_upload didn't move into place.
+        """
+        self._remove_staged()
+        self._close_files()
+        for path in self.staged:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.staged = []
+
+    def _set_error(self, message):
+        if self.request is not None:
+            self.request.upload_error = message
+
+    def _close_files(self):
+        # A moved file's read handle still points at the renamed inode.
+        for staged in self.files:
+            staged.close()
+        self.files = []
+
+    def _remove_staged(self):
+        if self._out is not None and not self._out.closed:
+            self._out.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.path = None
+
+    def _reject(self, message):
+        self._remove_staged()
+        self._set_error(message)
+        # connection_reset: do not drain the rest of the body.
+        raise StopUpload(connection_reset=True)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import profiling, views
 
 urlpatterns = [
     path('', views.home_view, name='home'),
@@ -10,6 +10,9 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('reports/', views.reports_list, name='reports_list'),
     path('reports/<int:report_id>/', views.report_detail, name='report_detail'),
+    path('reports/geo/', views.reports_geo, name='reports_geo'),
+    path('reports/export.<str:fmt>', views.export_reports_view, name='export_reports'),
+    path('reports/tiles/<int:z>/<int:x>/<int:y>.json', views.report_tile, name='report_tile'),
      path('claim/<int:reward_id>/', views.claim_reward, name='claim_reward'),
     path('leaderboard/', views.leaderboard_view, name='leaderboard'),
     path("password-reset/", views.password_reset_view, name="password_reset"),
@@ -19,4 +22,8 @@ urlpatterns = [
 
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
+
+    path('ml/metrics/', views.ml_metrics_view, name='ml_metrics'),
+    path('ml/jobs/', views.classification_jobs_view, name='classification_jobs'),
+    path('metrics/', profiling.metrics_view, name='metrics'),
 ]
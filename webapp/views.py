@@ -3,52 +3,33 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
 from .models import User, UserProfile, Report, Leaderboard, Reward, UserReward
-from decimal import Decimal
 from django.urls import path
 from . import views
 
 
 
 # ----------------------------
-# Helper: get current user from cookie
+# Helper: get current user (resolved once per request by CurrentUserMiddleware)
 # ----------------------------
 def get_current_user(request):
-    user_id = request.COOKIES.get('user_id')
-    if user_id:
-        try:
-            return User.objects.get(user_id=user_id)
-        except User.DoesNotExist:
-            return None
-    return None
+    return getattr(request, 'logged_user', None)
+
+
+get_logged_user = get_current_user
 
 # ----------------------------
 # Home Page
 from django.shortcuts import render
 from .models import User, Report, Leaderboard
+from .stats import home_stats
 
 def home_view(request):
-    # Get user from cookie
-    user_id = request.COOKIES.get("user_id")  # cookie set during login
-    logged_user = None
-    if user_id:
-        try:
-            logged_user = User.objects.get(user_id=user_id)
-        except User.DoesNotExist:
-            logged_user = None
+    logged_user = get_current_user(request)
 
-    # Reports data
-    recent_reports = Report.objects.filter(status='verified').order_by('-timestamp')[:5]
-    total_reports = Report.objects.count()
-    verified_reports = Report.objects.filter(status='verified').count()
-    top_contributors = Leaderboard.objects.order_by('-points')[:3]
-
-    # ✅ Pass logged_user to template
+    # Reports data (cached counters and top-N lists, see stats.py)
     context = {
         "logged_user": logged_user,
-        "recent_reports": recent_reports,
-        "total_reports": total_reports,
-        "verified_reports": verified_reports,
-        "top_contributors": top_contributors,
+        **home_stats(),
     }
 
     return render(request, "webapp/home.html", context)
@@ -59,6 +40,7 @@ from django.contrib import messages
 from django.db.models import Q
 from django.contrib.auth.hashers import check_password
 from .models import User  # Make sure this is your custom User model
+from .middleware import set_login_cookie
 
 def login_view(request):
     if request.method == "POST":
@@ -76,7 +58,7 @@ def login_view(request):
             # Check hashed password
             if check_password(password, user.password_hash):
                 response = redirect("home")  # Redirect to home page
-                response.set_cookie("user_id", user.user_id)  # Optional: store user_id in cookie
+                set_login_cookie(response, user)  # signed, expiring user_id cookie
                 messages.success(request, "Login successful!")
                 return response
             else:
@@ -172,9 +154,10 @@ def dashboard(request):
         return redirect('login')
 
     user_profile = get_object_or_404(UserProfile, user=user)
-    user_reports = Report.objects.filter(user=user).order_by('-timestamp')[:5]
+    user_reports = keyset_page(Report.objects.filter(user=user), 5, cursor=request.GET.get('cursor'))
     leaderboard_position = Leaderboard.objects.get(user=user)
-    user_rewards = UserReward.objects.filter(user=user).order_by('-earned_at')
+    leaderboard_position.rank = get_leaderboard().rank_of(user.user_id)
+    user_rewards = UserReward.objects.filter(user=user).select_related('reward').order_by('-earned_at')
 
     return render(request, 'webapp/dashboard.html', {
         'user_profile': user_profile,
@@ -183,65 +166,32 @@ def dashboard(request):
         'user_rewards': user_rewards,
     })
 
-# ----------------------------
-# Submit Report
-# ----------------------------
-def submit_report(request):
-    user = get_current_user(request)
-    if not user:
-        messages.error(request, 'Please login first.')
-        return redirect('login')
-
-    if request.method == 'POST':
-        report_type = request.POST.get('report_type')
-        description = request.POST.get('description')
-        photo_url = request.POST.get('photo_url')
-        geotag_lat = Decimal(request.POST.get('geotag_lat'))
-        geotag_long = Decimal(request.POST.get('geotag_long'))
-
-        report = Report.objects.create(
-            user=user,
-            report_type=report_type,
-            description=description,
-            photo_url=photo_url,
-            geotag_lat=geotag_lat,
-            geotag_long=geotag_long
-        )
-
-        # Award points
-        user.points += 10
-        user.save()
-
-        # Update leaderboard
-        leaderboard = Leaderboard.objects.get(user=user)
-        leaderboard.points = user.points
-        leaderboard.save()
-
-        messages.success(request, 'Report submitted successfully! You earned 10 points.')
-        return redirect('dashboard')
-
-    return render(request, 'webapp/submit_report.html')
-
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Report, Leaderboard, Reward, User, UserReward
-
-# ----------------------------
-# Helper
-# ----------------------------
-def get_logged_user(request):
-    user_id = request.COOKIES.get("user_id")
-    if user_id:
-        try:
-            return User.objects.get(user_id=user_id)
-        except User.DoesNotExist:
-            return None
-    return None
+from .leaderboard import get_leaderboard, top_entries
+from .points import REPORT_POINTS, award_points, balance
+from .pagination import keyset_page
+from .search import search_reports
+from .stats import report_count
+from .pagecache import ALL_REPORT_DETAILS, LEADERBOARD, REPORTS, cached_page
+from .rewards import catalog_for
+from django.db import IntegrityError, transaction
+from django.utils.http import urlencode
+
+# Offered by the reports filter (the same types as the submit form).
+REPORT_TYPE_CHOICES = [
+    ('cutting', 'Illegal Cutting'),
+    ('dumping', 'Pollution/Dumping'),
+    ('reclamation', 'Land Reclamation'),
+    ('damage', 'Storm Damage'),
+    ('restoration', 'Restoration'),
+]
 
 # ----------------------------
 # Reports List
 # ----------------------------
+@cached_page(REPORTS)
 def reports_list(request):
     reports = Report.objects.all().order_by('-timestamp')
 
@@ -256,24 +206,34 @@ def reports_list(request):
 
     search_query = request.GET.get('search')
     if search_query:
-        reports = reports.filter(
-            Q(description__icontains=search_query) |
-            Q(report_type__icontains=search_query)
-        )
+        reports = search_reports(reports, search_query)
 
     # Pagination
-    paginator = Paginator(reports, 10)  # 10 reports per page
-    page_obj = paginator.get_page(request.GET.get('page'))
+    if search_query:
+        # Ranked by relevance, so (timestamp, id) cursors don't apply; matches are few.
+        page_obj = Paginator(reports, 10).get_page(request.GET.get('page'))
+    else:
+        page_obj = keyset_page(
+            reports, 10,
+            cursor=request.GET.get('cursor'),
+            page=request.GET.get('page'),
+            approximate_total=None if type_filter else report_count(status_filter or None),
+        )
 
+    filters = {'status': status_filter, 'type': type_filter, 'search': search_query}
     return render(request, 'webapp/reports_list.html', {
         'page_obj': page_obj,
         'status_filter': status_filter,
         'type_filter': type_filter,
         'search_query': search_query,
+        'status_choices': Report.STATUS_CHOICES,
+        'type_choices': REPORT_TYPE_CHOICES,
+        'filter_query': urlencode({k: v for k, v in filters.items() if v}),  # kept by the page links
         'logged_user': get_logged_user(request),   # ✅ added
     })
 
 
+@cached_page(ALL_REPORT_DETAILS, "report:{report_id}")
 def report_detail(request, report_id):
     report = get_object_or_404(Report, report_id=report_id)
     return render(request, 'webapp/report_detail.html', {
@@ -282,44 +242,30 @@ def report_detail(request, report_id):
     })
 
 
+@cached_page(LEADERBOARD)
 def leaderboard_view(request):
-    leaderboard = Leaderboard.objects.order_by('-points')[:20]
-    # Update ranks dynamically
-    for idx, entry in enumerate(leaderboard, start=1):
-        entry.rank = idx
-        entry.save()
+    # Ranks come from the in-memory engine; nothing is written on this read path.
+    leaderboard = top_entries(20)
     return render(request, 'webapp/leaderboard.html', {
         'leaderboard': leaderboard,
         'logged_user': get_logged_user(request),   # ✅ added
     })
 
 
-def rewards_view(request):
-    user_id = request.COOKIES.get('user_id')
-    if not user_id:
-        return redirect('login')
-
-    user = User.objects.get(user_id=user_id)
-    rewards = Reward.objects.filter(is_active=True)
-    return render(request, 'webapp/rewards.html', {
-        'rewards': rewards,
-        'user': user,
-        'logged_user': get_logged_user(request),   # ✅ added
-    })
-
-
 def profile_view(request):
     return render(request, 'webapp/profile.html', {
         'logged_user': get_logged_user(request),   # ✅ added
     })
 
 
+@cached_page()
 def about(request):
     return render(request, 'webapp/about.html', {
         'logged_user': get_logged_user(request),   # ✅ added
     })
 
 
+@cached_page()
 def contact(request):
     return render(request, 'webapp/contact.html', {
         'logged_user': get_logged_user(request),   # ✅ added
@@ -333,54 +279,119 @@ def password_reset_view(request):
 
 
 def claim_reward(request, reward_id):
-    user_id = request.COOKIES.get('user_id')
-    if not user_id:
+    user = get_current_user(request)
+    if not user:
         return redirect('login')
-
-    user = User.objects.get(user_id=user_id)
     
     # Correct field: reward_id
     reward = get_object_or_404(Reward, reward_id=reward_id)
 
-    # Check if user already claimed it
-    already_claimed = UserReward.objects.filter(user=user, reward=reward).exists()
-    if not already_claimed:
-        UserReward.objects.create(user=user, reward=reward)
-        # Optionally add points deduction
-        user.points -= reward.points_required
-        user.save()
+    # Check if user already claimed it (cached claim set; the unique constraint settles races)
+    if not reward.is_claimed_by(user):
+        try:
+            # Claim and deduction commit together. Locking the user's row serializes
+            # their claims, so two at once can't both spend the same balance.
+            with transaction.atomic():
+                list(User.objects.select_for_update().filter(user_id=user.user_id).values_list("user_id", flat=True))
+                if balance(user.user_id) < reward.points_required:
+                    messages.error(request, 'Not enough points for this reward.')
+                    return redirect('rewards')
+                UserReward.objects.create(user=user, reward=reward)
+                award_points(user, -reward.points_required, 'reward', reward=reward)
+        except IntegrityError:
+            pass  # claimed concurrently by another request
 
     return redirect('rewards')
 
 # webapp/views.py
-import os
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render, redirect
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from .models import Report
-from .ml_model.predict import predict_report
+from .classification import apply_prediction, enqueue_report, job_stats
+from . import geo
+from .dedup import find_near_duplicate, store_upload
+from .uploads import ReportUploadHandler, max_upload_bytes, too_large_message
 
+@csrf_exempt
 def submit_report(request):
-    if request.method == 'POST':
-        title = request.POST['title']
-        description = request.POST['description']
-        report_type = request.POST['report_type']
-        uploaded_file = request.FILES['image']
+    # Upload handlers must be swapped before CsrfViewMiddleware reads request.POST,
+    # so CSRF is enforced by _submit_report instead.
+    upload_handler = ReportUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+
+    # Refuse obviously oversized bodies without reading them at all.
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid Content-Length header.')
+    if request.method == 'POST' and content_length > max_upload_bytes() + 64 * 1024:
+        messages.error(request, too_large_message())
+        return redirect('submit_report')
 
-        file_path = os.path.join('media/reports/', uploaded_file.name)
-        with open(file_path, 'wb+') as f:
-            for chunk in uploaded_file.chunks():
-                f.write(chunk)
+    try:
+        return _submit_report(request)
+    finally:
+        # Anything _submit_report didn't store: a rejected form, a CSRF failure, an error.
+        upload_handler.discard_staged()
 
-        predicted_type = predict_report(file_path)
-        status = 'verified' if predicted_type == report_type else 'pending_review'
+@csrf_protect
+def _submit_report(request):
+    user = get_current_user(request)
+    if not user:
+        messages.error(request, 'Please login first.')
+        return redirect('login')
 
-        Report.objects.create(
+    if request.method == 'POST':
+        uploaded_file = request.FILES.get('image')
+        upload_error = getattr(request, 'upload_error', None)
+        if upload_error or uploaded_file is None:
+            messages.error(request, upload_error or 'Please attach a photo.')
+            return redirect('submit_report')
+
+        title = request.POST.get('title', '').strip()
+        description = request.POST.get('description', '').strip()
+        report_type = request.POST.get('report_type', '').strip()
+        if not (title and description and report_type):
+            error = 'Please give the report a title, a description and a type.'
+            return render(request, 'webapp/submit_report.html', {'error': error}, status=400)
+        if len(title) > 255 or len(report_type) > 100:
+            error = 'The title or type is too long.'
+            return render(request, 'webapp/submit_report.html', {'error': error}, status=400)
+        geotag_lat, geotag_long = geo.parse_point(request.POST.get('geotag_lat'), request.POST.get('geotag_lng'))
+
+        # Identical photos share one stored file and one prediction.
+        blob, created = store_upload(uploaded_file)
+        thumbnail_widths = None
+        if not created:
+            # Same stored file, so the same thumbnails.
+            thumbnail_widths = (
+                Report.objects.filter(image_blob=blob, thumbnail_widths__isnull=False)
+                .values_list('thumbnail_widths', flat=True).first()
+            )
+
+        # Save immediately; the classify_reports workers fill in the prediction.
+        report = Report.objects.create(
+            user=user,
             title=title,
             description=description,
             report_type=report_type,
-            predicted_report_type=predicted_type,
-            status=status,
-            image=uploaded_file
+            predicted_report_type=None,
+            geotag_lat=geotag_lat,
+            geotag_long=geotag_long,
+            status='pending',
+            image=blob.file.name,
+            image_blob=blob,
+            thumbnail_widths=thumbnail_widths,
+            duplicate_of=find_near_duplicate(blob),
         )
+        if blob.predicted_report_type:
+            apply_prediction(report, blob.predicted_report_type, blob.predicted_model_version)
+        else:
+            enqueue_report(report)
+
+        award_points(user, REPORT_POINTS, 'report', report=report)
+        messages.success(request, f'Report submitted successfully! You earned {REPORT_POINTS} points.')
         return redirect('reports_list')
 
     return render(request, 'webapp/submit_report.html')
@@ -388,9 +399,14 @@ def submit_report(request):
 
 # webapp/views.py
 from django.http import JsonResponse, HttpResponseServerError
-from .ml_model.predict import predict_report, get_model
+from .profiling import metrics_only
+
+# The ML stack (numpy, and TensorFlow for the keras backend) is imported inside
+# the views that need it, so web workers that never classify never load it.
 
 def classify_view(request):
+    from .ml_model.predict import predict_report, get_model
+
     try:
         # ensure model present (optional); or call predict_report directly
         _ = get_model()  
@@ -402,31 +418,116 @@ def classify_view(request):
         return HttpResponseServerError(
             "ML model not found. Please place 'report_model.h5' in webapp/ml_model/."
         )
-def rewards_view(request):
-    user_id = request.COOKIES.get('user_id')
-    if not user_id:
-        return redirect('login')
+
+
+@metrics_only
+def ml_metrics_view(request):
+    # Queue depth, batch size histogram and latency percentiles of the inference batcher,
+    # plus which model version is serving
+    from .ml_model.predict import get_batcher, get_registry
+
+    return JsonResponse({**get_batcher().stats(), "model": get_registry().status()})
+
+
+@metrics_only
+def classification_jobs_view(request):
+    # Backlog size and throughput of the background classification workers
+    return JsonResponse(job_stats())
+
+
+# ----------------------------
+# Geo queries
+# ----------------------------
+from django.http import StreamingHttpResponse
+from .tiles import MAX_ZOOM, get_tile
+
+MAX_NEAREST = 500
+MAX_RADIUS_KM = 500
+
+
+def reports_geo(request):
+    """
+    Geotagged reports as streamed GeoJSON. One of:
+      ?bbox=west,south,east,north
+      ?lat=..&lng=..&radius_km=..   (nearest first)
+      ?lat=..&lng=..&k=..           (k nearest)
+    plus optional ?status= and ?type= filters.
+    """
+    reports = Report.objects.filter(geohash__isnull=False)
+    if request.GET.get('status'):
+        reports = reports.filter(status=request.GET['status'])
+    if request.GET.get('type'):
+        reports = reports.filter(report_type=request.GET['type'])
+    rows = reports.values(*geo.FEATURE_FIELDS)
 
     try:
-        logged_user = User.objects.get(user_id=user_id)
-    except User.DoesNotExist:
+        if 'bbox' in request.GET:
+            west, south, east, north = (float(v) for v in request.GET['bbox'].split(','))
+            if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+                raise ValueError
+            rows = geo.in_bbox(rows, south, west, north, east).iterator(chunk_size=2000)
+        else:
+            lat, lng = geo.parse_point(request.GET.get('lat'), request.GET.get('lng'))
+            if lat is None:
+                raise ValueError
+            if 'k' in request.GET:
+                rows = geo.nearest(rows, lat, lng, min(MAX_NEAREST, max(1, int(request.GET['k']))))
+            else:
+                km = float(request.GET['radius_km'])
+                if not 0 < km <= MAX_RADIUS_KM:
+                    raise ValueError
+                rows = geo.within_radius(rows, lat, lng, km)
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {"error": "Pass bbox=west,south,east,north, or lat, lng and radius_km (max %d) or k." % MAX_RADIUS_KM},
+            status=400,
+        )
+    return StreamingHttpResponse(geo.geojson_stream(rows), content_type='application/geo+json')
+
+
+def report_tile(request, z, x, y):
+    # Clustered report counts for one map tile; served from the tile cache.
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return JsonResponse({"error": "No such tile."}, status=404)
+    return JsonResponse(get_tile(z, x, y))
+
+
+# ----------------------------
+# Bulk export
+# ----------------------------
+from .bulk import EXPORT_FORMATS, export_stream
+
+EXPORT_ROLES = ('ngo', 'authority', 'admin')
+
+
+def export_reports_view(request, fmt):
+    # Full dumps for partner organisations, streamed in constant memory.
+    user = get_current_user(request)
+    if user is None or user.role not in EXPORT_ROLES:
+        return JsonResponse({"error": "Exports are available to NGO, authority and admin accounts."}, status=403)
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": "Format must be one of: %s." % ", ".join(EXPORT_FORMATS)}, status=404)
+
+    reports = Report.objects.all()
+    if request.GET.get('status'):
+        reports = reports.filter(status=request.GET['status'])
+    if request.GET.get('type'):
+        reports = reports.filter(report_type=request.GET['type'])
+    response = StreamingHttpResponse(export_stream(reports, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="reports.{fmt}"'
+    return response
+
+def rewards_view(request):
+    logged_user = get_current_user(request)
+    if not logged_user:
         return redirect('login')
+    logged_user.points = balance(logged_user.user_id)  # includes uncompacted ledger entries
 
-    # Fetch only active rewards
-    rewards = Reward.objects.filter(is_active=True)
+    # Cached active catalog, each reward marked claimed/affordable for this user (see rewards.py)
+    rewards = catalog_for(logged_user, logged_user.points)
 
     return render(request, 'webapp/rewards.html', {
         'rewards': rewards,
         'user': logged_user,       # still keep 'user' if other views depend on it
         'logged_user': logged_user # explicit context variable for template
     })
-
-# helpers.py or views.py
-def get_logged_user(request):
-    user_id = request.COOKIES.get("user_id")
-    if user_id:
-        try:
-            return User.objects.get(user_id=user_id)
-        except User.DoesNotExist:
-            return None
-    return None